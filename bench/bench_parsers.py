@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# bench/bench_parsers.py - Microbenchmark for the provider output parsers
+#
+# Usage:
+#   python bench/bench_parsers.py                    # synthetic ~20 MB Claude trace
+#   python bench/bench_parsers.py --trace run.jsonl  # recorded trace (claude --output-format stream-json)
+#   python bench/bench_parsers.py --provider codex_cli --trace codex.jsonl
+#
+# Compares the shared streamjson-based parser against the previous
+# parse-every-line implementation, for both the buffered (extractResponse)
+# and the streaming (createStreamParser) path.
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "pythonpath"))
+
+from libreassist import streamjson  # noqa: E402
+
+
+def makeClaudeTrace(targetBytes):
+    """Build a stream-json trace dominated by partial-message deltas, like a long agent run."""
+    lines = []
+
+    def add(event):
+        lines.append(json.dumps(event))
+        return len(lines[-1]) + 1
+
+    size = add({"type": "system", "subtype": "init", "session_id": "bench"})
+    while size < targetBytes:
+        size += add({"type": "stream_event", "event": {
+            "type": "message_start", "message": {"role": "assistant", "content": []}}})
+        words = [f"word{i} " for i in range(200)]
+        for word in words:
+            size += add({"type": "stream_event", "event": {
+                "type": "content_block_delta", "index": 0,
+                "delta": {"type": "text_delta", "text": word}}})
+        for i in range(100):
+            size += add({"type": "stream_event", "event": {
+                "type": "content_block_delta", "index": 1,
+                "delta": {"type": "input_json_delta", "partial_json": '{"path": "content.xml", "x": ' + str(i)}}})
+        size += add({"type": "assistant", "message": {
+            "role": "assistant", "content": [{"type": "text", "text": "".join(words)}]}})
+        size += add({"type": "user", "message": {
+            "role": "user", "content": [{"type": "tool_result", "content": "x" * 2000}]}})
+    add({"type": "result", "session_id": "bench", "result": "done"})
+    return "\n".join(lines) + "\n"
+
+
+def legacyClaude(rawOutput):
+    """The pre-streamjson claude_code.extractResponse."""
+    collectedText = ""
+    newSessionId = None
+    for line in rawOutput.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            jsonLine = json.loads(line)
+            eventType = jsonLine.get("type")
+            if eventType == "assistant":
+                for block in jsonLine.get("message", {}).get("content", []):
+                    if block.get("type") == "text":
+                        collectedText += block.get("text", "")
+            elif eventType == "result":
+                newSessionId = jsonLine.get("session_id")
+        except json.JSONDecodeError:
+            pass
+    return {"response": collectedText.strip(), "sessionId": newSessionId}
+
+
+def legacyCodex(rawOutput):
+    """The pre-streamjson codex_cli.extractResponse."""
+    collectedText = ""
+    for line in rawOutput.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            event = json.loads(line)
+            if event.get("type") == "item.completed":
+                item = event.get("item", {})
+                if item.get("text"):
+                    collectedText += item["text"]
+        except json.JSONDecodeError:
+            pass
+    if not collectedText and rawOutput.strip():
+        collectedText = rawOutput.strip()
+    return {"response": collectedText.strip(), "sessionId": None}
+
+
+def streamed(module, rawBytes, partials):
+    """
+    Feed raw byte lines to the incremental parser, as provider_base does.
+    partialText() is throttled by time in provider_base and left out here.
+    """
+    parser = module.createStreamParser(partials=partials)
+    for line in rawBytes.splitlines(keepends=True):
+        parser.feed(line)
+    return parser.result()
+
+
+def timeIt(label, fn, sizeBytes, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"  {label:<34} {best * 1000:9.1f} ms  {sizeBytes / best / 1e6:8.1f} MB/s")
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--provider", default="claude_code", choices=["claude_code", "codex_cli"])
+    ap.add_argument("--trace", help="Recorded JSON-lines output of the provider CLI")
+    ap.add_argument("--size-mb", type=float, default=20.0, help="Size of the synthetic trace")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    if args.trace:
+        with open(args.trace, "r", encoding="utf-8", errors="replace") as f:
+            rawOutput = f.read()
+    elif args.provider == "claude_code":
+        rawOutput = makeClaudeTrace(int(args.size_mb * 1e6))
+    else:
+        ap.error("--trace is required for codex_cli")
+
+    rawBytes = rawOutput.encode("utf-8")
+    module   = importlib.import_module(f"libreassist.providers.{args.provider}")
+    legacy   = legacyClaude if args.provider == "claude_code" else legacyCodex
+
+    print(f"{args.provider}: {len(rawBytes) / 1e6:.1f} MB, "
+          f"{rawOutput.count(chr(10))} lines, JSON backend: {streamjson.BACKEND}")
+    old = timeIt("legacy extractResponse", lambda: legacy(rawOutput), len(rawBytes), args.repeat)
+    new = timeIt("extractResponse", lambda: module.extractResponse(rawOutput), len(rawBytes), args.repeat)
+    timeIt("stream parser (final text only)", lambda: streamed(module, rawBytes, False), len(rawBytes), args.repeat)
+    timeIt("stream parser (with text deltas)", lambda: streamed(module, rawBytes, True), len(rawBytes), args.repeat)
+
+    if old != new:
+        print("WARNING: legacy and new parser results differ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+# libreassist/archive.py - Compressed archive of old chat turns
+#
+# Only the newest turns of a history stay in the database. Older messages
+# move in blocks into lzma-compressed JSON-lines segments in the document's
+# directory (history-<first id>-<last id>.jsonl.xz), indexed by the
+# archive_segments table, so the chat view and search still reach them.
+# Segments count against the storage quota (see storage.py).
+
+import functools
+import json
+import lzma
+import os
+
+from . import store
+from .messages import Message
+
+DEFAULT_HOT_TURNS    = 100   # Turns per document kept in the database
+MIN_SEGMENT_MESSAGES = 50    # Do not write segments smaller than this
+
+SEGMENT_PREFIX = "history-"
+SEGMENT_SUFFIX = ".jsonl.xz"
+
+
+# ---------------------------------------------------------------------------
+# Segment files
+# ---------------------------------------------------------------------------
+
+def _toRecord(m):
+    return {"id": m.id, "role": m.role, "label": m.label, "text": m.text,
+            "provider": m.provider, "timestamp": m.timestamp, "latency": m.latency,
+            "sessionId": m.sessionId, "snapshotId": m.snapshotId}
+
+
+def _fromRecord(r):
+    return Message(r["role"], r["text"], label=r.get("label"), provider=r.get("provider"),
+                   timestamp=r.get("timestamp"), latency=r.get("latency"),
+                   sessionId=r.get("sessionId"), snapshotId=r.get("snapshotId"), id=r.get("id"))
+
+
+def writeSegment(docDir, messages):
+    """Write messages to a new segment file. Returns (filename, size in bytes)."""
+    filename = f"{SEGMENT_PREFIX}{messages[0].id}-{messages[-1].id}{SEGMENT_SUFFIX}"
+    path     = os.path.join(docDir, filename)
+    tmpPath  = path + ".tmp"
+    try:
+        with lzma.open(tmpPath, 'wt', encoding='utf-8') as f:
+            for m in messages:
+                f.write(json.dumps(_toRecord(m), ensure_ascii=False) + "\n")
+        os.replace(tmpPath, path)
+    finally:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+    return filename, os.path.getsize(path)
+
+
+@functools.lru_cache(maxsize=8)
+def _readSegmentFile(path):
+    with lzma.open(path, 'rt', encoding='utf-8') as f:
+        return tuple(_fromRecord(json.loads(line)) for line in f if line.strip())
+
+
+def readSegment(docDir, filename):
+    """Return the messages of a segment, oldest first (empty if unreadable)."""
+    try:
+        return list(_readSegmentFile(os.path.join(docDir, filename)))
+    except (OSError, ValueError, lzma.LZMAError) as e:
+        print(f"Error reading history archive {filename}: {e}")
+        return []
+
+
+def removeUnindexedSegments(docDir):
+    """Delete segment files of docDir that the archive index no longer lists."""
+    try:
+        indexed = {row[2] for row in store.listArchiveSegments(store.docKeyForDir(docDir))}
+        for name in os.listdir(docDir):
+            if name.startswith(SEGMENT_PREFIX) and name not in indexed:
+                os.remove(os.path.join(docDir, name))
+    except OSError as e:
+        print(f"Error removing history archive files: {e}")
+
+
+# ---------------------------------------------------------------------------
+# Archiving
+# ---------------------------------------------------------------------------
+
+def archiveDocument(docDir, hotTurns=DEFAULT_HOT_TURNS):
+    """
+    Move the messages before the newest hotTurns turns of a document into
+    a segment. Returns the number of archived messages.
+    """
+    docKey = store.docKeyForDir(docDir)
+    cutoff = store.hotCutoff(docKey, hotTurns)
+    if cutoff is None:
+        return 0
+    messages = store.loadMessagesBefore(docKey, cutoff)
+    if len(messages) < MIN_SEGMENT_MESSAGES:
+        return 0
+
+    from libreassist.settings import getDirSize
+    filename, size = writeSegment(docDir, messages)
+    try:
+        with store.transaction() as conn:
+            store.addArchiveSegment(conn, docKey, messages, filename, size)
+            store.setDocumentSize(conn, docKey, getDirSize(docDir))
+    except Exception:
+        os.remove(os.path.join(docDir, filename))
+        raise
+    return len(messages)
+
+
+def archiveAll(baseDir, hotTurns=DEFAULT_HOT_TURNS):
+    """Archive old turns of every known document. Returns the number of archived messages."""
+    archived = 0
+    for docKey, docPath in store.listDocuments():
+        docDir = os.path.join(baseDir, docKey)
+        if not os.path.isdir(docDir):
+            continue
+        try:
+            archived += archiveDocument(docDir, hotTurns)
+        except Exception as e:
+            print(f"Error archiving history of {docPath}: {e}")
+    return archived
+
+
+# ---------------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------------
+
+def loadArchived(docDir, limit, offset=0):
+    """
+    Return up to limit archived messages of a document, oldest first,
+    skipping the newest `offset` archived ones. Only the segments that
+    overlap the requested range are decompressed.
+    """
+    result = []
+    for segmentId, docKey, filename, count, size in store.listArchiveSegments(
+            store.docKeyForDir(docDir)):
+        if limit <= 0:
+            break
+        if offset >= count:
+            offset -= count
+            continue
+        messages = readSegment(docDir, filename)
+        end      = len(messages) - offset
+        chunk    = messages[max(0, end - limit):end]
+        result[:0] = chunk
+        limit   -= len(chunk)
+        offset   = 0
+    return result
+
+
+def searchArchived(baseDir, text, limit=50):
+    """Search archived messages. Returns (path, Message) pairs, newest first."""
+    hits = []
+    for messageId, docKey, docPath, filename in store.searchArchivedIds(text, limit):
+        for m in readSegment(os.path.join(baseDir, docKey), filename):
+            if m.id == messageId:
+                hits.append((docPath, m))
+                break
+    return hits
@@ -1,86 +1,321 @@
 # -*- coding: utf-8 -*-
-# libreassist/backup.py - Backup and restore functions
-
+# libreassist/backup.py - Document snapshots, undo and redo
+#
+# Every state of a document that an AI turn starts from or produces is kept
+# as a snapshot. Snapshot files are content-addressed blobs in
+# <LibreAssist dir>/snapshots/<sha256[:2]>/<sha256><ext>, so identical states
+# (the result of one turn is usually the start of the next) are stored once,
+# across all documents. Each document has a timeline of snapshots in the
+# store with a cursor; Undo and Redo move the cursor and restore the blob.
+# Blobs no timeline refers to any more are deleted (reference counts are
+# kept by the store).
+#
+# ZIP packages (ODF, OOXML) are stored entry by entry: a snapshot is a
+# manifest in the store, and only entries whose CRC or size differ from the
+# previous snapshot are read and hashed. Images and embedded objects rarely
+# change between turns, so a turn usually adds little more than content.xml,
+# styles.xml and meta.xml. Restore reassembles the package with mimetype
+# first and uncompressed, as ODF requires.
+
+import hashlib
+import json
 import os
-import shutil
-import time
-import uno
-from .document import getCurrentDocument, getDocumentPath
-from .settings import getDocSettingsDir, loadSettings, saveSettings
+import threading
+import zipfile
+import zlib
+from .document import getCurrentDocument, getDocumentPath, reloadDocument
+from .settings import getDocSettingsDir, getLibreAssistDir, loadGlobalSettings
+from . import store, fileio
+
+DEFAULT_UNDO_DEPTH = 10          # AI turns that can be undone per document
+SNAPSHOT_DIR       = "snapshots"
+HASH_CHUNK         = 1024 * 1024
+ENTRY_COMPRESSION  = 1           # zlib level for blobs of deflated ZIP entries
+COMPRESSED_EXT     = ".z"        # Extension of zlib-compressed entry blobs
+
+# Serializes blob writes and garbage collection, so a blob that is about to
+# be referenced is never collected in between
+_blobLock = threading.RLock()
+
+
+# ---------------------------------------------------------------------------
+# Blob files
+# ---------------------------------------------------------------------------
+
+def hashFile(path):
+    """SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def getBlobPath(blobHash, ext):
+    baseDir = getLibreAssistDir()
+    if not baseDir:
+        return None
+    return os.path.join(baseDir, SNAPSHOT_DIR, blobHash[:2], blobHash + ext)
+
+
+def _writeBlob(blobPath, writer):
+    """Create a blob file atomically; writer(tmpPath) writes the content."""
+    os.makedirs(os.path.dirname(blobPath), exist_ok=True)
+    tmpPath = blobPath + ".tmp"
+    try:
+        writer(tmpPath)
+        os.replace(tmpPath, blobPath)
+    finally:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
 
-_undo_state = "original"  # Track state: "original" or "changed"
 
+def _storeFile(fullPath):
+    """
+    Copy a complete document into the blob store unless its content is there.
+    Returns (blob rows, hash, None) – see _storeZip().
+    """
+    ext      = os.path.splitext(fullPath)[1]
+    blobHash = hashFile(fullPath)
+    blobPath = getBlobPath(blobHash, ext)
+    if not os.path.exists(blobPath):
+        _writeBlob(blobPath, lambda tmpPath: fileio.copyFile(fullPath, tmpPath, keepStat=True))
+    return [(blobHash, ext, os.path.getsize(blobPath), store.SNAPSHOT_FILE)], blobHash, None
 
-def createBackup(fullPath, docDir):
+
+def _storeZip(fullPath, previous):
+    """
+    Store the entries of a ZIP package that are not in the blob store yet.
+    previous maps entry names of the last snapshot to (crc, size, hash);
+    entries with the same CRC and size are taken from it without reading.
+
+    Returns (blob rows to register, manifest hash, manifest entries).
+    """
+    blobs   = []
+    entries = []
+    with zipfile.ZipFile(fullPath) as zf:
+        for info in zf.infolist():
+            known = previous.get(info.filename)
+            if known and known[0] == info.CRC and known[1] == info.file_size:
+                entryHash = known[2]
+            else:
+                data      = zf.read(info)
+                entryHash = hashlib.sha256(data).hexdigest()
+                if store.getBlobExt(entryHash) is None:
+                    compressed = info.compress_type != zipfile.ZIP_STORED
+                    ext        = COMPRESSED_EXT if compressed else ""
+                    payload    = zlib.compress(data, ENTRY_COMPRESSION) if compressed else data
+                    blobPath   = getBlobPath(entryHash, ext)
+
+                    def _write(tmpPath, payload=payload):
+                        with open(tmpPath, 'wb') as f:
+                            f.write(payload)
+                    _writeBlob(blobPath, _write)
+                    blobs.append((entryHash, ext, len(payload), store.SNAPSHOT_ENTRY))
+            entries.append((info.filename, entryHash, info.CRC, info.file_size,
+                            info.compress_type, info.date_time))
+
+    # The manifest is addressed by its entry list: same package content, same hash
+    listing  = json.dumps([(e[0], e[1], e[4]) for e in entries]).encode('utf-8')
+    manifest = hashlib.sha256(listing).hexdigest()
+    blobs.append((manifest, os.path.splitext(fullPath)[1], 0, store.SNAPSHOT_ZIP))
+    return blobs, manifest, entries
+
+
+def readEntryBlob(entryHash, ext):
+    with open(getBlobPath(entryHash, ext), 'rb') as f:
+        data = f.read()
+    return zlib.decompress(data) if ext == COMPRESSED_EXT else data
+
+
+def materialize(blobHash, ext, kind, targetPath):
+    """Write the document of a snapshot blob to targetPath."""
+    if kind != store.SNAPSHOT_ZIP:
+        fileio.copyFile(getBlobPath(blobHash, ext), targetPath, keepStat=True)
+        return
+
+    entries = store.loadManifestEntries(blobHash)
+    # ODF: the mimetype entry must come first and be stored uncompressed
+    entries.sort(key=lambda e: e[0] != "mimetype")
+    tmpPath = targetPath + ".la-tmp"
+    try:
+        with zipfile.ZipFile(tmpPath, 'w') as zf:
+            for name, entryHash, crc, size, compressType, dateTime, entryExt in entries:
+                info = zipfile.ZipInfo(name, dateTime)
+                info.compress_type = (zipfile.ZIP_STORED if name == "mimetype"
+                                      else compressType)
+                zf.writestr(info, readEntryBlob(entryHash, entryExt))
+        os.replace(tmpPath, targetPath)
+    finally:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+
+
+def collectGarbage():
+    """Delete blobs no snapshot refers to. Returns the number of deleted blobs."""
+    with _blobLock:
+        with store.transaction() as conn:
+            released = store.releaseUnreferencedBlobs(conn)
+        for blobHash, ext, kind in released:
+            if kind == store.SNAPSHOT_ZIP:
+                continue
+            blobPath = getBlobPath(blobHash, ext)
+            try:
+                os.remove(blobPath)
+                os.rmdir(os.path.dirname(blobPath))   # Only succeeds once empty
+            except OSError:
+                pass
+    return len(released)
+
+
+# ---------------------------------------------------------------------------
+# Timeline
+# ---------------------------------------------------------------------------
+
+def recordSnapshot(fullPath, docDir):
     """
-    Create a backup of the document before the provider modifies it.
-    Safe to call from the Main-UNO-Thread – does not use getCurrentDocument().
+    Add the current file content of a document to its timeline and update
+    the undo/redo flags. New content drops the redo branch and states
+    beyond the configured undo depth; content equal to the current state
+    changes nothing. Safe to call from background threads.
 
     Args:
         fullPath: Absolute path to the document file
         docDir:   Settings directory for this document
 
-    Returns: True if successful, False otherwise
+    Returns: snapshot id, or None on failure
     """
     try:
         if not fullPath or not docDir:
-            return False
-        filename = os.path.basename(fullPath)
-        backupPath = os.path.join(docDir, "backup" + os.path.splitext(filename)[1])
-        shutil.copy2(fullPath, backupPath)
-        return True
+            return None
+        depth  = loadGlobalSettings().get("undo_depth", DEFAULT_UNDO_DEPTH)
+        docKey = store.docKeyForDir(docDir)
+        with _blobLock:
+            if zipfile.is_zipfile(fullPath):
+                previous = {}
+                current  = store.getCurrentSnapshotBlob(docKey)
+                if current and current[2] == store.SNAPSHOT_ZIP:
+                    previous = {e[0]: (e[2], e[3], e[1]) for e in store.loadManifestEntries(current[0])}
+                blobs, blobHash, entries = _storeZip(fullPath, previous)
+            else:
+                blobs, blobHash, entries = _storeFile(fullPath)
+
+            with store.transaction() as conn:
+                store.touchDocument(conn, docKey, fullPath)
+                for rowHash, ext, size, kind in blobs:
+                    isNew = store.addSnapshotBlob(conn, rowHash, ext, size, kind)
+                    if isNew and kind == store.SNAPSHOT_ZIP:
+                        store.addManifestEntries(conn, rowHash, entries)
+                snapshotId = store.pushSnapshot(conn, docKey, blobHash, max(1, depth))
+                _setUndoFlags(conn, docKey)
+        collectGarbage()
+        return snapshotId
     except Exception as e:
-        print(f"Error creating backup: {e}")
-        return False
+        print(f"Error creating snapshot: {e}")
+        return None
 
 
-def restoreBackup():
+def createBackup(fullPath, docDir):
     """
-    Restore document from backup (Undo).
-    Called from the Undo button – getCurrentDocument() is correct here.
-    Returns: Status message string
+    Snapshot the document before the provider modifies it.
+    Returns: snapshot id, or None on failure
     """
-    global _undo_state
+    return recordSnapshot(fullPath, docDir)
 
-    try:
-        doc = getCurrentDocument()
-        if not doc:
-            return "No document open"
 
-        directory, filename, fullPath = getDocumentPath()
-        if not fullPath:
-            return "Document not saved"
+def getSnapshotPath(snapshotId):
+    """
+    File with the document of a snapshot (e.g. for Compare Documents), or
+    None. ZIP snapshots are assembled into the temp directory first.
+    """
+    blob = store.getSnapshotBlob(snapshotId) if snapshotId else None
+    if not blob:
+        return None
+    blobHash, ext, kind = blob
+    if kind != store.SNAPSHOT_ZIP:
+        return getBlobPath(blobHash, ext)
+    import tempfile
+    path = os.path.join(tempfile.gettempdir(), f"libreassist-{blobHash[:16]}{ext}")
+    if not os.path.exists(path):
+        materialize(blobHash, ext, kind, path)
+    return path
+
+
+def trimTimeline(docKey, keepCurrent):
+    """
+    Drop the undo timeline of a document to free space, keeping only the
+    current state if keepCurrent. Blobs are released by collectGarbage().
+    Returns the number of dropped snapshots.
+    """
+    with store.transaction() as conn:
+        dropped = store.trimSnapshots(conn, docKey, keepCurrent)
+        _setUndoFlags(conn, docKey)
+    return dropped
 
-        docDir = getDocSettingsDir()
-        backupPath = os.path.join(docDir, "backup" + os.path.splitext(filename)[1])
 
-        if not os.path.exists(backupPath):
-            return "No backup available"
+def _setUndoFlags(conn, docKey):
+    older, newer = store.snapshotNeighbours(conn, docKey)
+    store.setDocSettings(conn, docKey, {"undo_available": older, "redo_available": newer})
 
-        frame = doc.getCurrentController().getFrame()
-        frameName = frame.getName()
-        if not frameName:
-            frameName = f"la_{id(frame)}"
-            frame.setName(frameName)
-        url = doc.getURL()
 
-        data = loadSettings()
-        data["undo_available"] = False
-        data["redo_available"] = True
-        saveSettings(data)
+# ---------------------------------------------------------------------------
+# Undo / Redo
+# ---------------------------------------------------------------------------
 
-        doc.close(False)
-        time.sleep(0.3)
+def _restoreStep(direction):
+    """
+    Move the current document's timeline one state back or forward and
+    reload the document from that snapshot.
+    Called from the Undo/Redo buttons – getCurrentDocument() is correct here.
+    Returns: (True, None) on success, or (False, status message)
+    """
+    doc = getCurrentDocument()
+    if not doc:
+        return False, "No document open"
+
+    directory, filename, fullPath = getDocumentPath()
+    if not fullPath:
+        return False, "Document not saved"
+
+    docDir = getDocSettingsDir()
+    docKey = store.docKeyForDir(docDir)
+    step   = store.findSnapshotStep(docKey, direction)
+    if not step:
+        return False, None
+    snapshotId, blobHash, ext, kind = step
+
+    # Write the document file before the cursor moves, and outside a store
+    # transaction: assembling a package must not block background jobs
+    if kind == store.SNAPSHOT_ZIP:
+        blobPath = os.path.join(docDir, "restore" + ext)
+        materialize(blobHash, ext, kind, blobPath)
+    else:
+        blobPath = getBlobPath(blobHash, ext)
+    try:
+        fileio.copyFile(blobPath, fullPath, keepStat=True)
+    finally:
+        if kind == store.SNAPSHOT_ZIP and os.path.exists(blobPath):
+            os.remove(blobPath)
 
-        shutil.copy2(backupPath, fullPath)
+    with store.transaction() as conn:
+        store.setSnapshotCursor(conn, docKey, snapshotId)
+        _setUndoFlags(conn, docKey)
 
-        ctx = uno.getComponentContext()
-        desktop = ctx.ServiceManager.createInstance("com.sun.star.frame.Desktop")
-        desktop.loadComponentFromURL(url, frameName, 0, ())
+    # Reload in the same window – no close and reopen
+    reloadDocument(doc.getCurrentController().getFrame(), discard=True)
+    return True, None
 
-        _undo_state = "original"
-        return "Document restored from backup"
 
+def restoreBackup():
+    """
+    Restore the document state before the last AI turn (Undo).
+    Returns: Status message string
+    """
+    try:
+        ok, message = _restoreStep(-1)
+        if ok:
+            return "Document restored from backup"
+        return message or "No backup available"
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -89,51 +324,14 @@ def restoreBackup():
 
 def restoreChanged():
     """
-    Restore document from changed state (Redo).
-    Called from the Redo button – getCurrentDocument() is correct here.
+    Restore the document state after the undone AI turn (Redo).
     Returns: Status message string
     """
-    global _undo_state
-
     try:
-        doc = getCurrentDocument()
-        if not doc:
-            return "No document open"
-
-        directory, filename, fullPath = getDocumentPath()
-        if not fullPath:
-            return "Document not saved"
-
-        docDir = getDocSettingsDir()
-        changedPath = os.path.join(docDir, "changed" + os.path.splitext(filename)[1])
-
-        if not os.path.exists(changedPath):
-            return "No changed state available"
-
-        frame = doc.getCurrentController().getFrame()
-        frameName = frame.getName()
-        if not frameName:
-            frameName = f"la_{id(frame)}"
-            frame.setName(frameName)
-        url = doc.getURL()
-
-        data = loadSettings()
-        data["undo_available"] = True
-        data["redo_available"] = False
-        saveSettings(data)
-
-        doc.close(False)
-        time.sleep(0.3)
-
-        shutil.copy2(changedPath, fullPath)
-
-        ctx = uno.getComponentContext()
-        desktop = ctx.ServiceManager.createInstance("com.sun.star.frame.Desktop")
-        desktop.loadComponentFromURL(url, frameName, 0, ())
-
-        _undo_state = "changed"
-        return "Changes restored"
-
+        ok, message = _restoreStep(1)
+        if ok:
+            return "Changes restored"
+        return message or "No changed state available"
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+# libreassist/capture.py - Bounded-memory capture of provider output
+#
+# Long agent runs can print tens of megabytes. OutputCapture keeps stdout in
+# memory only up to a threshold and spills the rest to a temp file; StderrTail
+# keeps the first and last lines of stderr, which is all the error path shows.
+#
+# Memory is bounded while the provider runs, not when its output is parsed:
+# providers without a stream parser print one JSON document at exit, which
+# getText() hands to extractResponse() as a whole. Line-oriented output
+# should use a stream parser instead (see provider_base.executeProvider).
+
+import codecs
+import os
+import tempfile
+from collections import deque
+
+DEFAULT_SPILL_THRESHOLD = 8 * 1024 * 1024   # Characters of stdout kept in memory
+STDERR_HEAD_LINES       = 10
+STDERR_TAIL_LINES       = 10
+
+
+class OutputCapture:
+    """
+    Incrementally decoded stdout buffer.
+    Once more than `threshold` characters arrived, the text moves to a temp file
+    in spillDir (or the system temp dir) and further output is appended there.
+    """
+
+    def __init__(self, spillDir=None, threshold=DEFAULT_SPILL_THRESHOLD):
+        self.spillDir   = spillDir
+        self.threshold  = threshold
+        self._decoder   = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._parts     = []
+        self._size      = 0
+        self._spillFile = None
+        self.hasOutput  = False
+
+    def write(self, data):
+        """Append a chunk of raw bytes."""
+        self._append(self._decoder.decode(data))
+
+    def close(self):
+        """Flush bytes of an incomplete UTF-8 sequence left at the end."""
+        self._append(self._decoder.decode(b"", final=True))
+
+    def _append(self, text):
+        if not text:
+            return
+        if not self.hasOutput and text.strip():
+            self.hasOutput = True
+        if self._spillFile:
+            self._spillFile.write(text)
+            return
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size > self.threshold:
+            self._spill()
+
+    def _spill(self):
+        """Move the in-memory text to a temp file."""
+        try:
+            spillDir = self.spillDir if self.spillDir and os.path.isdir(self.spillDir) else None
+            self._spillFile = tempfile.NamedTemporaryFile(
+                mode='w+', encoding='utf-8', dir=spillDir,
+                prefix="stdout-", suffix=".tmp", delete=True)
+            self._spillFile.write("".join(self._parts))
+            self._parts = []
+            self._size  = 0
+        except OSError as e:
+            # Keep buffering in memory rather than losing output
+            print(f"Could not spill provider output: {e}")
+            self._spillFile = None
+            self.threshold  = float("inf")
+
+    def getText(self):
+        """Return the complete captured text (read back from the spill file)."""
+        if not self._spillFile:
+            return "".join(self._parts)
+        self._spillFile.flush()
+        self._spillFile.seek(0)
+        text = self._spillFile.read()
+        self._spillFile.seek(0, os.SEEK_END)
+        return text
+
+    def discard(self):
+        """Release memory and delete the spill file."""
+        self._parts = []
+        if self._spillFile:
+            try:
+                self._spillFile.close()
+            except OSError:
+                pass
+            self._spillFile = None
+
+
+class StderrTail:
+    """
+    Keep the first `head` and the last `tail` lines of a stream, plus a count
+    of the lines dropped in between. Memory stays bounded however much a
+    provider writes to stderr.
+    """
+
+    def __init__(self, head=STDERR_HEAD_LINES, tail=STDERR_TAIL_LINES):
+        self.headLimit = head
+        self._head     = []
+        self._tail     = deque(maxlen=tail)
+        self.dropped   = 0
+
+    def addLine(self, line):
+        if len(self._head) < self.headLimit:
+            self._head.append(line)
+            return
+        if len(self._tail) == self._tail.maxlen:
+            self.dropped += 1
+        self._tail.append(line)
+
+    def feed(self, rawLine):
+        """Add one raw (bytes) line."""
+        self.addLine(rawLine.decode('utf-8', errors='replace').rstrip('\r\n'))
+
+    def text(self):
+        lines = list(self._head)
+        if self.dropped:
+            lines.append('... (truncated) ...')
+        lines.extend(self._tail)
+        return "\n".join(lines)
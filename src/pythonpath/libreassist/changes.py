@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# libreassist/changes.py - Detect what a provider run changed in a document
+#
+# A modification time says nothing about content: providers may rewrite
+# identical bytes, and coarse mtimes can hide real edits. summarizeChanges()
+# compares the document with the snapshot taken before the run instead.
+# ZIP packages are compared entry by entry from the CRC and size in the
+# central directory – no entry is read to classify it – and for ODF the
+# paragraph count of content.xml is compared with a streaming XML parse.
+
+import io
+import zipfile
+import xml.etree.ElementTree as ET
+
+from . import store, backup
+
+CONTENT_ENTRY   = "content.xml"
+_TEXT_NS        = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+PARAGRAPH_TAGS  = (_TEXT_NS + "p", _TEXT_NS + "h")
+
+
+class ChangeSummary:
+    """
+    Result of comparing a document with a snapshot.
+
+    Attributes:
+        changed:          Names of ZIP entries with different content
+        added:            Names of new entries
+        removed:          Names of entries that are gone
+        paragraphsBefore: Paragraphs and headings in content.xml, or None
+        paragraphsAfter:  Same after the run, or None
+        wholeFile:        True if the file was compared as a whole (no ZIP)
+    """
+
+    def __init__(self):
+        self.changed          = []
+        self.added            = []
+        self.removed          = []
+        self.paragraphsBefore = None
+        self.paragraphsAfter  = None
+        self.wholeFile        = False
+
+    @property
+    def modified(self):
+        return bool(self.changed or self.added or self.removed)
+
+    @property
+    def paragraphDelta(self):
+        if self.paragraphsBefore is None or self.paragraphsAfter is None:
+            return None
+        return self.paragraphsAfter - self.paragraphsBefore
+
+    def __str__(self):
+        if not self.modified:
+            return "unchanged"
+        if self.wholeFile:
+            return "file changed"
+        parts = []
+        if self.changed:
+            parts.append("changed " + ", ".join(self.changed))
+        if self.added:
+            parts.append("added " + ", ".join(self.added))
+        if self.removed:
+            parts.append("removed " + ", ".join(self.removed))
+        if self.paragraphDelta is not None:
+            parts.append(f"paragraphs {self.paragraphDelta:+d}")
+        return "; ".join(parts)
+
+
+def countParagraphs(stream):
+    """Number of text:p and text:h elements in an ODF content.xml stream."""
+    count = 0
+    for event, elem in ET.iterparse(stream, events=("end",)):
+        if elem.tag in PARAGRAPH_TAGS:
+            count += 1
+        elem.clear()
+    return count
+
+
+def summarizeChanges(fullPath, snapshotId):
+    """
+    Compare a document file with a snapshot of it.
+    Returns a ChangeSummary; if the snapshot is unknown, the file counts
+    as changed.
+    """
+    summary = ChangeSummary()
+    blob    = store.getSnapshotBlob(snapshotId) if snapshotId else None
+    if not blob or blob[2] != store.SNAPSHOT_ZIP or not zipfile.is_zipfile(fullPath):
+        summary.wholeFile = True
+        if not blob or blob[2] == store.SNAPSHOT_ZIP or backup.hashFile(fullPath) != blob[0]:
+            summary.changed.append(fullPath)
+        return summary
+
+    before = {e[0]: e for e in store.loadManifestEntries(blob[0])}
+    with zipfile.ZipFile(fullPath) as zf:
+        names = set()
+        for info in zf.infolist():
+            names.add(info.filename)
+            entry = before.get(info.filename)
+            if entry is None:
+                summary.added.append(info.filename)
+            elif (entry[2], entry[3]) != (info.CRC, info.file_size):
+                # Different CRC or size means different content; equal ones
+                # are taken as unchanged, as when snapshotting
+                summary.changed.append(info.filename)
+        summary.removed = [name for name in before if name not in names]
+
+        if CONTENT_ENTRY in summary.changed:
+            entry = before[CONTENT_ENTRY]
+            try:
+                summary.paragraphsBefore = countParagraphs(
+                    io.BytesIO(backup.readEntryBlob(entry[1], entry[6])))
+                with zf.open(CONTENT_ENTRY) as f:
+                    summary.paragraphsAfter = countParagraphs(f)
+            except (OSError, ET.ParseError) as e:
+                print(f"Error counting paragraphs: {e}")
+    return summary
@@ -2,13 +2,16 @@
 # libreassist/core.py - Core logic and provider routing
 
 import os
-import threading
+import re
+import time
 import importlib
+import threading
 import uno
 
 from .i18n import t
 from .document import getCurrentDocument
-from . import discovery, provider_base, settings, backup
+from . import discovery, provider_base, settings, backup, changes, storage, process_pool, scheduler, response_cache
+from .messages import Message, ROLE_ASSISTANT, ROLE_ERROR, userMessage as makeUserMessage
 
 
 # ---------------------------------------------------------------------------
@@ -18,53 +21,110 @@ from . import discovery, provider_base, settings, backup
 DEFAULT_PROVIDER = "claude_code"
 
 
-def _buildProviderRegistry():
-    """Build provider dicts from user provider config."""
-    from libreassist.settings import loadProviderConfig
-    config = loadProviderConfig()
-
-    providers    = {}
-    displayNames = {}
-
-    for name, entry in config.items():
-        providers[name]    = f"libreassist.providers.{name}"
-        displayNames[name] = entry.get("display_name", name.title())
+class ProviderRegistry:
+    """
+    Provider names, display names and chat aliases, derived from the provider
+    config. Rebuilt only when loadProviderConfig() returns a new config, i.e.
+    after providers.json was edited. Prompt prefixes ("claude ...") are
+    matched with one compiled regex, longest prefix first.
+    """
 
-    return providers, displayNames
+    def __init__(self):
+        self._lock    = threading.Lock()
+        self._config  = None
+        self._modules = {}      # Provider name → imported module
+        self.providers    = {}
+        self.displayNames = {}
+        self.aliases      = {}
+        self._prefixes    = None
+
+    def refresh(self):
+        """Rebuild the derived tables if the provider config changed."""
+        config = settings.loadProviderConfig()
+        if config is self._config:
+            return self
+        with self._lock:
+            if config is self._config:
+                return self
+            providers, displayNames, aliases = {}, {}, {}
+            for name, entry in config.items():
+                providers[name]    = f"libreassist.providers.{name}"
+                displayNames[name] = entry.get("display_name", name.title())
+                key = entry.get("alias") or entry.get("display_name", name).lower()
+                aliases[key] = name
+
+            prefixes = sorted(set(providers) | set(aliases), key=len, reverse=True)
+            self.providers    = providers
+            self.displayNames = displayNames
+            self.aliases      = aliases
+            self._prefixes    = re.compile(
+                "(" + "|".join(re.escape(p) for p in prefixes) + ") ") if prefixes else None
+            self._config = config
+        return self
+
+    def match(self, userText):
+        """
+        Split a chat input into (provider name, prompt) if it starts with a
+        provider name or alias followed by a space, else (None, userText).
+        """
+        match = self._prefixes.match(userText.lower()) if self._prefixes else None
+        if not match:
+            return None, userText
+        prefix = match.group(1)
+        return self.aliases.get(prefix, prefix), userText[len(prefix) + 1:]
+
+    def getModule(self, name):
+        """Return the imported provider module, or None if unknown or not importable."""
+        module = self._modules.get(name)
+        if module is None:
+            moduleName = self.providers.get(name)
+            if not moduleName:
+                return None
+            try:
+                module = importlib.import_module(moduleName)
+            except ImportError as e:
+                print(f"Error importing provider {name}: {e}")
+                return None
+            self._modules[name] = module
+        return module
+
+
+_registry = ProviderRegistry()
+
+
+def getRegistry():
+    """Return the provider registry, revalidated against providers.json."""
+    return _registry.refresh()
 
 
 def getProviders():
     """Return {name: module_path} dict for all configured providers."""
-    providers, _ = _buildProviderRegistry()
-    return providers
+    return getRegistry().providers
 
 
 def getDisplayNames():
     """Return {name: display_name} dict for all configured providers."""
-    _, displayNames = _buildProviderRegistry()
-    return displayNames
+    return getRegistry().displayNames
 
 
 def getAliases():
     """Return {alias: provider_name} for prefix matching in chat."""
-    from libreassist.settings import loadProviderConfig
-    config = loadProviderConfig()
-    aliases = {}
-    for name, entry in config.items():
-        key = entry.get("alias") or entry.get("display_name", name).lower()
-        aliases[key] = name
-    return aliases
+    return getRegistry().aliases
 
 
 # ---------------------------------------------------------------------------
-# Simple command handler (Undo / Redo only)
+# Simple command handler (Undo / Redo / Search)
 # ---------------------------------------------------------------------------
 
+SEARCH_COMMAND  = "__search__"
+SEARCH_SNIPPET  = 80     # Characters of message text shown per search hit
+
+
 def handleUserInput(userInput, currentHistory=""):
     """
     Handle special commands triggered from the chat input.
-    Only __undo__ and __redo__ are processed here; all LLM requests
-    go through callLLMAsync directly.
+    Only __undo__, __redo__ and __search__ <words> are processed here; all
+    LLM requests go through callLLMAsync directly.
 
     Returns: Response string for display
     """
@@ -72,29 +132,90 @@ def handleUserInput(userInput, currentHistory=""):
         return backup.restoreBackup()
     if userInput == "__redo__":
         return backup.restoreChanged()
+    if userInput.startswith(SEARCH_COMMAND):
+        return searchHistory(userInput[len(SEARCH_COMMAND):].strip())
     return ""
 
 
+def searchHistory(text):
+    """Search the chat histories of all documents and format the hits for the chat."""
+    if not text:
+        return t('search_usage')
+    hits = settings.searchHistory(text)
+    if not hits:
+        return t('search_no_results', query=text)
+
+    lines = [t('search_results', count=len(hits), query=text)]
+    firstWord = text.split()[0].lower()
+    for docPath, message in hits:
+        body  = " ".join(message.text.split())
+        found = max(0, body.lower().find(firstWord))
+        # Start the snippet at a word boundary a little before the first hit
+        start = 0 if found <= SEARCH_SNIPPET // 4 else body.rfind(" ", 0, found - SEARCH_SNIPPET // 4) + 1
+        snippet = body[start:start + SEARCH_SNIPPET]
+        if start > 0:
+            snippet = "…" + snippet
+        if start + SEARCH_SNIPPET < len(body):
+            snippet += "…"
+        when  = time.strftime("%Y-%m-%d %H:%M", time.localtime(message.timestamp))
+        label = message.label or message.role
+        lines.append(f"• {os.path.basename(docPath or '?')} ({when}) {label}: {snippet}")
+    return "\n".join(lines)
+
+
 # ---------------------------------------------------------------------------
 # Async LLM execution
 # ---------------------------------------------------------------------------
 
-def callLLMAsync(providerModule, userPrompt, currentHistory, completionCallback, doc=None):
+class StageTimer:
+    """Milliseconds spent in the named stages of one request."""
+
+    def __init__(self):
+        self.stages = []
+        self._last  = time.monotonic()
+
+    def mark(self, stage):
+        """End the current stage and start the next one."""
+        now = time.monotonic()
+        self.stages.append((stage, (now - self._last) * 1000))
+        self._last = now
+
+    def __str__(self):
+        return ", ".join(f"{stage} {ms:.0f} ms" for stage, ms in self.stages)
+
+
+def _enforceQuota():
+    """Batch job: evict stored data until the profile fits the quota again (best effort)."""
+    try:
+        storage.enforceQuota(settings.getLibreAssistDir())
+    except Exception as e:
+        print(f"Error enforcing storage quota: {e}")
+
+
+def callLLMAsync(providerModule, userPrompt, userText, completionCallback, doc=None,
+                 partialCallback=None, priority=scheduler.PRIORITY_INTERACTIVE):
     """
-    Run the CLI provider in a background thread.
+    Queue the CLI provider run on the central job scheduler.
     The completionCallback (XCallback) is invoked on the Main-UNO-Thread
-    when the subprocess finishes.
+    when the subprocess finishes. If a partialCallback (XCallback) is given,
+    it is invoked with throttled partial output while the provider is running.
 
-    All UNO API calls happen before the thread starts (Main-Thread only).
-    Everything inside _run() is pure Python / file I/O.
+    The Main-Thread only does what needs UNO: it captures the URL and the
+    frame and stores the document if it has unsaved changes. Settings,
+    prompt, snapshot and provider run happen inside _run(), which is pure
+    Python / file I/O. The scheduler runs at most one job per document.
+    Each stage is timed; the timings are logged (debug level) when the turn is done.
 
     Args:
         providerModule:     Imported provider module
         userPrompt:         The user's instruction
-        currentHistory:     Chat history up to and including the user message
+        userText:           The user message as shown in the chat (stored with the turn)
         completionCallback: XCallback instance
         doc:                Document object captured at click time; if None,
                             falls back to getCurrentDocument()
+        partialCallback:    Optional XCallback; its 'text' attribute is set
+                            before each partial update
+        priority:           scheduler.PRIORITY_INTERACTIVE or PRIORITY_BATCH
     """
     if doc is None:
         doc = getCurrentDocument()
@@ -113,59 +234,110 @@ def callLLMAsync(providerModule, userPrompt, currentHistory, completionCallback,
     directory = os.path.dirname(fullPath)
     filename  = os.path.basename(fullPath)
 
-    # --- All UNO calls must happen here, before the thread starts ---
+    # --- Main-Thread: only what needs UNO, before the job is queued ---
 
-    doc.store()
+    timer = StageTimer()
+    if doc.isModified():
+        doc.store()
+    timer.mark("store")
 
     docDir = settings.getDocSettingsDirForPath(fullPath)
+    frame  = doc.getCurrentController().getFrame()
 
-    if not backup.createBackup(fullPath, docDir):
-        completionCallback.payload = {"error": "Could not create backup!", "fileWasModified": False}
-        _fireCallback(completionCallback)
-        return
-
-    modTimeBefore = os.stat(fullPath).st_mtime
-
-    frame = doc.getCurrentController().getFrame()
-
-    settingsData = settings.loadSettingsForDir(docDir, fullPath)
-    sessionId = settingsData.get("session_ids", {}).get(providerModule.NAME)
-    timeout   = settingsData.get("timeout", 600)
-
-    globalSettings     = settings.loadGlobalSettings()
-    customInstructions = globalSettings.get("custom_instructions", "").strip()
-
-    basePrompt = (
-        f"You have access to {filename} in the current directory. "
-        f"This is a {os.path.splitext(filename)[1]} file. "
-        f"User request: {userPrompt}. "
-        "IMPORTANT: Write your response directly into the document by editing the file, "
-        "UNLESS the user is asking a pure information question (like 'what day is it?' or 'what's in the document?'). "
-        "For content creation, editing, or writing tasks, always modify the document directly. "
-        "Response format: Plain text only, no Markdown."
-    )
+    globalSettings = settings.loadGlobalSettings()
+    _configureScheduler(globalSettings)
 
-    if customInstructions:
-        fullPrompt = f"{basePrompt}\n\nMANDATORY: Apply these rules to your response:\n{customInstructions}"
-    else:
-        fullPrompt = basePrompt
+    userMessage = makeUserMessage(userText)
 
     # AsyncCallback must be created on the Main-Thread
     ctx     = uno.getComponentContext()
     asyncCb = ctx.ServiceManager.createInstance("com.sun.star.awt.AsyncCallback")
+    timer.mark("main thread")
 
-    # --- Background thread ---
+    # --- Background job ---
 
     def _run():
-        import shutil
-
+        timer.mark("queued")
+        startTime      = time.monotonic()
         responseText   = None
         newSessionId   = None
         fileWasModified = False
+        changeSummary  = None
+        displayName    = getDisplayNames().get(providerModule.NAME, "Assistant")
+        cacheKey       = None
+        providerOk     = False
+
+        settingsData = settings.loadSettingsForDir(docDir, fullPath)
+        sessionId = settingsData.get("session_ids", {}).get(providerModule.NAME)
+        timeout   = settingsData.get("timeout", 600)
+
+        customInstructions = globalSettings.get("custom_instructions", "").strip()
+        keepWarmFor        = fullPath if globalSettings.get("warm_processes", False) else None
+        useResponseCache   = globalSettings.get("response_cache", False)
+        responseCacheMb    = globalSettings.get("response_cache_max_mb", response_cache.DEFAULT_MAX_MB)
+        process_pool.getPool().idleTimeout = globalSettings.get(
+            "warm_idle_timeout", process_pool.DEFAULT_IDLE_TIMEOUT)
+
+        basePrompt = (
+            f"You have access to {filename} in the current directory. "
+            f"This is a {os.path.splitext(filename)[1]} file. "
+            f"User request: {userPrompt}. "
+            "IMPORTANT: Write your response directly into the document by editing the file, "
+            "UNLESS the user is asking a pure information question (like 'what day is it?' or 'what's in the document?'). "
+            "For content creation, editing, or writing tasks, always modify the document directly. "
+            "Response format: Plain text only, no Markdown."
+        )
+
+        if customInstructions:
+            fullPrompt = f"{basePrompt}\n\nMANDATORY: Apply these rules to your response:\n{customInstructions}"
+        else:
+            fullPrompt = basePrompt
+        timer.mark("settings")
+
+        if useResponseCache:
+            try:
+                cacheKey = response_cache.makeKey(providerModule.NAME, userPrompt, customInstructions,
+                                                  response_cache.hashFile(fullPath))
+                cached   = response_cache.lookup(cacheKey)
+            except OSError as e:
+                print(f"Response cache unavailable: {e}")
+                cacheKey = cached = None
+            timer.mark("cache lookup")
+            if cached is not None:
+                # Same question against unchanged content: no backup, no provider run
+                responseText    = f"{displayName}:\n{cached}"
+                responseMessage = Message(ROLE_ASSISTANT, cached, label=displayName,
+                                          provider=providerModule.NAME, sessionId=sessionId,
+                                          latency=time.monotonic() - startTime)
+                settings.saveTurnForDir(docDir, fullPath, [userMessage, responseMessage])
+                timer.mark("save")
+                print(f"Turn timings (cached): {timer}")
+                completionCallback.payload = {"response": responseText, "message": responseMessage,
+                                              "fileWasModified": False, "docDir": docDir, "frame": frame}
+                asyncCb.addCallback(completionCallback, None)
+                return
+
+        snapshotId = backup.createBackup(fullPath, docDir)
+        timer.mark("snapshot")
+        if snapshotId is None:
+            settings.saveTurnForDir(docDir, fullPath, [userMessage,
+                                    Message(ROLE_ERROR, "Could not create backup!")])
+            completionCallback.payload = {"error": "Could not create backup!", "fileWasModified": False,
+                                          "docDir": docDir}
+            asyncCb.addCallback(completionCallback, None)
+            return
 
         try:
             def _onProcess(proc):
                 completionCallback.process = proc
+                job = getattr(completionCallback, "job", None)
+                if job and job.cancelled:
+                    proc.kill()
+
+            def _onPartial(text):
+                # Already throttled by provider_base
+                partialCallback.text = f"{displayName}:\n{text.strip()}"
+                asyncCb.addCallback(partialCallback, None)
 
             result = provider_base.executeProvider(
                 providerModule,
@@ -173,25 +345,31 @@ def callLLMAsync(providerModule, userPrompt, currentHistory, completionCallback,
                 directory,
                 sessionId=sessionId,
                 timeout=timeout,
-                onProcess=_onProcess
+                onProcess=_onProcess,
+                onPartial=_onPartial if partialCallback else None,
+                keepWarmFor=keepWarmFor,
+                spillDir=docDir
             )
             collectedText  = result.get("response", "")
             newSessionId   = result.get("sessionId")
 
-            modTimeAfter    = os.stat(fullPath).st_mtime
-            fileWasModified = (modTimeAfter != modTimeBefore)
+            # Compare content with the snapshot, not the mtime
+            changeSummary   = changes.summarizeChanges(fullPath, snapshotId)
+            fileWasModified = changeSummary.modified
+            print(f"Document changes: {changeSummary}")
 
             if fileWasModified and hasattr(providerModule, 'postProcess'):
                 providerModule.postProcess(fullPath)
 
-            displayName  = getDisplayNames().get(providerModule.NAME, "Assistant")
             responseText = f"{displayName}:\n{collectedText.strip()}"
+            providerOk   = True
 
         except TimeoutError:
             responseText = t('error_timeout')
         except FileNotFoundError:
             responseText = t('error_not_found')
         except RuntimeError as e:
+            # stderr is already reduced to its first and last lines by provider_base
             stderr      = str(e)
             if "code -9" in stderr:
                 responseText = t('cancelled')
@@ -206,48 +384,94 @@ def callLLMAsync(providerModule, userPrompt, currentHistory, completionCallback,
                 elif "authentication" in stderrLower or "unauthorized" in stderrLower:
                     responseText = t('error_authentication')
                 else:
-                    lines    = stderr.split('\n')
-                    filtered = '\n'.join(lines[:10] + ['... (truncated) ...'] + lines[-10:]) if len(lines) > 30 else stderr
-                    responseText = t('error_provider', error=filtered)
-                responseText = t('error_provider', error=filtered)
+                    responseText = t('error_provider', error=stderr)
         except Exception as e:
             import traceback
             traceback.print_exc()
             responseText = t('error_general', error=str(e))
+        timer.mark("provider")
 
-        # Save session ID
-        settingsData2 = settings.loadSettingsForDir(docDir, fullPath)
-        session_ids   = settingsData2.get("session_ids", {})
-        session_ids[providerModule.NAME] = newSessionId
-        settingsData2["session_ids"]     = session_ids
-        settings.saveSettingsForDir(docDir, settingsData2, fullPath)
+        # Only answers that left the document untouched are worth caching
+        if cacheKey and providerOk and not fileWasModified and collectedText.strip():
+            response_cache.store(cacheKey, providerModule.NAME, collectedText.strip(), responseCacheMb)
 
-        # Save changed-state file and update undo/redo flags
+        # Add the changed document to the snapshot timeline (also sets the undo flags)
+        resultSnapshotId = None
         if fileWasModified and docDir:
-            changedPath = os.path.join(docDir, "changed" + os.path.splitext(filename)[1])
-            shutil.copy2(fullPath, changedPath)
-            backup._undo_state = "changed"
-            settingsData3 = settings.loadSettingsForDir(docDir, fullPath)
-            settingsData3["undo_available"] = True
-            settingsData3["redo_available"] = False
-            settings.saveSettingsForDir(docDir, settingsData3, fullPath)
-
-        # Save history
-        updatedHistory = currentHistory + responseText + "\n\n"
-        settings.saveHistoryForDir(docDir, updatedHistory)
+            resultSnapshotId = backup.recordSnapshot(fullPath, docDir)
+            timer.mark("result snapshot")
+
+        # Session ID and history in one transaction; the turn links to its snapshots
+        userMessage.snapshotId = snapshotId
+        if providerOk:
+            responseMessage = Message(ROLE_ASSISTANT, collectedText.strip(), label=displayName,
+                                      provider=providerModule.NAME, sessionId=newSessionId,
+                                      latency=time.monotonic() - startTime,
+                                      snapshotId=resultSnapshotId)
+        else:
+            responseMessage = Message(ROLE_ERROR, responseText, provider=providerModule.NAME)
+        settings.saveTurnForDir(docDir, fullPath, [userMessage, responseMessage],
+                                sessionIds={providerModule.NAME: newSessionId})
+        timer.mark("save")
+
+        droppedHistory = storage.takeHistoryNotice()
+        print(f"Turn timings: {timer}")
+        notice = t('storage_history_dropped', count=droppedHistory) if droppedHistory else None
 
         completionCallback.payload = {
             "response":        responseText,
+            "message":         responseMessage,
             "fileWasModified": fileWasModified,
             "docDir":          docDir,
             "frame":           frame,
-            "backupPath":      os.path.join(docDir, "backup" + os.path.splitext(filename)[1]),
+            "snapshotId":      snapshotId,
+            "changes":         changeSummary,
             "isWriter":        True,
+            "notice":          notice,
         }
         asyncCb.addCallback(completionCallback, None)
 
-    thread = threading.Thread(target=_run, daemon=True)
-    thread.start()
+        # New snapshots may push the profile over the storage quota; evict
+        # after the answer is shown (a dropped history is noticed next turn)
+        if resultSnapshotId:
+            scheduler.getScheduler().submit(_enforceQuota, scheduler.MAINTENANCE, None,
+                                            priority=scheduler.PRIORITY_BATCH)
+
+    def _onCancel():
+        # Runs on the Main-Thread when the job is cancelled while still queued
+        responseText = t('cancelled')
+        settings.saveTurnForDir(docDir, fullPath,
+                                [userMessage, Message(ROLE_ERROR, responseText, provider=providerModule.NAME)])
+        completionCallback.payload = {"response": responseText, "fileWasModified": False,
+                                      "docDir": docDir}
+        asyncCb.addCallback(completionCallback, None)
+
+    completionCallback.job = scheduler.getScheduler().submit(
+        _run, providerModule.NAME, fullPath, priority, onCancel=_onCancel)
+
+
+def cancelJob(completionCallback):
+    """
+    Cancel the request behind a completion callback.
+    Kills the provider process if it is running, otherwise drops the queued job.
+    """
+    job = getattr(completionCallback, "job", None)
+    if job:
+        job.cancelled = True
+    if completionCallback.process:
+        completionCallback.process.kill()
+    elif job:
+        scheduler.getScheduler().cancel(job)
+
+
+def _configureScheduler(globalSettings):
+    """Apply worker and per-provider concurrency limits from the settings."""
+    sched = scheduler.getScheduler()
+    sched.maxWorkers = globalSettings.get("max_workers", scheduler.DEFAULT_MAX_WORKERS)
+    sched.providerLimits = {
+        name: entry.get("max_concurrent", scheduler.DEFAULT_PROVIDER_LIMIT)
+        for name, entry in settings.loadProviderConfig().items()
+    }
 
 
 def _fireCallback(completionCallback):
@@ -256,23 +480,46 @@ def _fireCallback(completionCallback):
     ctx.ServiceManager.createInstance("com.sun.star.awt.AsyncCallback").addCallback(completionCallback, None)
 
 
+def releaseDocument(fullPath):
+    """
+    Release per-document resources when a document is closed or renamed.
+    Kills warm provider processes that belong to the document and lets the
+    storage quota evict its current snapshot.
+    """
+    if fullPath:
+        process_pool.getPool().closeOwner(fullPath)
+        storage.setDocumentOpen(fullPath, False)
+
+
 # ---------------------------------------------------------------------------
 # Provider discovery
 # ---------------------------------------------------------------------------
 
-def discoverProviders():
+def discoverProviders(rescan=False):
     """
-    Discover all installed CLI providers and cache results in global settings.
-    Called once on startup.
+    Return installed CLI providers, served from the discovery cache in global
+    settings while it is fresh (TTL and environment fingerprint).
+
+    Args:
+        rescan: Force a new probe of all providers
+
+    Returns:
+        dict mapping providerName → full executable path
     """
-    from libreassist.settings import loadProviderConfig
-    config      = loadProviderConfig()
+    globalSettings = settings.loadGlobalSettings()
+    if not rescan and discovery.isDiscoveryFresh(
+            globalSettings.get("discovery_time"), globalSettings.get("discovery_fingerprint")):
+        return globalSettings.get("discovered_providers", {})
+
+    config      = settings.loadProviderConfig()
     allProviders = list(config.keys())
 
-    found = discovery.discoverAllProviders(allProviders)
+    found = discovery.discoverAllProviders(allProviders, config)
+    discovery.clearResolvedCache()
 
-    globalSettings = settings.loadGlobalSettings()
-    globalSettings["discovered_providers"] = found
-    settings.saveGlobalSettings(globalSettings)
+    settings.updateGlobalSettings(
+        discovered_providers  = found,
+        discovery_time        = time.time(),
+        discovery_fingerprint = discovery.getDiscoveryFingerprint())
 
     return found
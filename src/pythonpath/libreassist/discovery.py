@@ -4,15 +4,53 @@
 
 import os
 import sys
+import time
 import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
+# Seconds a stored discovery result is trusted (if the fingerprint still matches)
+DISCOVERY_TTL = 24 * 60 * 60
 
-def findExecutable(name):
+# Resolved executables: providerName -> (path, st_mtime, PATH at resolve time)
+_resolvedCache = {}
+_nodeCache     = None   # (path, st_mtime, PATH) of the last findNodeJS() hit
+_cacheLock     = threading.Lock()
+
+
+class _InstallPaths:
+    """
+    npm global and nvm directories, resolved lazily and at most once.
+    Shared by all probes of one discovery run, so 'npm config get prefix'
+    is spawned once instead of once per missing provider.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._npm  = None
+        self._nvm  = None
+
+    def npm(self):
+        with self._lock:
+            if self._npm is None:
+                self._npm = _getNpmGlobalPaths()
+            return self._npm
+
+    def nvm(self):
+        with self._lock:
+            if self._nvm is None:
+                self._nvm = _getNvmNodePaths()
+            return self._nvm
+
+
+def findExecutable(name, installPaths=None):
     """
     Find an executable in system PATH or common installation locations.
 
     Args:
-        name: Executable name (e.g. 'claude', 'codex', 'gemini')
+        name:         Executable name (e.g. 'claude', 'codex', 'gemini')
+        installPaths: Optional shared _InstallPaths of the current discovery run
 
     Returns:
         Full path string or None if not found
@@ -23,14 +61,14 @@ def findExecutable(name):
         return found
 
     # 2. Check common installation locations
-    for candidate in _getCommonInstallPaths(name):
+    for candidate in _getCommonInstallPaths(name, installPaths or _InstallPaths()):
         if os.path.exists(candidate):
             return candidate
 
     return None
 
 
-def _getCommonInstallPaths(name):
+def _getCommonInstallPaths(name, installPaths):
     """
     Return list of common installation paths for a given executable name.
     Covers Linux, macOS and Windows.
@@ -61,12 +99,12 @@ def _getCommonInstallPaths(name):
             paths.append(os.path.join(homeDir, ".local", "share", "uv", "tools", "mistral-vibe", "bin", name))
 
     # npm global locations
-    for npmDir in _getNpmGlobalPaths():
+    for npmDir in installPaths.npm():
         exe = f"{name}.cmd" if isWindows else name
         paths.append(os.path.join(npmDir, exe))
 
     # nvm locations (newest Node version first)
-    for nvmDir in _getNvmNodePaths():
+    for nvmDir in installPaths.nvm():
         exe = f"{name}.cmd" if isWindows else name
         paths.append(os.path.join(nvmDir, "bin", exe))
 
@@ -98,19 +136,22 @@ def _getNpmGlobalPaths():
             ]
 
 
+def _getNvmRoots():
+    """Return the nvm version directories for Unix nvm and nvm-windows."""
+    homeDir = os.path.expanduser("~")
+    return [
+        os.path.join(homeDir, ".nvm", "versions", "node"),          # Unix
+        os.path.join(homeDir, "AppData", "Roaming", "nvm"),         # Windows nvm-windows
+    ]
+
+
 def _getNvmNodePaths():
     """
     Return nvm Node.js installation directories, sorted newest first.
     """
-    homeDir = os.path.expanduser("~")
     paths = []
 
-    nvmRoots = [
-        os.path.join(homeDir, ".nvm", "versions", "node"),          # Unix
-        os.path.join(homeDir, "AppData", "Roaming", "nvm"),         # Windows nvm-windows
-    ]
-
-    for nvmRoot in nvmRoots:
+    for nvmRoot in _getNvmRoots():
         if not os.path.isdir(nvmRoot):
             continue
         try:
@@ -127,7 +168,7 @@ def _getNvmNodePaths():
     return paths
 
 
-def discoverProvider(providerName):
+def discoverProvider(providerName, config=None, installPaths=None):
     """
     Discover a single provider by its module NAME constant.
     Reads executable name from user provider config.
@@ -135,13 +176,16 @@ def discoverProvider(providerName):
     Args:
         providerName: Value of provider module's NAME constant
                       (e.g. 'claude_code', 'codex_cli')
+        config:       Optional provider config (avoids re-reading providers.json)
+        installPaths: Optional shared _InstallPaths of the current discovery run
 
     Returns:
         Full path string or None if not found
     """
     try:
-        from libreassist.settings import loadProviderConfig
-        config = loadProviderConfig()
+        if config is None:
+            from libreassist.settings import loadProviderConfig
+            config = loadProviderConfig()
         entry = config.get(providerName, {})
         execName = entry.get("executable")
     except Exception:
@@ -150,34 +194,143 @@ def discoverProvider(providerName):
     if not execName:
         return None
 
-    return findExecutable(execName)
+    return findExecutable(execName, installPaths)
 
 
-def discoverAllProviders(providerNames):
+def discoverAllProviders(providerNames, config=None):
     """
     Discover all providers from a list of provider NAME constants.
+    The npm prefix and nvm versions are resolved once, and all providers
+    are probed concurrently.
 
     Args:
         providerNames: List of provider NAME strings
+        config:        Optional provider config (avoids re-reading providers.json)
 
     Returns:
         dict mapping providerName → full executable path
     """
-    discovered = {}
-    for name in providerNames:
-        path = discoverProvider(name)
-        if path:
-            discovered[name] = path
-    return discovered
+    if not providerNames:
+        return {}
+    if config is None:
+        from libreassist.settings import loadProviderConfig
+        config = loadProviderConfig()
+
+    installPaths = _InstallPaths()
+    with ThreadPoolExecutor(max_workers=len(providerNames)) as pool:
+        paths = list(pool.map(
+            lambda name: discoverProvider(name, config, installPaths), providerNames))
+
+    return {name: path for name, path in zip(providerNames, paths) if path}
+
+
+def getDiscoveryFingerprint():
+    """
+    Return a cheap fingerprint of the environment discovery depends on:
+    PATH and the mtimes of the nvm version directories.
+    """
+    parts = [os.environ.get("PATH", "")]
+    for nvmRoot in _getNvmRoots():
+        try:
+            parts.append(f"{nvmRoot}:{os.stat(nvmRoot).st_mtime}")
+        except OSError:
+            pass
+    return hashlib.sha256("\n".join(parts).encode('utf-8')).hexdigest()
+
+
+def isDiscoveryFresh(timestamp, fingerprint):
+    """Check whether a stored discovery result is within its TTL and fingerprint."""
+    if not timestamp or not fingerprint:
+        return False
+    if time.time() - timestamp > DISCOVERY_TTL:
+        return False
+    return fingerprint == getDiscoveryFingerprint()
+
+
+def _isStillValid(entry):
+    """Check a cache entry (path, st_mtime, PATH) with one stat() call."""
+    if not entry:
+        return False
+    path, mtime, pathEnv = entry
+    if pathEnv != os.environ.get("PATH", ""):
+        return False
+    try:
+        return os.stat(path).st_mtime == mtime
+    except OSError:
+        return False
+
+
+def _cacheEntry(path):
+    """Build a cache entry for path, or None if it cannot be stat()ed."""
+    try:
+        return (path, os.stat(path).st_mtime, os.environ.get("PATH", ""))
+    except OSError:
+        return None
+
+
+def resolveProvider(providerName, knownPaths=None):
+    """
+    Resolve a provider's executable, using cached results where possible.
+    Order: in-memory cache (validated by mtime and PATH), then the path
+    stored by the last discovery run, then a full discoverProvider().
+
+    Args:
+        providerName: Provider NAME constant
+        knownPaths:   Optional {providerName: path} from a previous discovery
+                      (e.g. global settings 'discovered_providers')
+
+    Returns:
+        Full path string or None if not found
+    """
+    with _cacheLock:
+        entry = _resolvedCache.get(providerName)
+    if _isStillValid(entry):
+        return entry[0]
+
+    path = (knownPaths or {}).get(providerName)
+    if not path or not os.path.isfile(path):
+        path = discoverProvider(providerName)
+
+    entry = _cacheEntry(path) if path else None
+    with _cacheLock:
+        if entry:
+            _resolvedCache[providerName] = entry
+        else:
+            _resolvedCache.pop(providerName, None)
+    return path
+
+
+def clearResolvedCache():
+    """Forget all resolved executables (e.g. after a rescan)."""
+    global _nodeCache
+    with _cacheLock:
+        _resolvedCache.clear()
+        _nodeCache = None
 
 
 def findNodeJS():
     """
     Find Node.js v20+ installation, preferring newest nvm version.
-    
+    The result is cached and revalidated by mtime and PATH.
+
     Returns:
         Full path to node executable or None if not found
     """
+    global _nodeCache
+
+    with _cacheLock:
+        entry = _nodeCache
+    if _isStillValid(entry):
+        return entry[0]
+
+    path = _findNodeJS()
+    with _cacheLock:
+        _nodeCache = _cacheEntry(path) if path else None
+    return path
+
+
+def _findNodeJS():
+    """Uncached Node.js v20+ lookup."""
     import subprocess
     
     # 1. Check nvm installations (newest first)
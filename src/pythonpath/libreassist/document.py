@@ -2,6 +2,8 @@
 # libreassist/document.py - Document operations
 
 import uno
+import unohelper
+from com.sun.star.document import XDocumentEventListener
 
 
 def getCurrentDocument():
@@ -55,3 +57,129 @@ def getDocumentPath():
     except Exception as e:
         print("Error in getDocumentPath:", e)
         return (None, None, None)
+
+
+# ---------------------------------------------------------------------------
+# Reload in place
+# ---------------------------------------------------------------------------
+
+_pendingRestorers = {}    # URL being reloaded → its _ViewDataRestorer
+_reloading        = {}    # URL being reloaded → callbacks waiting for the new model
+
+
+class _ViewDataRestorer(unohelper.Base, XDocumentEventListener):
+    """
+    One-shot listener on the global event broadcaster: when the reloaded
+    document with the given URL has its view again, restore the cursor and
+    scroll position saved before the reload.
+    """
+
+    def __init__(self, broadcaster, url, viewData):
+        self.broadcaster = broadcaster
+        self.url         = url
+        self.viewData    = viewData
+
+    def documentEventOccured(self, event):
+        if event.EventName not in ("OnViewCreated", "OnLoad"):
+            return
+        try:
+            doc = event.Source
+            if doc.getURL() != self.url:
+                return
+            controller = doc.getCurrentController()
+            if controller and self.viewData is not None:
+                controller.restoreViewData(self.viewData)
+        except Exception as e:
+            print(f"Error restoring view position: {e}")
+        if event.EventName == "OnLoad":
+            self.remove()
+            for callback in _reloading.pop(self.url, []):
+                try:
+                    callback(event.Source)
+                except Exception as e:
+                    print(f"Error after reloading document: {e}")
+
+    def remove(self):
+        try:
+            self.broadcaster.removeDocumentEventListener(self)
+        except Exception:
+            pass
+        if _pendingRestorers.get(self.url) is self:
+            del _pendingRestorers[self.url]
+
+    def disposing(self, event):
+        pass
+
+
+def reloadDocument(frame, discard=False):
+    """
+    Reload the document of a frame from disk in the same window (.uno:Reload)
+    and put the view back where it was. Unsaved changes are discarded
+    without asking only with discard; otherwise LibreOffice asks first and
+    the document stays as it is if the user keeps the changes. Only call
+    from the Main-UNO-Thread.
+    """
+    controller = frame.getController()
+    doc        = controller.getModel()
+    url        = doc.getURL()
+    try:
+        viewData = controller.getViewData()
+    except Exception:
+        viewData = None
+
+    ctx = uno.getComponentContext()
+    if url in _pendingRestorers:
+        _pendingRestorers[url].remove()
+    broadcaster = ctx.getValueByName("/singletons/com.sun.star.frame.theGlobalEventBroadcaster")
+    restorer    = _ViewDataRestorer(broadcaster, url, viewData)
+    _pendingRestorers[url] = restorer
+    broadcaster.addDocumentEventListener(restorer)
+    _reloading.setdefault(url, [])
+
+    if discard:
+        # Otherwise Reload asks whether to discard the changes
+        doc.setModified(False)
+    mayAsk     = doc.isModified()
+    dispatcher = ctx.ServiceManager.createInstance("com.sun.star.frame.DispatchHelper")
+    try:
+        dispatcher.executeDispatch(frame, ".uno:Reload", "", 0, ())
+    except Exception:
+        _cancelReload(restorer)
+        raise
+    try:
+        # The user chose to keep the changes: the old model is still shown
+        if mayAsk and frame.getController().getModel() == doc:
+            _cancelReload(restorer)
+    except Exception:
+        pass
+
+
+def _cancelReload(restorer):
+    restorer.remove()
+    _reloading.pop(restorer.url, None)
+
+
+def followReload(doc, callback):
+    """
+    Called when a document model is unloaded. If this is the old model of a
+    reload (and not a closed window), call callback(new model) – now if the
+    new model is loaded already, otherwise on its OnLoad – and return True.
+    Returns False if the document was really closed.
+    """
+    url = doc.getURL()
+    if not url:
+        return False
+    desktop = uno.getComponentContext().ServiceManager.createInstance("com.sun.star.frame.Desktop")
+    components = desktop.getComponents().createEnumeration()
+    while components.hasMoreElements():
+        other = components.nextElement()
+        try:
+            if other != doc and hasattr(other, "getURL") and other.getURL() == url:
+                callback(other)
+                return True
+        except Exception:
+            continue
+    if url not in _reloading:
+        return False
+    _reloading[url].append(callback)
+    return True
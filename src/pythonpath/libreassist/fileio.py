@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# libreassist/fileio.py - Fast file copies for snapshots and restores
+#
+# copyFile() tries the cheapest way the file systems involved support:
+#   1. reflink (FICLONE ioctl, Linux btrfs/XFS) – shares extents, O(1)
+#   2. copy_file_range() / sendfile() – copies inside the kernel
+#   3. a plain buffered copy
+# The first method that fails with "not supported" is remembered per pair of
+# devices (st_dev of source and target directory), so later copies go
+# straight to the method that works. Hard links are not used: providers and
+# LibreOffice may rewrite a document in place, which would change the
+# snapshot as well.
+
+import errno
+import os
+import shutil
+import sys
+import threading
+
+METHOD_REFLINK    = "reflink"
+METHOD_COPY_RANGE = "copy_file_range"
+METHOD_SENDFILE   = "sendfile"
+METHOD_COPY       = "copy"
+
+FICLONE = 0x40049409          # _IOW(0x94, 9, int) from linux/fs.h
+CHUNK   = 8 * 1024 * 1024     # Bytes per copy_file_range / sendfile call
+
+# errno values meaning "this method does not work here", not "the copy failed"
+_UNSUPPORTED = {errno.EOPNOTSUPP, errno.ENOTSUP, errno.EXDEV, errno.EINVAL,
+                errno.ENOTTY, errno.ENOSYS, errno.EBADF, errno.EPERM}
+
+_lock         = threading.Lock()
+_capabilities = {}     # (source st_dev, target st_dev) → methods known to fail
+_reported     = {}     # (source st_dev, target st_dev) → method last printed
+
+
+def _methods():
+    methods = []
+    if sys.platform.startswith("linux"):
+        methods.append(METHOD_REFLINK)
+        if hasattr(os, "copy_file_range"):
+            methods.append(METHOD_COPY_RANGE)
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        methods.append(METHOD_SENDFILE)
+    methods.append(METHOD_COPY)
+    return methods
+
+
+def _reflink(src, dst, size):
+    import fcntl
+    fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def _copyRange(src, dst, size):
+    offset = 0
+    while offset < size:
+        sent = os.copy_file_range(src.fileno(), dst.fileno(), min(CHUNK, size - offset))
+        if sent == 0:
+            break
+        offset += sent
+    _checkLength("copy_file_range", offset, size)
+
+
+def _sendfile(src, dst, size):
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(dst.fileno(), src.fileno(), offset, min(CHUNK, size - offset))
+        if sent == 0:
+            break
+        offset += sent
+    _checkLength("sendfile", offset, size)
+
+
+class _ShortCopy(OSError):
+    """A kernel copy ended before the size the source had when it was opened."""
+
+
+def _checkLength(method, copied, size):
+    if copied == 0 and size:
+        # Some file systems report success without copying anything
+        raise OSError(errno.EOPNOTSUPP, f"{method} copied nothing")
+    if copied != size:
+        # The source shrank or the kernel stopped early: retry with the next
+        # method rather than keep a truncated file
+        raise _ShortCopy(errno.EIO, f"{method} copied {copied} of {size} bytes")
+
+
+def _plainCopy(src, dst, size):
+    shutil.copyfileobj(src, dst, CHUNK)
+
+
+_COPIERS = {
+    METHOD_REFLINK:    _reflink,
+    METHOD_COPY_RANGE: _copyRange,
+    METHOD_SENDFILE:   _sendfile,
+    METHOD_COPY:       _plainCopy,
+}
+
+
+def copyFile(srcPath, dstPath, keepStat=False):
+    """
+    Copy the content of srcPath to dstPath (created or truncated), like
+    shutil.copyfile(), or like shutil.copy2() with keepStat (permissions
+    and times are copied too). Returns the method that was used.
+    """
+    with open(srcPath, 'rb') as src:
+        srcStat = os.fstat(src.fileno())
+        dstDir  = os.path.dirname(os.path.abspath(dstPath))
+        devices = (srcStat.st_dev, os.stat(dstDir).st_dev)
+        with _lock:
+            failed = set(_capabilities.get(devices, ()))
+
+        for method in _methods():
+            if method in failed:
+                continue
+            src.seek(0)
+            with open(dstPath, 'wb') as dst:
+                try:
+                    _COPIERS[method](src, dst, srcStat.st_size)
+                except _ShortCopy as e:
+                    print(f"Copy of {srcPath} incomplete, retrying: {e}")
+                    continue
+                except OSError as e:
+                    if method == METHOD_COPY or e.errno not in _UNSUPPORTED:
+                        raise
+                    _markUnsupported(devices, method)
+                    continue
+            if keepStat:
+                shutil.copystat(srcPath, dstPath)
+            _report(devices, method)
+            return method
+
+
+def _report(devices, method):
+    """Print the copy method once per device pair, and again when it changes."""
+    with _lock:
+        if _reported.get(devices) == method:
+            return
+        _reported[devices] = method
+    print(f"Copying files from device {devices[0]} to {devices[1]} with {method}")
+
+
+def _markUnsupported(devices, method):
+    with _lock:
+        _capabilities.setdefault(devices, set()).add(method)
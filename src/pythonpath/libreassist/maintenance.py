@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# libreassist/maintenance.py - Background cleanup of the LibreAssist data directory
+#
+# Cleanup works from the manifest in the documents table (doc key → path,
+# last used, last checked, directory size) instead of opening every
+# directory. Paths are checked in short slices with pauses in between, up to
+# a total time budget, least recently checked first, so an interrupted run
+# continues where it stopped the next time. Paths on mounts that do not
+# answer in time are skipped instead of blocking the cleanup.
+#
+# Directories of open documents and directories younger than STRAY_GRACE are
+# never removed: a document gets its directory when the panel opens, before
+# its first turn creates the manifest row.
+
+import os
+import shutil
+import threading
+import time
+
+from . import store, archive, backup, storage
+
+SLICE_SECONDS = 0.05   # Work per slice before pausing
+SLICE_PAUSE   = 0.05   # Pause between slices
+TIME_BUDGET   = 5.0    # Seconds of path checks per run
+STAT_TIMEOUT  = 1.0    # Seconds before a mount counts as unavailable
+STRAY_GRACE   = 24 * 60 * 60   # Seconds a directory without manifest path is kept
+
+
+class CleanupStats:
+    """Counters of one cleanup run, printed for capacity planning."""
+
+    def __init__(self):
+        self.started     = time.monotonic()
+        self.documents   = 0    # Documents in the manifest
+        self.checked     = 0
+        self.removed     = 0
+        self.skipped     = 0    # On unavailable mounts
+        self.deferred    = 0    # Left for the next run (time budget)
+        self.strayDirs   = 0    # Directories missing from the manifest
+        self.freedBytes  = 0
+        self.blobsFreed  = 0    # Snapshot blobs no longer referenced
+        self.compacted   = 0
+        self.archived    = 0
+        self.evicted     = 0    # Documents whose data was evicted for the quota
+        self.usage       = None
+
+    def __str__(self):
+        return (f"Cleanup: {self.checked}/{self.documents} documents checked in "
+                f"{(time.monotonic() - self.started) * 1000:.0f} ms, {self.removed} removed, "
+                f"{self.skipped} skipped (unavailable mount), {self.deferred} deferred, "
+                f"{self.strayDirs} stray directories, {self.freedBytes / 1024 / 1024:.1f} MB freed, "
+                f"{self.blobsFreed} snapshots released; "
+                f"history: {self.compacted} compacted, {self.archived} archived, "
+                f"{self.evicted} documents evicted; storage {self.usage}")
+
+
+def pathExists(path, timeout=STAT_TIMEOUT):
+    """
+    os.path.exists() that gives up after timeout seconds.
+    Returns True, False, or None if the file system did not answer.
+    """
+    result = []
+    worker = threading.Thread(target=lambda: result.append(os.path.exists(path)), daemon=True)
+    worker.start()
+    worker.join(timeout)
+    return result[0] if result else None
+
+
+def _mountKey(path):
+    """Drive, UNC share or first two path components – a stand-in for the mount point."""
+    drive, rest = os.path.splitdrive(path)
+    if drive:
+        return drive.lower()
+    parts = [p for p in rest.split(os.sep) if p]
+    return os.sep + os.sep.join(parts[:2])
+
+
+def _isProtected(baseDir, docKey, openKeys):
+    """True for directories of open documents and directories changed within STRAY_GRACE."""
+    if docKey in openKeys:
+        return True
+    try:
+        return time.time() - os.path.getmtime(os.path.join(baseDir, docKey)) < STRAY_GRACE
+    except OSError:
+        return False
+
+
+def runCleanup(baseDir, timeBudget=TIME_BUDGET, hotTurns=archive.DEFAULT_HOT_TURNS,
+               quotaMb=None):
+    """
+    Remove data of documents that no longer exist, then compact, archive
+    and apply the storage quota. Returns a CleanupStats.
+    """
+    stats     = CleanupStats()
+    documents = store.listDocumentsByCheck()
+    stats.documents = len(documents)
+    deadline  = stats.started + timeBudget
+    sliceEnd  = time.monotonic() + SLICE_SECONDS
+
+    from libreassist.settings import docKeyForPath
+    openKeys = {docKeyForPath(path) for path in storage.getOpenPaths()}
+
+    found, orphans = [], []
+    unavailable = set()
+    for index, (docKey, docPath, size) in enumerate(documents):
+        now = time.monotonic()
+        if now >= deadline:
+            stats.deferred = len(documents) - index
+            break
+        if now >= sliceEnd:
+            time.sleep(SLICE_PAUSE)
+            sliceEnd = time.monotonic() + SLICE_SECONDS
+
+        if not docPath:
+            # E.g. imported from a settings.json without document_path
+            if not _isProtected(baseDir, docKey, openKeys):
+                orphans.append((docKey, size))
+            continue
+        mount = _mountKey(docPath)
+        if mount in unavailable:
+            stats.skipped += 1
+            continue
+        exists = pathExists(docPath)
+        if exists is None:
+            unavailable.add(mount)
+            stats.skipped += 1
+            continue
+        stats.checked += 1
+        if exists:
+            found.append(docKey)
+        else:
+            orphans.append((docKey, size))
+
+    with store.transaction() as conn:
+        store.markChecked(conn, found)
+        for docKey, size in orphans:
+            store.deleteDocument(conn, docKey)
+        # Drop messages hidden by "Clear History"
+        stats.compacted = store.compactMessages(conn)
+
+    for docKey, size in orphans:
+        shutil.rmtree(os.path.join(baseDir, docKey), ignore_errors=True)
+        stats.removed    += 1
+        stats.freedBytes += size
+    # Snapshots of removed documents no longer hold their blobs
+    stats.blobsFreed = backup.collectGarbage()
+
+    # Directories the manifest does not know (e.g. left over by a crash)
+    known = {docKey for docKey, docPath in store.listDocuments()}
+    for entry in os.scandir(baseDir):
+        if (store.DOC_DIR_NAME.match(entry.name) and entry.is_dir() and entry.name not in known
+                and not _isProtected(baseDir, entry.name, openKeys)):
+            shutil.rmtree(entry.path, ignore_errors=True)
+            stats.strayDirs += 1
+
+    # Move old turns into compressed segments, then apply the storage quota
+    stats.archived = archive.archiveAll(baseDir, hotTurns)
+    stats.usage, stats.evicted = storage.enforceQuota(baseDir, quotaMb)
+    return stats
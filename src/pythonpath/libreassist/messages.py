@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# libreassist/messages.py - Chat message model and search tokenizer
+#
+# A chat history is a list of Message objects. The store keeps one row per
+# message with its metadata; the chat view renders them with render().
+
+import re
+import time
+
+ROLE_USER      = "user"
+ROLE_ASSISTANT = "assistant"
+ROLE_ERROR     = "error"      # Error or status text instead of a response
+ROLE_COMMAND   = "command"    # Output of a __command__ (undo, redo, search)
+ROLE_LEGACY    = "legacy"     # History imported from history.txt as one block
+ROLE_CLEAR     = "clear"      # Marker: all earlier messages were cleared
+
+# Roles whose text is added to the search index
+SEARCHABLE_ROLES = (ROLE_USER, ROLE_ASSISTANT, ROLE_LEGACY)
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+MIN_TERM_LENGTH = 2
+
+
+class Message:
+    """
+    One chat message.
+
+    Attributes:
+        id:         Row ID in the store, None until stored
+        role:       One of the ROLE_* constants
+        text:       Message text without the label line
+        label:      Display label ("User", provider display name), or None
+        provider:   Provider name (e.g. "claude_code") of a response
+        timestamp:  Creation time (seconds since the epoch)
+        latency:    Seconds from job start to response, for responses
+        sessionId:  Provider session the response belongs to
+        snapshotId: Document snapshot of the turn: the state before it for the
+                    user message, the changed document for the response
+    """
+
+    def __init__(self, role, text, label=None, provider=None, timestamp=None,
+                 latency=None, sessionId=None, snapshotId=None, id=None):
+        self.id         = id
+        self.role       = role
+        self.text       = text
+        self.label      = label
+        self.provider   = provider
+        self.timestamp  = time.time() if timestamp is None else timestamp
+        self.latency    = latency
+        self.sessionId  = sessionId
+        self.snapshotId = snapshotId
+
+    def render(self):
+        """Text as shown in the chat view, including the blank separator line."""
+        if self.label:
+            return f"{self.label}:\n{self.text}\n\n"
+        return f"{self.text}\n\n"
+
+    def __repr__(self):
+        return f"Message({self.role!r}, id={self.id}, provider={self.provider!r})"
+
+
+def userMessage(text):
+    return Message(ROLE_USER, text, label="User")
+
+
+def tokenize(text):
+    """Distinct lowercase search terms of a text."""
+    return {w for w in _WORD.findall(text.lower()) if len(w) >= MIN_TERM_LENGTH}
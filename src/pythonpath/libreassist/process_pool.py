@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# libreassist/process_pool.py - Warm, reusable provider processes
+#
+# CLIs that accept streamed input (e.g. Claude's stream-json input mode) can
+# serve several turns from one long-lived process. The pool keeps such
+# processes warm between turns, keyed by (provider, document directory,
+# session), and kills them after an idle timeout or when their document closes.
+
+import atexit
+import threading
+import time
+
+from . import capture
+
+DEFAULT_IDLE_TIMEOUT = 300   # Seconds a warm process may sit unused
+_REAP_INTERVAL       = 30    # Seconds between idle checks
+_STDERR_TAIL_LINES   = 20    # stderr lines kept per warm process
+
+
+class WarmProcess:
+    """A long-lived provider process plus the bookkeeping the pool needs."""
+
+    def __init__(self, key, process, owner=None):
+        self.key      = key
+        self.process  = process
+        self.owner    = owner         # Document path the process belongs to
+        self.lastUsed = time.monotonic()
+        # Only the tail: the process outlives many turns
+        self.stderrTail = capture.StderrTail(head=0, tail=_STDERR_TAIL_LINES)
+
+        # Drain stderr for the lifetime of the process so it never blocks
+        self._stderrThread = threading.Thread(target=self._drainStderr, daemon=True)
+        self._stderrThread.start()
+
+    def _drainStderr(self):
+        try:
+            for rawLine in self.process.stderr:
+                self.stderrTail.feed(rawLine)
+        except Exception:
+            pass
+
+    def stderrText(self):
+        return self.stderrTail.text()
+
+    def isAlive(self):
+        return self.process.poll() is None
+
+    def kill(self):
+        try:
+            if self.isAlive():
+                self.process.kill()
+            self.process.wait()
+        except Exception as e:
+            print(f"Error killing warm process: {e}")
+
+
+class ProcessPool:
+    """
+    Thread-safe pool of idle WarmProcess objects.
+    A process is removed from the pool while a turn is running on it and
+    handed back with release() once the turn completed cleanly.
+    """
+
+    def __init__(self, idleTimeout=DEFAULT_IDLE_TIMEOUT):
+        self.idleTimeout = idleTimeout
+        self._lock       = threading.Lock()
+        self._idle       = {}      # key -> WarmProcess
+        self._closed     = set()   # Owners closed while one of their turns was running
+        self._reaper     = None
+
+    def acquire(self, key):
+        """Take the idle process for key out of the pool, or return None."""
+        with self._lock:
+            warm = self._idle.pop(key, None)
+        if warm and not warm.isAlive():
+            return None
+        return warm
+
+    def release(self, warm, key):
+        """Hand a process back after a completed turn, stored under its (new) key."""
+        with self._lock:
+            if warm.owner in self._closed or not warm.isAlive():
+                stale = warm
+            else:
+                stale = self._idle.pop(key, None)
+                warm.key      = key
+                warm.lastUsed = time.monotonic()
+                self._idle[key] = warm
+                self._startReaper()
+        if stale:
+            stale.kill()
+
+    def open(self, owner):
+        """Mark a document as open again (after it was closed and reopened)."""
+        with self._lock:
+            self._closed.discard(owner)
+
+    def closeOwner(self, owner):
+        """Kill all idle processes of a document; running ones die on release()."""
+        with self._lock:
+            self._closed.add(owner)
+            victims = [k for k, w in self._idle.items() if w.owner == owner]
+            doomed  = [self._idle.pop(k) for k in victims]
+        for warm in doomed:
+            warm.kill()
+
+    def evictIdle(self):
+        """Kill processes that have been idle for longer than idleTimeout."""
+        now = time.monotonic()
+        with self._lock:
+            victims = [k for k, w in self._idle.items()
+                       if now - w.lastUsed > self.idleTimeout or not w.isAlive()]
+            doomed  = [self._idle.pop(k) for k in victims]
+        for warm in doomed:
+            warm.kill()
+
+    def shutdown(self):
+        """Kill every idle process."""
+        with self._lock:
+            doomed = list(self._idle.values())
+            self._idle.clear()
+        for warm in doomed:
+            warm.kill()
+
+    def _startReaper(self):
+        """Start the idle reaper thread if it is not running. Caller holds the lock."""
+        if self._reaper and self._reaper.is_alive():
+            return
+        self._reaper = threading.Thread(target=self._reapLoop, daemon=True)
+        self._reaper.start()
+
+    def _reapLoop(self):
+        while True:
+            time.sleep(_REAP_INTERVAL)
+            self.evictIdle()
+            with self._lock:
+                if not self._idle:
+                    self._reaper = None
+                    return
+
+
+_pool = ProcessPool()
+atexit.register(_pool.shutdown)
+
+
+def getPool():
+    """Return the process-wide provider pool."""
+    return _pool
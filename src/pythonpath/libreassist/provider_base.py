@@ -3,13 +3,22 @@
 # Equivalent to processProvider.js in AI.duino
 
 import subprocess
+import threading
+import time
 import os
 
+from . import capture
+
+_READ_CHUNK = 64 * 1024  # Bytes per stdout read in buffered mode
+
+# Minimum seconds between two onPartial() calls; building the text is O(response)
+PARTIAL_INTERVAL = 0.5
+
 
 def _resolveExecutable(providerModule):
     """
     Resolve the full path to a provider's executable.
-    Uses auto-discovery, falls back to module's EXECUTABLE.
+    Uses the cached discovery result, falls back to module's EXECUTABLE.
 
     Args:
         providerModule: Imported provider module
@@ -18,8 +27,9 @@ def _resolveExecutable(providerModule):
         Executable path string
     """
     try:
-        from libreassist import discovery
-        path = discovery.discoverProvider(providerModule.NAME)
+        from libreassist import discovery, settings
+        knownPaths = settings.loadGlobalSettings().get("discovered_providers", {})
+        path = discovery.resolveProvider(providerModule.NAME, knownPaths)
         if path:
             return path
     except Exception as e:
@@ -29,22 +39,16 @@ def _resolveExecutable(providerModule):
     return providerModule.EXECUTABLE
 
 
-def executeProvider(providerModule, prompt, workingDir, sessionId=None, timeout=600, onProcess=None):
+def _buildCommand(providerModule, buildFn):
     """
-    Generic executor for any CLI provider.
-    Uses buildArgs() and extractResponse() from the provider module.
-    Auto-discovers the executable path.
+    Resolve the executable and build the full argument list.
 
     Args:
-        providerModule: Imported provider module (e.g. claude_code)
-        prompt:         User prompt string
-        workingDir:     Working directory for the subprocess (document directory)
-        sessionId:      Optional session ID for persistent providers
-        timeout:        Timeout in seconds (default: 600)
-        onProcess:      Optional callback(process) called after Popen, before communicate()
+        providerModule: Imported provider module
+        buildFn:        callable(executable) returning the provider's argument list
 
     Returns:
-        dict with 'response' (str) and 'sessionId' (str or None)
+        Argument list for subprocess.Popen
     """
     executablePath = _resolveExecutable(providerModule)
 
@@ -56,13 +60,46 @@ def executeProvider(providerModule, prompt, workingDir, sessionId=None, timeout=
             raise RuntimeError("Node.js v20+ not found. Codex CLI requires Node.js.")
 
         # Build args without executable, then prepend executable
-        args = providerModule.buildArgs(prompt, sessionId, None)
-        args = [executablePath] + args
-        executable = nodePath
+        return [executablePath] + buildFn(None)
+
+    return buildFn(executablePath)
+
+
+def executeProvider(providerModule, prompt, workingDir, sessionId=None, timeout=600, onProcess=None,
+                    onPartial=None, keepWarmFor=None, spillDir=None):
+    """
+    Generic executor for any CLI provider.
+    Uses buildArgs() and extractResponse() from the provider module.
+    Auto-discovers the executable path.
+
+    If the provider module offers createStreamParser(), stdout is read line by
+    line and fed to the parser, so the full output is never held in memory;
+    onPartial then receives the visible text while the process is running.
+    Otherwise stdout is captured with bounded memory and parsed at exit.
+
+    If keepWarmFor is given and the provider module offers buildPersistentArgs(),
+    the turn runs on a long-lived process from the warm pool instead.
+
+    Args:
+        providerModule: Imported provider module (e.g. claude_code)
+        prompt:         User prompt string
+        workingDir:     Working directory for the subprocess (document directory)
+        sessionId:      Optional session ID for persistent providers
+        timeout:        Timeout in seconds (default: 600)
+        onProcess:      Optional callback(process) called after Popen, before reading output
+        onPartial:      Optional callback(text) with the response text received so far
+        keepWarmFor:    Optional document path; enables the warm process pool
+        spillDir:       Optional directory for spilling large buffered output
+
+    Returns:
+        dict with 'response' (str) and 'sessionId' (str or None)
+    """
+    if keepWarmFor and hasattr(providerModule, 'buildPersistentArgs'):
+        return _executeWarm(providerModule, prompt, workingDir, sessionId, timeout,
+                            onProcess, onPartial, keepWarmFor)
 
-    else:
-        args = providerModule.buildArgs(prompt, sessionId, executablePath)
-        executable = executablePath
+    args = _buildCommand(
+        providerModule, lambda executable: providerModule.buildArgs(prompt, sessionId, executable))
 
     process = subprocess.Popen(
         args,
@@ -72,37 +109,149 @@ def executeProvider(providerModule, prompt, workingDir, sessionId=None, timeout=
         cwd=workingDir
     )
 
-    # Pass process handle to caller before blocking on communicate()
+    # Pass process handle to caller before blocking on the output
     if onProcess:
         onProcess(process)
 
-    # Wait with timeout and read completely
+    stderrTail   = capture.StderrTail()
+    stderrThread = _drainStderr(process, stderrTail)
+    timer, timedOut = _startTimeout(process, timeout)
+
+    parser = output = None
     try:
-        stdout_bytes, stderr_bytes = process.communicate(timeout=timeout)
-    except subprocess.TimeoutExpired:
+        if hasattr(providerModule, 'createStreamParser'):
+            parser = providerModule.createStreamParser(partials=onPartial is not None)
+            _readLines(process, parser, onPartial)
+        else:
+            output = capture.OutputCapture(spillDir)
+            for chunk in iter(lambda: process.stdout.read(_READ_CHUNK), b""):
+                output.write(chunk)
+            output.close()
+        process.wait()
+    finally:
+        timer.cancel()
+        stderrThread.join()
+
+    try:
+        if timedOut.is_set():
+            raise TimeoutError(f"Provider timed out after {timeout}s")
+
+        stderr    = stderrTail.text()
+        hasOutput = parser.hasOutput if parser else output.hasOutput
+
+        # Only error if no output at all; otherwise try to extract a response
+        if not hasOutput and process.returncode != 0:
+            raise RuntimeError(stderr.strip() or f"Provider exited with code {process.returncode}")
+
+        if parser:
+            return parser.result()
+        return providerModule.extractResponse(output.getText(), stderr)
+    finally:
+        if output:
+            output.discard()
+
+
+def _drainStderr(process, stderrTail):
+    """Read stderr into a StderrTail on a helper thread so the pipe never fills up."""
+    def _run():
+        try:
+            for rawLine in process.stderr:
+                stderrTail.feed(rawLine)
+        except (OSError, ValueError):
+            pass
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
+    return thread
+
+
+def _startTimeout(process, timeout):
+    """Start a timer that kills the process after timeout seconds."""
+    timedOut = threading.Event()
+
+    def _onTimeout():
+        timedOut.set()
         process.kill()
-        stdout_bytes, stderr_bytes = process.communicate()
-        raise TimeoutError(f"Provider timed out after {timeout}s")
 
-    returncode = process.returncode
+    timer = threading.Timer(timeout, _onTimeout)
+    timer.daemon = True
+    timer.start()
+    return timer, timedOut
 
-    # Manually decode with error handling
-    try:
-        rawOutput = stdout_bytes.decode('utf-8')
-    except UnicodeDecodeError:
-        rawOutput = stdout_bytes.decode('utf-8', errors='replace')
 
-    try:
-        stderr = stderr_bytes.decode('utf-8')
-    except UnicodeDecodeError:
-        stderr = stderr_bytes.decode('utf-8', errors='replace')
+def _readLines(process, parser, onPartial, untilTurnComplete=False):
+    """
+    Feed stdout line by line to an incremental parser, reporting partial text
+    at most every PARTIAL_INTERVAL seconds.
+    With untilTurnComplete, stop as soon as the parser has seen the end of a turn.
+    """
+    lastPartial = 0.0
+    for rawLine in iter(process.stdout.readline, b""):
+        # Raw bytes: the parser prefilters lines before decoding them
+        if parser.feed(rawLine) and onPartial:
+            now = time.monotonic()
+            if now - lastPartial >= PARTIAL_INTERVAL:
+                lastPartial = now
+                try:
+                    onPartial(parser.partialText())
+                except Exception as e:
+                    print(f"Partial update failed: {e}")
+        if untilTurnComplete and parser.turnComplete:
+            break
+
+
+def _executeWarm(providerModule, prompt, workingDir, sessionId, timeout, onProcess, onPartial, owner):
+    """
+    Run one turn on a warm process from the pool, spawning it if necessary.
+    The process is handed back to the pool only if the turn completed cleanly.
+
+    Returns:
+        dict with 'response' (str) and 'sessionId' (str or None)
+    """
+    from libreassist import process_pool
 
-    # If we got output, try to extract response even if returncode != 0
-    if rawOutput.strip():
-        return providerModule.extractResponse(rawOutput, stderr)
+    pool = process_pool.getPool()
+    pool.open(owner)
+    warm = pool.acquire((providerModule.NAME, workingDir, sessionId))
 
-    # Only error if no output at all
-    if returncode != 0:
-        raise RuntimeError(stderr.strip() or f"Provider exited with code {returncode}")
+    if warm is None:
+        args = _buildCommand(
+            providerModule, lambda executable: providerModule.buildPersistentArgs(sessionId, executable))
+        process = subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=False,
+            cwd=workingDir
+        )
+        warm = process_pool.WarmProcess(None, process, owner)
 
-    return providerModule.extractResponse(rawOutput, stderr)
+    process = warm.process
+    if onProcess:
+        onProcess(process)
+
+    parser = providerModule.createStreamParser(partials=onPartial is not None)
+    timer, timedOut = _startTimeout(process, timeout)
+
+    try:
+        process.stdin.write(providerModule.encodeInput(prompt))
+        process.stdin.flush()
+        _readLines(process, parser, onPartial, untilTurnComplete=True)
+    except (BrokenPipeError, OSError) as e:
+        print(f"Warm process I/O failed: {e}")
+    finally:
+        timer.cancel()
+
+    if parser.turnComplete and warm.isAlive():
+        pool.release(warm, (providerModule.NAME, workingDir, parser.sessionId or sessionId))
+        return parser.result()
+
+    # Process died or was killed (timeout/cancel): never reuse it
+    warm.kill()
+    if timedOut.is_set():
+        raise TimeoutError(f"Provider timed out after {timeout}s")
+    if not parser.hasOutput:
+        raise RuntimeError(warm.stderrText().strip() or
+                           f"Provider exited with code {process.returncode}")
+    return parser.result()
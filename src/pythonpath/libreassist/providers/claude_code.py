@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
 # libreassist/providers/claude_code.py - Claude Code CLI provider
 
+from libreassist import streamjson
+
 NAME = "claude_code"
 EXECUTABLE = "claude"  # Fallback if auto-discovery fails
 
+# Events the parser needs; everything else (tool-input deltas, system and
+# user events) is rejected before JSON decoding
+_FINAL_EVENTS   = streamjson.EventFilter("assistant", "result")
+_PARTIAL_EVENTS = streamjson.EventFilter("assistant", "result", "text_delta", "message_start")
+
 
 def buildArgs(prompt, sessionId=None, executable=EXECUTABLE):
     args = [
@@ -21,32 +28,109 @@ def buildArgs(prompt, sessionId=None, executable=EXECUTABLE):
     return args
 
 
-def extractResponse(rawOutput, stderr=""):
+def buildPersistentArgs(sessionId=None, executable=EXECUTABLE):
+    """Arguments for a long-lived process that reads prompts as stream-json from stdin."""
+    args = [
+        executable,
+        "--print",
+        "--verbose",
+        "--dangerously-skip-permissions",
+        "--input-format", "stream-json",
+        "--output-format", "stream-json",
+        "--include-partial-messages"
+    ]
+
+    if sessionId:
+        args.extend(["--resume", sessionId])
+
+    return args
+
+
+def encodeInput(prompt):
+    """Encode one user turn for the stream-json input mode."""
     import json
 
-    collectedText = ""
-    newSessionId = None
+    message = {
+        "type": "user",
+        "message": {"role": "user", "content": [{"type": "text", "text": prompt}]}
+    }
+    return (json.dumps(message) + "\n").encode('utf-8')
 
+
+class StreamParser:
+    """
+    Incremental parser for Claude's stream-json output.
+    Text deltas from stream_event lines are shown while a message is being
+    generated; the completed 'assistant' message then replaces them.
+    With partials=False the deltas are skipped by the prefilter.
+    """
+
+    def __init__(self, partials=True):
+        self._filter    = _PARTIAL_EVENTS if partials else _FINAL_EVENTS
+        self._completed = []   # Text of finished assistant messages
+        self._pending   = []   # Text deltas of the message in progress
+        self.sessionId  = None
+        self.hasOutput  = False
+        self.turnComplete = False  # A 'result' event ends the turn
+
+    def feed(self, line):
+        """
+        Process one line of output (str or bytes).
+        Returns True if the visible response text changed.
+        """
+        if not self.hasOutput:
+            if streamjson.isBlank(line):
+                return False
+            self.hasOutput = True
+
+        jsonLine = streamjson.parseEvent(line, self._filter)
+        if jsonLine is None:
+            return False
+
+        eventType = jsonLine.get("type")
+
+        if eventType == "stream_event":
+            event = jsonLine.get("event", {})
+            if event.get("type") == "message_start":
+                self._pending = []
+            elif event.get("type") == "content_block_delta":
+                delta = event.get("delta", {})
+                if delta.get("type") == "text_delta" and delta.get("text"):
+                    self._pending.append(delta["text"])
+                    return True
+
+        elif eventType == "assistant":
+            self._pending = []
+            changed = False
+            for block in jsonLine.get("message", {}).get("content", []):
+                if block.get("type") == "text":
+                    self._completed.append(block.get("text", ""))
+                    changed = True
+            return changed
+
+        elif eventType == "result":
+            self.sessionId = jsonLine.get("session_id")
+            self.turnComplete = True
+
+        return False
+
+    def partialText(self):
+        """Return the response text received so far."""
+        return "".join(self._completed) + "".join(self._pending)
+
+    def result(self):
+        return {
+            "response": "".join(self._completed).strip(),
+            "sessionId": self.sessionId
+        }
+
+
+def createStreamParser(partials=True):
+    return StreamParser(partials)
+
+
+def extractResponse(rawOutput, stderr=""):
+    parser = StreamParser(partials=False)
     for line in rawOutput.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        try:
-            jsonLine = json.loads(line)
-            eventType = jsonLine.get("type")
-
-            if eventType == "assistant":
-                for block in jsonLine.get("message", {}).get("content", []):
-                    if block.get("type") == "text":
-                        collectedText += block.get("text", "")
-
-            elif eventType == "result":
-                newSessionId = jsonLine.get("session_id")
-
-        except json.JSONDecodeError:
-            pass
-
-    return {
-        "response": collectedText.strip(),
-        "sessionId": newSessionId
-    }
+        parser.feed(line)
+    return parser.result()
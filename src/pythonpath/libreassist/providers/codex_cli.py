@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
 # libreassist/providers/codex_cli.py - Codex / ChatGPT CLI provider
 
+from libreassist import streamjson
+
 NAME = "codex_cli"
 EXECUTABLE = "codex"  # Fallback if auto-discovery fails
 NEEDS_NODEJS = True
 
+_RAW_FALLBACK_LIMIT = 1024 * 1024  # Characters of unstructured output kept for the fallback
+
+_COMPLETED_EVENTS = streamjson.EventFilter("item.completed")
+
 
 def buildArgs(prompt, sessionId=None, executable=EXECUTABLE):
     args = []
@@ -14,29 +20,60 @@ def buildArgs(prompt, sessionId=None, executable=EXECUTABLE):
     return args
 
 
-def extractResponse(rawOutput, stderr=""):
-    import json
+class StreamParser:
+    """Incremental parser for Codex --json event output."""
+
+    def __init__(self):
+        self._texts    = []
+        self._rawLines = []   # Kept for the plain-text fallback
+        self._rawSize  = 0
+        self.hasOutput = False
+
+    def feed(self, line):
+        """
+        Process one line of output (str or bytes).
+        Returns True if the visible response text changed.
+        """
+        if streamjson.isBlank(line):
+            return False
+        self.hasOutput = True
+        if not self._texts and self._rawSize < _RAW_FALLBACK_LIMIT:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8', errors='replace')
+            self._rawLines.append(line.strip())
+            self._rawSize += len(line)
+
+        event = streamjson.parseEvent(line, _COMPLETED_EVENTS)
+        if event and event.get("type") == "item.completed":
+            item = event.get("item", {})
+            if isinstance(item, dict) and item.get("text"):
+                self._texts.append(item["text"])
+                return True
+        return False
 
-    collectedText = ""
+    def partialText(self):
+        """Return the response text received so far."""
+        return "".join(self._texts)
 
+    def result(self):
+        collectedText = "".join(self._texts)
+
+        # Fallback to raw output if no structured events found
+        if not collectedText and self._rawLines:
+            collectedText = "\n".join(self._rawLines)
+
+        return {
+            "response": collectedText.strip(),
+            "sessionId": None  # Codex CLI has no persistent sessions
+        }
+
+
+def createStreamParser(partials=True):
+    return StreamParser()
+
+
+def extractResponse(rawOutput, stderr=""):
+    parser = StreamParser()
     for line in rawOutput.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        try:
-            event = json.loads(line)
-            if event.get("type") == "item.completed":
-                item = event.get("item", {})
-                if item.get("text"):
-                    collectedText += item["text"]
-        except json.JSONDecodeError:
-            pass
-
-    # Fallback to raw output if no structured events found
-    if not collectedText and rawOutput.strip():
-        collectedText = rawOutput.strip()
-
-    return {
-        "response": collectedText.strip(),
-        "sessionId": None  # Codex CLI has no persistent sessions
-    }
+        parser.feed(line)
+    return parser.result()
@@ -36,10 +36,10 @@ def buildArgs(prompt, sessionId=None, executable=EXECUTABLE):
 
 
 def extractResponse(rawOutput, stderr=""):
-    import json
+    from libreassist import streamjson
 
     try:
-        jsonResponse = json.loads(rawOutput)
+        jsonResponse = streamjson.loads(rawOutput)
 
         # Vibe returns an array of messages
         if isinstance(jsonResponse, list):
@@ -58,7 +58,7 @@ def extractResponse(rawOutput, stderr=""):
             "sessionId": jsonResponse.get("session_id")
         }
 
-    except (json.JSONDecodeError, AttributeError):
+    except (ValueError, AttributeError):  # JSON decode errors of both backends are ValueErrors
         # Last resort: return raw output stripped of ANSI codes
         import re
         ansiEscape = re.compile(r'\x1b\[[0-9;]*m')
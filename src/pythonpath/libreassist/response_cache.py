@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# libreassist/response_cache.py - Opt-in cache for information-only answers
+#
+# Answers are cached only for runs that did not modify the document, keyed on
+# (provider, normalized prompt, custom instructions, SHA-256 of the stored
+# document). A repeated question against unchanged content is answered
+# without backup or provider run. Entries live as one JSON file each in
+# <LibreAssist dir>/response_cache; the file mtime doubles as LRU timestamp.
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+DEFAULT_MAX_MB = 20
+_HASH_CHUNK    = 1024 * 1024
+_lock          = threading.Lock()
+
+
+def getCacheDir():
+    """Return the cache directory (created on demand), or None."""
+    from libreassist.settings import getLibreAssistDir
+    baseDir = getLibreAssistDir()
+    if not baseDir:
+        return None
+    cacheDir = os.path.join(baseDir, "response_cache")
+    os.makedirs(cacheDir, exist_ok=True)
+    return cacheDir
+
+
+def hashFile(path):
+    """SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def normalizePrompt(prompt):
+    """Collapse whitespace and case so trivially different phrasings share an entry."""
+    return " ".join(prompt.split()).lower()
+
+
+def makeKey(providerName, prompt, customInstructions, docHash):
+    """Build the cache key for one request."""
+    material = "\0".join([providerName, normalizePrompt(prompt),
+                          customInstructions.strip(), docHash])
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def lookup(key):
+    """
+    Return the cached response text for key, or None.
+    A hit refreshes the entry's LRU timestamp.
+    """
+    try:
+        cacheDir = getCacheDir()
+        if not cacheDir:
+            return None
+        entryFile = os.path.join(cacheDir, key + ".json")
+        with _lock:
+            if not os.path.exists(entryFile):
+                return None
+            with open(entryFile, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(entryFile)
+        return entry.get("response")
+    except Exception as e:
+        print(f"Error reading response cache: {e}")
+        return None
+
+
+def store(key, providerName, responseText, maxMb=DEFAULT_MAX_MB):
+    """Cache a response and evict least recently used entries above maxMb."""
+    try:
+        cacheDir = getCacheDir()
+        if not cacheDir:
+            return False
+        entryFile = os.path.join(cacheDir, key + ".json")
+        entry = {"provider": providerName, "created": time.time(), "response": responseText}
+        with _lock:
+            with open(entryFile, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            _evict(cacheDir, maxMb * 1024 * 1024)
+        return True
+    except Exception as e:
+        print(f"Error writing response cache: {e}")
+        return False
+
+
+def _evict(cacheDir, maxBytes):
+    """Delete least recently used entries until the cache fits maxBytes. Caller holds the lock."""
+    entries = []
+    total   = 0
+    for name in os.listdir(cacheDir):
+        if not name.endswith(".json"):
+            continue
+        try:
+            st = os.stat(os.path.join(cacheDir, name))
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, name))
+        total += st.st_size
+
+    entries.sort()
+    for mtime, size, name in entries:
+        if total <= maxBytes:
+            break
+        try:
+            os.remove(os.path.join(cacheDir, name))
+            total -= size
+        except OSError:
+            pass
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# libreassist/scheduler.py - Central job scheduler for provider runs
+#
+# All provider jobs go through one scheduler with a bounded worker pool,
+# a per-provider concurrency cap, a per-document mutex (two jobs never edit
+# the same file at once) and interactive-before-batch priorities.
+
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH       = 1
+
+MAINTENANCE = "maintenance"   # "Provider" of background jobs such as the startup cleanup
+
+DEFAULT_MAX_WORKERS    = 4
+DEFAULT_PROVIDER_LIMIT = 2
+_WAIT_SAMPLES          = 100   # Recent wait times kept for statistics
+
+
+class Job:
+    """A queued provider run."""
+
+    def __init__(self, fn, provider, document, priority, onCancel=None):
+        self.fn        = fn
+        self.provider  = provider
+        self.document  = document
+        self.priority  = priority
+        self.onCancel  = onCancel
+        self.submitted = time.monotonic()
+        self.started   = None
+        self.cancelled = False
+
+    def waitTime(self):
+        """Seconds the job spent (or has spent so far) in the queue."""
+        return (self.started or time.monotonic()) - self.submitted
+
+
+class JobScheduler:
+    """
+    Priority queue served by up to maxWorkers daemon threads.
+    A job is only started when its provider is below its concurrency limit
+    and no other job is running on the same document.
+    """
+
+    def __init__(self, maxWorkers=DEFAULT_MAX_WORKERS):
+        self.maxWorkers     = maxWorkers
+        self.providerLimits = {}   # provider -> max concurrent jobs
+        self._cond          = threading.Condition()
+        self._queue         = []   # heap of (priority, seq, job)
+        self._seq           = itertools.count()
+        self._running       = {}   # provider -> number of running jobs
+        self._busyDocs      = set()
+        self._workers       = []
+        self._idleWorkers   = 0
+        self._waits         = deque(maxlen=_WAIT_SAMPLES)
+        self._completed     = 0
+
+    def submit(self, fn, provider, document, priority=PRIORITY_INTERACTIVE, onCancel=None):
+        """
+        Queue fn() for execution.
+
+        Args:
+            fn:       Callable run on a worker thread
+            provider: Provider NAME, used for the concurrency cap
+            document: Document path, used for the per-document mutex
+            priority: PRIORITY_INTERACTIVE or PRIORITY_BATCH
+            onCancel: Optional callable run if the job is cancelled while queued
+
+        Returns:
+            Job
+        """
+        job = Job(fn, provider, document, priority, onCancel)
+        with self._cond:
+            heapq.heappush(self._queue, (priority, next(self._seq), job))
+            # Idle workers each take one job; start more for the rest
+            if self._runnableCount() > self._idleWorkers and len(self._workers) < self.maxWorkers:
+                worker = threading.Thread(target=self._workerLoop, daemon=True)
+                self._workers.append(worker)
+                worker.start()
+            self._cond.notify_all()
+        return job
+
+    def cancel(self, job):
+        """
+        Cancel a job. A queued job is removed and its onCancel runs;
+        a running job is only flagged, its owner has to stop it.
+
+        Returns: True if the job was still queued
+        """
+        job.cancelled = True
+        with self._cond:
+            entries = [e for e in self._queue if e[2] is job]
+            if not entries:
+                return False
+            self._queue.remove(entries[0])
+            heapq.heapify(self._queue)
+        if job.onCancel:
+            try:
+                job.onCancel()
+            except Exception as e:
+                print(f"Error in job cancel handler: {e}")
+        return True
+
+    def getStats(self):
+        """Return queue depth, running jobs and recent wait times (seconds)."""
+        with self._cond:
+            waits = list(self._waits)
+            return {
+                "queued":       len(self._queue),
+                "running":      dict(self._running),
+                "workers":      len(self._workers),
+                "completed":    self._completed,
+                "avg_wait":     sum(waits) / len(waits) if waits else 0.0,
+                "max_wait":     max(waits) if waits else 0.0,
+                "oldest_queued": max((e[2].waitTime() for e in self._queue), default=0.0),
+            }
+
+    def _runnableCount(self):
+        """Number of queued jobs that could start together now. Caller holds the lock."""
+        running  = dict(self._running)
+        busyDocs = set(self._busyDocs)
+        count    = 0
+        for entry in sorted(self._queue):
+            job   = entry[2]
+            limit = self.providerLimits.get(job.provider, DEFAULT_PROVIDER_LIMIT)
+            if running.get(job.provider, 0) >= limit or job.document in busyDocs:
+                continue
+            running[job.provider] = running.get(job.provider, 0) + 1
+            busyDocs.add(job.document)
+            count += 1
+        return count
+
+    def _nextRunnable(self):
+        """Pop the best job that may start now, or return None. Caller holds the lock."""
+        for entry in sorted(self._queue):
+            job   = entry[2]
+            limit = self.providerLimits.get(job.provider, DEFAULT_PROVIDER_LIMIT)
+            if self._running.get(job.provider, 0) >= limit:
+                continue
+            if job.document in self._busyDocs:
+                continue
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+            return job
+        return None
+
+    def _workerLoop(self):
+        while True:
+            with self._cond:
+                self._idleWorkers += 1
+                job = self._nextRunnable()
+                while job is None:
+                    self._cond.wait()
+                    job = self._nextRunnable()
+                self._idleWorkers -= 1
+                job.started = time.monotonic()
+                self._running[job.provider] = self._running.get(job.provider, 0) + 1
+                self._busyDocs.add(job.document)
+                self._waits.append(job.waitTime())
+
+            print(f"Starting {job.provider} job after {job.waitTime():.2f}s: {self.getStats()}")
+            try:
+                job.fn()
+            except Exception:
+                import traceback
+                traceback.print_exc()
+            finally:
+                with self._cond:
+                    self._running[job.provider] -= 1
+                    self._busyDocs.discard(job.document)
+                    self._completed += 1
+                    self._cond.notify_all()
+
+
+_scheduler = JobScheduler()
+
+
+def getScheduler():
+    """Return the process-wide job scheduler."""
+    return _scheduler
@@ -2,39 +2,71 @@
 # libreassist/settings.py - Settings and history management
 
 import os
+import copy
 import json
+import atexit
 import hashlib
+import threading
 import uno
 from .document import getCurrentDocument, getDocumentPath
+from . import store, archive, fileio
 
 
 # ---------------------------------------------------------------------------
 # Base directory helpers
 # ---------------------------------------------------------------------------
 
+# Resolved once per process: the profile directory needs a PathSubstitution
+# UNO call, and document directories are looked up several times per request
+# from both threads. Guarded by _pathLock; see invalidateDocDirs().
+_pathLock = threading.Lock()
+_baseDir  = None
+_docDirs  = {}      # Document path → document settings directory
+
+
 def getLibreAssistDir():
     """
     Get the base LibreAssist data directory in LibreOffice user profile.
     Creates directory if it doesn't exist.
     Returns: path string or None
     """
-    try:
-        ctx = uno.getComponentContext()
-        pathSubst = ctx.ServiceManager.createInstance(
-            "com.sun.star.util.PathSubstitution")
-        userPath = pathSubst.getSubstituteVariableValue("user")
+    global _baseDir
+    with _pathLock:
+        if _baseDir:
+            return _baseDir
+        try:
+            ctx = uno.getComponentContext()
+            pathSubst = ctx.ServiceManager.createInstance(
+                "com.sun.star.util.PathSubstitution")
+            userPath = pathSubst.getSubstituteVariableValue("user")
 
-        if userPath.startswith("file://"):
-            userPath = uno.fileUrlToSystemPath(userPath)
+            if userPath.startswith("file://"):
+                userPath = uno.fileUrlToSystemPath(userPath)
 
-        baseDir = os.path.join(userPath, "libreassist")
-        os.makedirs(baseDir, exist_ok=True)
+            baseDir = os.path.join(userPath, "libreassist")
+            os.makedirs(baseDir, exist_ok=True)
 
-        return baseDir
+            _baseDir = baseDir
+            return baseDir
 
-    except Exception as e:
-        print(f"Error getting LibreAssist directory: {e}")
-        return None
+        except Exception as e:
+            print(f"Error getting LibreAssist directory: {e}")
+            return None
+
+
+def invalidateDocDirs(*paths):
+    """
+    Forget cached document directories of the given document paths, or all
+    of them (and the base directory) if no path is given. Needed whenever
+    directories are moved or deleted behind the cache.
+    """
+    global _baseDir
+    with _pathLock:
+        if not paths:
+            _docDirs.clear()
+            _baseDir = None
+        for path in paths:
+            _docDirs.pop(path, None)
 
 
 def getDocSettingsDir():
@@ -54,6 +86,11 @@ def getDocSettingsDir():
         return None
 
 
+def docKeyForPath(fullPath):
+    """Name of the settings directory of a document path (md5 prefix)."""
+    return hashlib.md5(fullPath.encode()).hexdigest()[:12]
+
+
 def getDocSettingsDirForPath(fullPath):
     """
     Get the settings directory for a specific document path (hash-based).
@@ -63,12 +100,16 @@ def getDocSettingsDirForPath(fullPath):
     try:
         if not fullPath:
             return None
+        docDir = _docDirs.get(fullPath)
+        if docDir:
+            return docDir
         baseDir = getLibreAssistDir()
         if not baseDir:
             return None
-        pathHash = hashlib.md5(fullPath.encode()).hexdigest()[:12]
-        docDir = os.path.join(baseDir, pathHash)
+        docDir = os.path.join(baseDir, docKeyForPath(fullPath))
         os.makedirs(docDir, exist_ok=True)
+        with _pathLock:
+            _docDirs[fullPath] = docDir
         return docDir
 
     except Exception as e:
@@ -76,16 +117,27 @@ def getDocSettingsDirForPath(fullPath):
         return None
 
 
+def getDirSize(path):
+    """Total size in bytes of the files directly in a directory."""
+    total = 0
+    try:
+        for entry in os.scandir(path):
+            if entry.is_file(follow_symlinks=False):
+                total += entry.stat().st_size
+    except OSError:
+        pass
+    return total
+
+
 # ---------------------------------------------------------------------------
 # Document-specific settings  (path-aware versions for async use)
 # ---------------------------------------------------------------------------
 
-def loadSettingsForDir(docDir, fullPath=None):
-    """
-    Load settings from a specific docDir.
-    Safe to call from background threads.
-    """
-    defaults = {
+DEFAULT_HISTORY = "Chat History\n"
+
+
+def _docDefaults(fullPath=None):
+    return {
         "document_path": fullPath,
         "provider": "claude_code",
         "session_ids": {},
@@ -93,16 +145,26 @@ def loadSettingsForDir(docDir, fullPath=None):
         "undo_available": False,
         "redo_available": False
     }
+
+
+def loadSettingsForDir(docDir, fullPath=None):
+    """
+    Load settings from a specific docDir.
+    Safe to call from background threads.
+    """
+    defaults = _docDefaults(fullPath)
     try:
         if not docDir:
             return defaults
-        settingsFile = os.path.join(docDir, "settings.json")
-        if not os.path.exists(settingsFile):
-            return defaults
-        with open(settingsFile, 'r', encoding='utf-8') as f:
-            saved = json.load(f)
-            defaults.update(saved)
+        stored = store.loadDocument(store.docKeyForDir(docDir))
+        if stored is None:
             return defaults
+        path, values, sessionIds = stored
+        defaults.update(values)
+        defaults["session_ids"] = sessionIds
+        if path:
+            defaults["document_path"] = path
+        return defaults
     except Exception as e:
         print(f"Error loading settings for dir: {e}")
         return defaults
@@ -111,55 +173,127 @@ def loadSettingsForDir(docDir, fullPath=None):
 def saveSettingsForDir(docDir, settingsData, fullPath=None):
     """
     Save settings to a specific docDir.
+    Replaces all stored settings of the document, including session IDs.
     Safe to call from background threads.
     """
     try:
         if not docDir:
             return False
-        if fullPath:
-            settingsData["document_path"] = fullPath
-        settingsFile = os.path.join(docDir, "settings.json")
-        with open(settingsFile, 'w', encoding='utf-8') as f:
-            json.dump(settingsData, f, indent=2)
+        values     = dict(settingsData)
+        path       = fullPath or values.pop("document_path", None)
+        values.pop("document_path", None)
+        sessionIds = values.pop("session_ids", {}) or {}
+        docKey     = store.docKeyForDir(docDir)
+        with store.transaction() as conn:
+            store.touchDocument(conn, docKey, path)
+            store.setSessionIds(conn, docKey, sessionIds, replace=True)
+            store.setDocSettings(conn, docKey, values)
         return True
     except Exception as e:
         print(f"Error saving settings for dir: {e}")
         return False
 
 
-def loadHistoryForDir(docDir):
+def updateSettingsForDir(docDir, fullPath=None, sessionIds=None, **changes):
+    """
+    Change single settings of a docDir without touching the others.
+    sessionIds: Optional dict provider → session ID, merged into the stored IDs
+    Safe to call from background threads.
+    """
+    return saveTurnForDir(docDir, fullPath, sessionIds=sessionIds, **changes)
+
+
+def saveTurnForDir(docDir, fullPath=None, messages=None, sessionIds=None, **changes):
+    """
+    Persist everything one chat turn changed – new messages, session IDs and
+    settings such as the undo flags – as a single transaction.
+    Safe to call from background threads.
+
+    Args:
+        messages:   List of messages.Message objects to append
+        sessionIds: Optional dict provider → session ID, merged into the stored IDs
+    """
+    try:
+        if not docDir:
+            return False
+        docKey = store.docKeyForDir(docDir)
+        size   = getDirSize(docDir)
+        with store.transaction() as conn:
+            store.touchDocument(conn, docKey, fullPath)
+            store.setDocumentSize(conn, docKey, size)
+            if sessionIds:
+                store.setSessionIds(conn, docKey, sessionIds)
+            if changes:
+                store.setDocSettings(conn, docKey, changes)
+            if messages:
+                store.appendMessages(conn, docKey, messages)
+        return True
+    except Exception as e:
+        print(f"Error saving turn for dir: {e}")
+        return False
+
+
+def loadHistoryForDir(docDir, limit=None):
     """
-    Load chat history from a specific docDir.
+    Load chat history from a specific docDir as display text.
+    With limit, only the last `limit` messages are read.
     Safe to call from background threads.
     """
     try:
         if not docDir:
-            return "Chat History\n"
-        historyFile = os.path.join(docDir, "history.txt")
-        if os.path.exists(historyFile):
-            with open(historyFile, 'r', encoding='utf-8') as f:
-                return f.read()
-        return "Chat History\n"
+            return DEFAULT_HISTORY
+        messages = store.loadMessages(store.docKeyForDir(docDir), limit)
+        return DEFAULT_HISTORY + "".join(m.render() for m in messages)
     except Exception as e:
         print(f"Error loading history for dir: {e}")
-        return "Chat History\n"
+        return DEFAULT_HISTORY
 
 
-def saveHistoryForDir(docDir, historyText):
+def loadMessagesForDir(docDir, limit=None, offset=0):
     """
-    Save chat history to a specific docDir.
+    Load the visible messages (messages.Message) of a specific docDir, oldest first.
+    With limit, returns the last `limit` messages before the newest `offset`,
+    reading archived turns when the database has too few.
     Safe to call from background threads.
     """
     try:
         if not docDir:
-            return False
-        historyFile = os.path.join(docDir, "history.txt")
-        with open(historyFile, 'w', encoding='utf-8') as f:
-            f.write(historyText)
-        return True
+            return []
+        docKey   = store.docKeyForDir(docDir)
+        messages = store.loadMessages(docKey, limit, offset)
+        if limit is not None and len(messages) < limit:
+            # Continue into the compressed archive of older turns
+            archiveOffset = max(0, offset - store.countMessages(docKey))
+            messages = archive.loadArchived(docDir, limit - len(messages), archiveOffset) + messages
+        return messages
     except Exception as e:
-        print(f"Error saving history for dir: {e}")
-        return False
+        print(f"Error loading messages for dir: {e}")
+        return []
+
+
+def appendMessagesForDir(docDir, messages, fullPath=None):
+    """
+    Append messages to the history of a specific docDir.
+    Safe to call from background threads.
+    """
+    return saveTurnForDir(docDir, fullPath, messages=messages)
+
+
+def searchHistory(text, limit=50):
+    """
+    Search the chat histories of all documents in the profile.
+    Returns (documentPath, messages.Message) pairs, newest first.
+    """
+    try:
+        hits = store.searchMessages(text, limit)
+        baseDir = getLibreAssistDir()
+        if baseDir:
+            hits += archive.searchArchived(baseDir, text, limit)
+            hits.sort(key=lambda hit: hit[1].id, reverse=True)
+        return hits[:limit]
+    except Exception as e:
+        print(f"Error searching history: {e}")
+        return []
 
 
 # ---------------------------------------------------------------------------
@@ -171,31 +305,18 @@ def loadSettings():
     Load settings for the current document.
     Only call from the Main-UNO-Thread.
     """
-    defaults = {
-        "document_path": None,
-        "provider": "claude_code",
-        "session_ids": {},
-        "timeout": 600,
-        "undo_available": False,
-        "redo_available": False
-    }
     try:
         docDir = getDocSettingsDir()
         if not docDir:
-            return defaults
-        settingsFile = os.path.join(docDir, "settings.json")
-        if not os.path.exists(settingsFile):
-            directory, filename, fullPath = getDocumentPath()
-            defaults["document_path"] = fullPath
-            saveSettings(defaults)
-            return defaults
-        with open(settingsFile, 'r', encoding='utf-8') as f:
-            saved = json.load(f)
-            defaults.update(saved)
-            return defaults
+            return _docDefaults()
+        directory, filename, fullPath = getDocumentPath()
+        if store.loadDocument(store.docKeyForDir(docDir)) is None:
+            # Register the document so that cleanup can track it
+            saveTurnForDir(docDir, fullPath)
+        return loadSettingsForDir(docDir, fullPath)
     except Exception as e:
         print(f"Error loading settings: {e}")
-        return defaults
+        return _docDefaults()
 
 
 def saveSettings(settingsData):
@@ -208,37 +329,50 @@ def saveSettings(settingsData):
         if not docDir:
             return False
         directory, filename, fullPath = getDocumentPath()
-        settingsData["document_path"] = fullPath
-        settingsFile = os.path.join(docDir, "settings.json")
-        with open(settingsFile, 'w', encoding='utf-8') as f:
-            json.dump(settingsData, f, indent=2)
-        return True
+        return saveSettingsForDir(docDir, settingsData, fullPath)
     except Exception as e:
         print(f"Error saving settings: {e}")
         return False
 
 
-def loadHistory():
+def updateSettings(**changes):
+    """
+    Change single settings of the current document.
+    Only call from the Main-UNO-Thread.
+    """
+    try:
+        docDir = getDocSettingsDir()
+        if not docDir:
+            return False
+        directory, filename, fullPath = getDocumentPath()
+        return updateSettingsForDir(docDir, fullPath, **changes)
+    except Exception as e:
+        print(f"Error updating settings: {e}")
+        return False
+
+
+def loadHistory(limit=None):
     """
     Load chat history for the current document.
     Only call from the Main-UNO-Thread.
     """
     try:
         docDir = getDocSettingsDir()
-        return loadHistoryForDir(docDir)
+        return loadHistoryForDir(docDir, limit)
     except Exception as e:
         print(f"Error loading history: {e}")
-        return "Chat History\n"
+        return DEFAULT_HISTORY
 
 
-def saveHistory(historyText):
+def appendMessages(messages):
     """
-    Save chat history for the current document.
+    Append messages to the history of the current document.
     Only call from the Main-UNO-Thread.
     """
     try:
         docDir = getDocSettingsDir()
-        return saveHistoryForDir(docDir, historyText)
+        directory, filename, fullPath = getDocumentPath()
+        return appendMessagesForDir(docDir, messages, fullPath)
     except Exception as e:
         print(f"Error saving history: {e}")
         return False
@@ -246,14 +380,31 @@ def saveHistory(historyText):
 
 def clearHistory():
     """Clear chat history for the current document."""
-    saveHistory("Chat History\n")
+    try:
+        docDir = getDocSettingsDir()
+        if not docDir:
+            return
+        docKey = store.docKeyForDir(docDir)
+        with store.transaction() as conn:
+            store.touchDocument(conn, docKey)
+            store.clearMessages(conn, docKey)
+        archive.removeUnindexedSegments(docDir)
+    except Exception as e:
+        print(f"Error clearing history: {e}")
 
 
 def resetSession():
     """Reset session IDs for all providers in the current document."""
-    data = loadSettings()
-    data["session_ids"] = {}
-    saveSettings(data)
+    try:
+        docDir = getDocSettingsDir()
+        if not docDir:
+            return
+        docKey = store.docKeyForDir(docDir)
+        with store.transaction() as conn:
+            store.touchDocument(conn, docKey)
+            store.setSessionIds(conn, docKey, {}, replace=True)
+    except Exception as e:
+        print(f"Error resetting session: {e}")
 
 
 # ---------------------------------------------------------------------------
@@ -272,40 +423,155 @@ def getGlobalSettingsFile():
         return None
 
 
-def loadGlobalSettings():
-    """Load global settings (providers, default provider, etc.)"""
-    defaults = {
-        "discovered_providers": {},
-        "default_provider": "claude_code",
-        "timeout": 600,
-        "custom_instructions": "",
-        "track_changes_writer": False
-    }
+_GLOBAL_DEFAULTS = {
+    "discovered_providers": {},
+    "default_provider": "claude_code",
+    "timeout": 600,
+    "custom_instructions": "",
+    "track_changes_writer": False,
+    "warm_processes": False,
+    "warm_idle_timeout": 300,
+    "max_workers": 4,
+    "response_cache": False,
+    "response_cache_max_mb": 20,
+    "history_fsync": "normal",
+    "history_hot_turns": 100,
+    "storage_budget_mb": 500,
+    "undo_depth": 10
+}
+
+# Seconds of quiet after the last change before global settings are written
+GLOBAL_SAVE_DELAY = 1.0
+
+# In-memory global settings; written to disk by a debounce timer
+_globalState = None
+_globalDirty = False
+_globalTimer = None
+_globalLock  = threading.RLock()
+
+
+def _readGlobalSettingsFile():
+    """Read global_settings.json merged over the defaults."""
+    data = copy.deepcopy(_GLOBAL_DEFAULTS)
     try:
         settingsFile = getGlobalSettingsFile()
-        if not settingsFile or not os.path.exists(settingsFile):
-            return defaults
-        with open(settingsFile, 'r', encoding='utf-8') as f:
-            saved = json.load(f)
-            defaults.update(saved)
-            return defaults
+        if settingsFile and os.path.exists(settingsFile):
+            with open(settingsFile, 'r', encoding='utf-8') as f:
+                data.update(json.load(f))
     except Exception as e:
         print(f"Error loading global settings: {e}")
-        return defaults
+    return data
+
+
+def loadGlobalSettings():
+    """
+    Load global settings (providers, default provider, etc.)
+    Served from memory after the first call; returns a copy the caller may modify.
+    """
+    global _globalState
+    with _globalLock:
+        if _globalState is None:
+            _globalState = _readGlobalSettingsFile()
+        return copy.deepcopy(_globalState)
 
 
 def saveGlobalSettings(settingsData):
-    """Save global settings."""
-    try:
-        settingsFile = getGlobalSettingsFile()
-        if not settingsFile:
+    """
+    Save global settings.
+    Updates the in-memory state at once; the file write is debounced.
+    """
+    global _globalState
+    with _globalLock:
+        oldPolicy    = (_globalState or {}).get("history_fsync")
+        _globalState = copy.deepcopy(settingsData)
+        _scheduleGlobalWrite()
+    _applySyncPolicy(oldPolicy, settingsData.get("history_fsync"))
+    return True
+
+
+def updateGlobalSettings(**changes):
+    """Change single global settings without a load/modify/save round-trip."""
+    global _globalState
+    with _globalLock:
+        if _globalState is None:
+            _globalState = _readGlobalSettingsFile()
+        oldPolicy = _globalState.get("history_fsync")
+        _globalState.update(copy.deepcopy(changes))
+        _scheduleGlobalWrite()
+    _applySyncPolicy(oldPolicy, changes.get("history_fsync", oldPolicy))
+    return True
+
+
+def _applySyncPolicy(oldPolicy, newPolicy):
+    """
+    Apply a changed history_fsync to the open store connection at once.
+    Called without _globalLock held: the store takes its own lock first.
+    """
+    if newPolicy and newPolicy != oldPolicy:
+        store.setSyncPolicy(newPolicy)
+
+
+def _scheduleGlobalWrite():
+    """(Re)start the debounce timer. Caller holds _globalLock."""
+    global _globalDirty, _globalTimer
+    _globalDirty = True
+    if _globalTimer:
+        _globalTimer.cancel()
+    _globalTimer = threading.Timer(GLOBAL_SAVE_DELAY, flushGlobalSettings)
+    _globalTimer.daemon = True
+    _globalTimer.start()
+
+
+def flushGlobalSettings():
+    """
+    Write pending global settings to disk now (temp file + rename).
+    Called by the debounce timer, on panel dispose and on shutdown.
+    """
+    global _globalDirty, _globalTimer
+    with _globalLock:
+        if _globalTimer:
+            _globalTimer.cancel()
+            _globalTimer = None
+        if not _globalDirty:
+            return True
+        try:
+            settingsFile = getGlobalSettingsFile()
+            if not settingsFile:
+                return False
+            _writeJsonAtomic(settingsFile, _globalState)
+            _globalDirty = False
+            return True
+        except Exception as e:
+            print(f"Error saving global settings: {e}")
             return False
-        with open(settingsFile, 'w', encoding='utf-8') as f:
-            json.dump(settingsData, f, indent=2)
-        return True
-    except Exception as e:
-        print(f"Error saving global settings: {e}")
-        return False
+
+
+def _resetGlobalSettings():
+    """Drop in-memory global settings and any pending write."""
+    global _globalState, _globalDirty, _globalTimer
+    with _globalLock:
+        if _globalTimer:
+            _globalTimer.cancel()
+        _globalState = None
+        _globalDirty = False
+        _globalTimer = None
+
+
+def _writeJsonAtomic(path, data):
+    """Write JSON to a temp file next to path and rename it over path."""
+    tmpPath = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmpPath, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmpPath, path)
+    finally:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+
+
+atexit.register(flushGlobalSettings)
 
 
 # ---------------------------------------------------------------------------
@@ -314,7 +580,8 @@ def saveGlobalSettings(settingsData):
 
 def cleanupOrphanedDirs():
     """
-    Remove settings directories where the original document no longer exists.
+    Remove stored data of documents that no longer exist, then archive old
+    turns and apply the storage quota (see maintenance.runCleanup).
     Called on extension startup.
     """
     try:
@@ -322,20 +589,15 @@ def cleanupOrphanedDirs():
         if not baseDir:
             return
 
-        import shutil
-        for dirName in os.listdir(baseDir):
-            dirPath = os.path.join(baseDir, dirName)
-            if not os.path.isdir(dirPath):
-                continue
-            settingsFile = os.path.join(dirPath, "settings.json")
-            if not os.path.exists(settingsFile):
-                shutil.rmtree(dirPath)
-                continue
-            with open(settingsFile, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            docPath = data.get("document_path")
-            if not docPath or not os.path.exists(docPath):
-                shutil.rmtree(dirPath)
+        from libreassist import maintenance
+        globalSettings = loadGlobalSettings()
+        stats = maintenance.runCleanup(
+            baseDir,
+            hotTurns=globalSettings.get("history_hot_turns", archive.DEFAULT_HOT_TURNS),
+            quotaMb=globalSettings.get("storage_budget_mb"))
+        print(stats)
+        if stats.removed or stats.strayDirs:
+            invalidateDocDirs()
 
     except Exception as e:
         print(f"Error during cleanup: {e}")
@@ -348,6 +610,7 @@ def migrateSettingsIfNeeded(oldPath, newPath):
     """
     if not oldPath or not newPath or oldPath == newPath:
         return
+    invalidateDocDirs(oldPath, newPath)
     try:
         import shutil
 
@@ -370,16 +633,11 @@ def migrateSettingsIfNeeded(oldPath, newPath):
                 src = os.path.join(oldDir, item)
                 dst = os.path.join(newDir, item)
                 if os.path.isfile(src):
-                    shutil.copy2(src, dst)
+                    fileio.copyFile(src, dst, keepStat=True)
 
-            # Update stored path in settings
-            settingsFile = os.path.join(newDir, "settings.json")
-            if os.path.exists(settingsFile):
-                with open(settingsFile, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                data["document_path"] = newPath
-                with open(settingsFile, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, indent=2)
+            # Move the stored settings and history to the new key
+            with store.transaction() as conn:
+                store.renameDocument(conn, oldHash, newHash, newPath)
 
             shutil.rmtree(oldDir)
             print(f"Migrated settings from {oldPath} to {newPath}")
@@ -394,7 +652,10 @@ def deleteAllData():
     """Delete the complete libreassist data directory."""
     try:
         import shutil
+        _resetGlobalSettings()
+        store.close()
         baseDir = getLibreAssistDir()
+        invalidateDocDirs()
         if baseDir and os.path.exists(baseDir):
             shutil.rmtree(baseDir)
             return True
@@ -420,19 +681,35 @@ def getProviderConfigFile():
         return None
 
 
+# (mtime_ns, size) of providers.json and its parsed content; the file is
+# only parsed again when the user has edited it
+_providerConfigCache = (None, {})
+
+
 def loadProviderConfig():
     """
     Load provider config from user data dir.
     If it doesn't exist yet, copy the default from the extension package.
+    The parsed config is cached and revalidated by the file's mtime and size;
+    callers must not modify the returned dict.
     Returns: dict of provider entries, or empty dict on failure.
     """
     import json, shutil
+    global _providerConfigCache
 
     userFile = getProviderConfigFile()
     if not userFile:
         return {}
 
-    if not os.path.exists(userFile):
+    try:
+        st = os.stat(userFile)
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == _providerConfigCache[0]:
+            return _providerConfigCache[1]
+    except OSError:
+        stamp = None
+
+    if stamp is None:
         # Copy default from extension package
         try:
             ctx = uno.getComponentContext()
@@ -453,8 +730,11 @@ def loadProviderConfig():
             return {}
 
     try:
+        st = os.stat(userFile)
         with open(userFile, 'r', encoding='utf-8') as f:
-            return json.load(f)
+            config = json.load(f)
+        _providerConfigCache = ((st.st_mtime_ns, st.st_size), config)
+        return config
     except Exception as e:
         print(f"Error loading provider config: {e}")
         return {}
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# libreassist/storage.py - Global storage quota for snapshots and history
+#
+# Everything LibreAssist keeps per document – undo snapshots in the blob
+# store, archived history segments and other files in the hash-named document
+# directories – counts against one quota (global setting storage_budget_mb).
+# Sizes come from the store (snapshot_blobs.bytes, documents.bytes), so
+# checking the quota does not walk the disk. When the quota is exceeded,
+# the undo timelines of documents are dropped, least recently used first;
+# open documents keep the snapshot of their current state. Snapshots can be
+# taken again, chat history cannot: only if that is not enough, archived
+# history of closed documents is deleted too, and the user is told so on
+# the next turn (takeHistoryNotice()).
+
+import os
+import threading
+
+from . import store, backup
+
+DEFAULT_QUOTA_MB = 500
+
+# Files of the single-backup scheme used before the snapshot store
+LEGACY_BACKUP_PREFIXES = ("backup.", "changed.")
+
+_openLock       = threading.Lock()
+_openPaths      = set()   # Paths of documents with an open window
+_droppedHistory = 0       # Documents whose archived history was deleted, not yet reported
+
+
+def setDocumentOpen(fullPath, isOpen):
+    """Record that a document window was opened or closed."""
+    if not fullPath:
+        return
+    with _openLock:
+        if isOpen:
+            _openPaths.add(fullPath)
+        else:
+            _openPaths.discard(fullPath)
+
+
+def _isOpen(fullPath):
+    with _openLock:
+        return fullPath in _openPaths
+
+
+def getOpenPaths():
+    """Paths of the documents that currently have an open window."""
+    with _openLock:
+        return list(_openPaths)
+
+
+class StorageUsage:
+    """Bytes used by LibreAssist data, by kind."""
+
+    def __init__(self, snapshots, documents, database, quota):
+        self.snapshots = snapshots     # Snapshot blob files
+        self.documents = documents     # Document directories (history archives etc.)
+        self.database  = database      # libreassist.db with its WAL
+        self.quota     = quota
+
+    @property
+    def total(self):
+        return self.snapshots + self.documents + self.database
+
+    def __str__(self):
+        mb = 1024 * 1024
+        return (f"{self.total / mb:.1f} of {self.quota / mb:.0f} MB "
+                f"(snapshots {self.snapshots / mb:.1f}, history {self.documents / mb:.1f}, "
+                f"database {self.database / mb:.1f})")
+
+
+def _quotaBytes(quotaMb=None):
+    if quotaMb is None:
+        from libreassist.settings import loadGlobalSettings
+        quotaMb = loadGlobalSettings().get("storage_budget_mb", DEFAULT_QUOTA_MB)
+    return quotaMb * 1024 * 1024
+
+
+def getUsage(quotaMb=None):
+    """Return the current StorageUsage."""
+    from libreassist.settings import getLibreAssistDir
+    _, snapshots = store.snapshotTotals()
+    _, documents = store.manifestTotals()
+    database = 0
+    baseDir  = getLibreAssistDir()
+    if baseDir:
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                database += os.path.getsize(os.path.join(baseDir, store.DB_FILENAME + suffix))
+            except OSError:
+                pass
+    return StorageUsage(snapshots, documents, database, _quotaBytes(quotaMb))
+
+
+def _removeLegacyBackups(docDir, docKey):
+    """Delete backup files of the single-backup scheme from a document directory."""
+    try:
+        for entry in os.scandir(docDir):
+            if entry.name.startswith(LEGACY_BACKUP_PREFIXES) and entry.is_file():
+                os.remove(entry.path)
+    except OSError:
+        return
+    _updateSize(docDir, docKey)
+
+
+def _dropArchivedHistory(docDir, docKey):
+    """Delete the archived history segments of a document."""
+    for segmentId, _, filename, count, size in store.listArchiveSegments(docKey):
+        with store.transaction() as conn:
+            store.deleteArchiveSegment(conn, segmentId)
+        try:
+            os.remove(os.path.join(docDir, filename))
+        except OSError:
+            pass
+    _updateSize(docDir, docKey)
+
+
+def _updateSize(docDir, docKey):
+    from libreassist.settings import getDirSize
+    with store.transaction() as conn:
+        store.setDocumentSize(conn, docKey, getDirSize(docDir))
+
+
+def takeHistoryNotice():
+    """
+    Number of documents whose archived history the quota deleted since the
+    last call (0 if none); resets the count.
+    """
+    global _droppedHistory
+    with _openLock:
+        count, _droppedHistory = _droppedHistory, 0
+    return count
+
+
+def enforceQuota(baseDir, quotaMb=None):
+    """
+    Free space until the usage fits the quota, least recently used
+    documents first: undo timelines and legacy backups, then – only if that
+    is not enough – archived history of closed documents.
+    Returns (StorageUsage afterwards, number of evicted documents).
+    """
+    global _droppedHistory
+    usage   = getUsage(quotaMb)
+    evicted = 0
+    if usage.total <= usage.quota:
+        return usage, evicted
+
+    documents = store.listDocumentsByUse()
+    for docKey, docPath in documents:
+        backup.trimTimeline(docKey, _isOpen(docPath))
+        _removeLegacyBackups(os.path.join(baseDir, docKey), docKey)
+        backup.collectGarbage()
+        evicted += 1
+        usage = getUsage(quotaMb)
+        if usage.total <= usage.quota:
+            return usage, evicted
+
+    # Deleting history only makes sense if it gets the usage under the quota
+    closed = [(docKey, docPath) for docKey, docPath in documents if not _isOpen(docPath)]
+    archived = {docKey: sum(row[4] for row in store.listArchiveSegments(docKey))
+                for docKey, docPath in closed}
+    if usage.total - sum(archived.values()) > usage.quota:
+        return usage, evicted
+
+    for docKey, docPath in closed:
+        if not archived[docKey]:
+            continue
+        _dropArchivedHistory(os.path.join(baseDir, docKey), docKey)
+        with _openLock:
+            _droppedHistory += 1
+        usage = getUsage(quotaMb)
+        if usage.total <= usage.quota:
+            break
+    return usage, evicted
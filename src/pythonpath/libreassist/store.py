@@ -0,0 +1,837 @@
+# -*- coding: utf-8 -*-
+# libreassist/store.py - SQLite store for per-document settings and history
+#
+# One database per LibreOffice profile (<LibreAssist dir>/libreassist.db) in
+# WAL mode. Settings, session IDs and history live in separate tables, so a
+# turn updates only the rows it touches, in one transaction, instead of
+# rewriting settings.json and history.txt several times. The hash-named
+# document directories remain, but only for backups and document copies.
+#
+# Chat history is an append-only log: one row per message, so saving a turn
+# costs only the size of that turn. Clearing appends a marker row; compaction
+# later deletes everything before the newest marker.
+
+import contextlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from .messages import Message, ROLE_CLEAR, ROLE_LEGACY, ROLE_USER, SEARCHABLE_ROLES, tokenize
+
+DB_FILENAME  = "libreassist.db"
+DOC_DIR_NAME = re.compile(r"^[0-9a-f]{12}$")   # md5 prefix used for document directories
+
+# Undo/redo flags of the single-backup scheme; the snapshot timeline sets its own
+LEGACY_UNDO_FLAGS = ("undo_available", "redo_available")
+
+# fsync policy for commits → SQLite synchronous mode. In WAL mode "normal" never
+# corrupts the database but may lose the last turns on power failure; "full"
+# syncs every commit.
+SYNC_POLICIES = {"off": "OFF", "normal": "NORMAL", "full": "FULL"}
+DEFAULT_SYNC_POLICY = "normal"
+
+_conn = None
+_lock = threading.RLock()   # One shared connection; serializes all access
+
+
+# ---------------------------------------------------------------------------
+# Schema
+# ---------------------------------------------------------------------------
+
+def _schemaV1(conn):
+    conn.execute("""
+        CREATE TABLE documents (
+            doc_key   TEXT PRIMARY KEY,
+            path      TEXT,
+            created   REAL NOT NULL,
+            last_used REAL NOT NULL
+        )""")
+    conn.execute("""
+        CREATE TABLE doc_settings (
+            doc_key TEXT NOT NULL REFERENCES documents(doc_key) ON DELETE CASCADE,
+            key     TEXT NOT NULL,
+            value   TEXT NOT NULL,
+            PRIMARY KEY (doc_key, key)
+        )""")
+    conn.execute("""
+        CREATE TABLE session_ids (
+            doc_key    TEXT NOT NULL REFERENCES documents(doc_key) ON DELETE CASCADE,
+            provider   TEXT NOT NULL,
+            session_id TEXT,
+            PRIMARY KEY (doc_key, provider)
+        )""")
+    conn.execute("""
+        CREATE TABLE history (
+            doc_key TEXT PRIMARY KEY REFERENCES documents(doc_key) ON DELETE CASCADE,
+            text    TEXT NOT NULL
+        )""")
+
+
+def _schemaV2(conn):
+    """Replace the history text per document by an append-only message log."""
+    conn.execute("""
+        CREATE TABLE messages (
+            id      INTEGER PRIMARY KEY AUTOINCREMENT,
+            doc_key TEXT NOT NULL REFERENCES documents(doc_key) ON DELETE CASCADE,
+            role    TEXT NOT NULL,
+            label   TEXT,
+            text    TEXT NOT NULL,
+            created REAL NOT NULL
+        )""")
+    conn.execute("CREATE INDEX messages_by_doc ON messages (doc_key, id)")
+    for docKey, text in conn.execute("SELECT doc_key, text FROM history").fetchall():
+        text = _legacyText(text)
+        if text:
+            conn.execute("INSERT INTO messages (doc_key, role, text, created) VALUES (?, ?, ?, ?)",
+                         (docKey, ROLE_LEGACY, text, time.time()))
+    conn.execute("DROP TABLE history")
+
+
+def _schemaV3(conn):
+    """Per-message metadata and the inverted search index."""
+    for column in ("provider TEXT", "latency REAL", "session_id TEXT", "snapshot_id TEXT"):
+        conn.execute(f"ALTER TABLE messages ADD COLUMN {column}")
+    conn.execute("""
+        CREATE TABLE message_terms (
+            term       TEXT NOT NULL,
+            message_id INTEGER NOT NULL REFERENCES messages(id) ON DELETE CASCADE,
+            PRIMARY KEY (term, message_id)
+        ) WITHOUT ROWID""")
+    conn.execute("CREATE INDEX message_terms_by_message ON message_terms (message_id)")
+    rows = conn.execute("SELECT id, role, text FROM messages").fetchall()
+    for messageId, role, text in rows:
+        if role in SEARCHABLE_ROLES:
+            _indexMessage(conn, messageId, text)
+
+
+def _schemaV4(conn):
+    """Index of archived history segments and their search terms."""
+    conn.execute("""
+        CREATE TABLE archive_segments (
+            id       INTEGER PRIMARY KEY AUTOINCREMENT,
+            doc_key  TEXT NOT NULL REFERENCES documents(doc_key) ON DELETE CASCADE,
+            first_id INTEGER NOT NULL,
+            last_id  INTEGER NOT NULL,
+            count    INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            bytes    INTEGER NOT NULL,
+            created  REAL NOT NULL
+        )""")
+    conn.execute("CREATE INDEX archive_segments_by_doc ON archive_segments (doc_key, last_id)")
+    conn.execute("""
+        CREATE TABLE archive_terms (
+            term       TEXT NOT NULL,
+            message_id INTEGER NOT NULL,
+            segment_id INTEGER NOT NULL REFERENCES archive_segments(id) ON DELETE CASCADE,
+            PRIMARY KEY (term, message_id)
+        ) WITHOUT ROWID""")
+    conn.execute("CREATE INDEX archive_terms_by_segment ON archive_terms (segment_id)")
+
+
+def _schemaV5(conn):
+    """Manifest columns: directory size and when the document path was last verified."""
+    conn.execute("ALTER TABLE documents ADD COLUMN bytes INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE documents ADD COLUMN last_checked REAL NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX documents_by_check ON documents (last_checked)")
+
+
+def _schemaV6(conn):
+    """Content-addressed document snapshots and the per-document undo timeline."""
+    conn.execute("""
+        CREATE TABLE snapshot_blobs (
+            hash     TEXT PRIMARY KEY,
+            ext      TEXT NOT NULL,
+            bytes    INTEGER NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            created  REAL NOT NULL
+        )""")
+    conn.execute("""
+        CREATE TABLE snapshots (
+            id      INTEGER PRIMARY KEY AUTOINCREMENT,
+            doc_key TEXT NOT NULL REFERENCES documents(doc_key) ON DELETE CASCADE,
+            hash    TEXT NOT NULL REFERENCES snapshot_blobs(hash),
+            created REAL NOT NULL
+        )""")
+    conn.execute("CREATE INDEX snapshots_by_doc ON snapshots (doc_key, id)")
+    # Reference counts follow the timeline rows, including cascaded deletes
+    conn.execute("""
+        CREATE TRIGGER snapshots_ref AFTER INSERT ON snapshots BEGIN
+            UPDATE snapshot_blobs SET refcount = refcount + 1 WHERE hash = NEW.hash;
+        END""")
+    conn.execute("""
+        CREATE TRIGGER snapshots_unref AFTER DELETE ON snapshots BEGIN
+            UPDATE snapshot_blobs SET refcount = refcount - 1 WHERE hash = OLD.hash;
+        END""")
+    # The flags referred to backup.<ext>/changed.<ext>, which the timeline does not know
+    conn.execute("DELETE FROM doc_settings WHERE key IN (?, ?)", LEGACY_UNDO_FLAGS)
+
+
+def _schemaV7(conn):
+    """
+    ZIP packages (ODF, OOXML) are snapshotted entry by entry: a "zip" blob is
+    a manifest of entry blobs, which count as referenced by every manifest
+    that lists them.
+    """
+    conn.execute("ALTER TABLE snapshot_blobs ADD COLUMN kind TEXT NOT NULL DEFAULT 'file'")
+    conn.execute("""
+        CREATE TABLE snapshot_entries (
+            manifest      TEXT NOT NULL REFERENCES snapshot_blobs(hash) ON DELETE CASCADE,
+            position      INTEGER NOT NULL,
+            name          TEXT NOT NULL,
+            hash          TEXT NOT NULL,
+            crc           INTEGER NOT NULL,
+            size          INTEGER NOT NULL,
+            compress_type INTEGER NOT NULL,
+            date_time     TEXT NOT NULL,
+            PRIMARY KEY (manifest, position)
+        ) WITHOUT ROWID""")
+    conn.execute("""
+        CREATE TRIGGER snapshot_entries_ref AFTER INSERT ON snapshot_entries BEGIN
+            UPDATE snapshot_blobs SET refcount = refcount + 1 WHERE hash = NEW.hash;
+        END""")
+    conn.execute("""
+        CREATE TRIGGER snapshot_entries_unref AFTER DELETE ON snapshot_entries BEGIN
+            UPDATE snapshot_blobs SET refcount = refcount - 1 WHERE hash = OLD.hash;
+        END""")
+
+
+# Index i upgrades the schema from user_version i to i + 1
+_MIGRATIONS = [_schemaV1, _schemaV2, _schemaV3, _schemaV4, _schemaV5, _schemaV6, _schemaV7]
+
+
+def _migrate(conn, baseDir):
+    """Bring the schema up to date; import the JSON files on first creation."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= len(_MIGRATIONS):
+        return []
+    legacyFiles = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for step in _MIGRATIONS[version:]:
+            step(conn)
+        if version == 0:
+            legacyFiles = _importLegacyDirs(conn, baseDir)
+        conn.execute(f"PRAGMA user_version = {len(_MIGRATIONS)}")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return legacyFiles
+
+
+def _importLegacyDirs(conn, baseDir):
+    """
+    Import settings.json and history.txt of every document directory.
+    Returns the imported files, to be deleted once the transaction committed.
+    """
+    imported = []
+    for dirName in os.listdir(baseDir):
+        docDir = os.path.join(baseDir, dirName)
+        if not DOC_DIR_NAME.match(dirName) or not os.path.isdir(docDir):
+            continue
+        settingsFile = os.path.join(docDir, "settings.json")
+        historyFile  = os.path.join(docDir, "history.txt")
+        try:
+            data = {}
+            if os.path.exists(settingsFile):
+                with open(settingsFile, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            history = None
+            if os.path.exists(historyFile):
+                with open(historyFile, 'r', encoding='utf-8') as f:
+                    history = f.read()
+        except (OSError, ValueError) as e:
+            print(f"Skipping unreadable settings in {docDir}: {e}")
+            continue
+        if not data and history is None:
+            continue
+
+        touchDocument(conn, dirName, data.pop("document_path", None))
+        for flag in LEGACY_UNDO_FLAGS:
+            data.pop(flag, None)
+        setSessionIds(conn, dirName, data.pop("session_ids", {}) or {}, replace=True)
+        setDocSettings(conn, dirName, data)
+        if history is not None:
+            _appendLegacyHistory(conn, dirName, history)
+        imported.extend(p for p in (settingsFile, historyFile) if os.path.exists(p))
+    if imported:
+        print(f"Imported settings of {len(imported)} files into {DB_FILENAME}")
+    return imported
+
+
+# ---------------------------------------------------------------------------
+# Connection and transactions
+# ---------------------------------------------------------------------------
+
+def getConnection():
+    """Return the shared connection, opening and migrating the database on first use."""
+    global _conn
+    with _lock:
+        if _conn is not None:
+            return _conn
+        from libreassist.settings import getLibreAssistDir
+        baseDir = getLibreAssistDir()
+        if not baseDir:
+            return None
+        conn = sqlite3.connect(os.path.join(baseDir, DB_FILENAME),
+                               isolation_level=None, check_same_thread=False, timeout=10)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        _applySyncPolicy(conn)
+        legacyFiles = _migrate(conn, baseDir)
+        for path in legacyFiles:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        _conn = conn
+        return _conn
+
+
+@contextlib.contextmanager
+def transaction():
+    """
+    Run a block of writes as one transaction:
+
+        with store.transaction() as conn:
+            store.touchDocument(conn, docKey, path)
+            ...
+    """
+    with _lock:
+        conn = getConnection()
+        if conn is None:
+            raise RuntimeError("LibreAssist data store is not available")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def query(sql, params=()):
+    """Run a read-only statement and return all rows."""
+    with _lock:
+        conn = getConnection()
+        if conn is None:
+            return []
+        return conn.execute(sql, params).fetchall()
+
+
+def close():
+    """Close the shared connection (before the data directory is deleted)."""
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+
+
+def _applySyncPolicy(conn):
+    from libreassist.settings import loadGlobalSettings
+    policy = loadGlobalSettings().get("history_fsync", DEFAULT_SYNC_POLICY)
+    conn.execute(f"PRAGMA synchronous = {SYNC_POLICIES.get(policy, 'NORMAL')}")
+
+
+def setSyncPolicy(policy):
+    """Apply a changed fsync policy ("off", "normal" or "full") to the open connection."""
+    with _lock:
+        if _conn is not None and policy in SYNC_POLICIES:
+            _conn.execute(f"PRAGMA synchronous = {SYNC_POLICIES[policy]}")
+
+
+def docKeyForDir(docDir):
+    """Documents are keyed by the name of their hash directory."""
+    return os.path.basename(os.path.normpath(docDir))
+
+
+# ---------------------------------------------------------------------------
+# Row helpers (called inside transaction())
+# ---------------------------------------------------------------------------
+
+def touchDocument(conn, docKey, path=None):
+    """Create the document row or refresh its path and last-used time."""
+    now = time.time()
+    conn.execute("""
+        INSERT INTO documents (doc_key, path, created, last_used) VALUES (?, ?, ?, ?)
+        ON CONFLICT(doc_key) DO UPDATE SET
+            path      = COALESCE(excluded.path, documents.path),
+            last_used = excluded.last_used""", (docKey, path, now, now))
+
+
+def setDocumentSize(conn, docKey, size):
+    """Record the size in bytes of a document's directory in the manifest."""
+    conn.execute("UPDATE documents SET bytes = ? WHERE doc_key = ?", (size, docKey))
+
+
+def markChecked(conn, docKeys):
+    """Record that the document paths were found to exist."""
+    now = time.time()
+    conn.executemany("UPDATE documents SET last_checked = ? WHERE doc_key = ?",
+                     [(now, docKey) for docKey in docKeys])
+
+
+def setDocSettings(conn, docKey, values):
+    """Upsert single settings; values are stored as JSON."""
+    conn.executemany("""
+        INSERT INTO doc_settings (doc_key, key, value) VALUES (?, ?, ?)
+        ON CONFLICT(doc_key, key) DO UPDATE SET value = excluded.value""",
+        [(docKey, key, json.dumps(value)) for key, value in values.items()])
+
+
+def setSessionIds(conn, docKey, sessionIds, replace=False):
+    """Upsert provider session IDs; replace=True drops all others first."""
+    if replace:
+        conn.execute("DELETE FROM session_ids WHERE doc_key = ?", (docKey,))
+    conn.executemany("""
+        INSERT INTO session_ids (doc_key, provider, session_id) VALUES (?, ?, ?)
+        ON CONFLICT(doc_key, provider) DO UPDATE SET session_id = excluded.session_id""",
+        [(docKey, provider, sessionId) for provider, sessionId in sessionIds.items()])
+
+
+def appendMessages(conn, docKey, messages):
+    """
+    Append Message objects to the history log of a document and add them
+    to the search index. Sets the id of each message.
+    """
+    for m in messages:
+        cursor = conn.execute("""
+            INSERT INTO messages (doc_key, role, label, text, created,
+                                  provider, latency, session_id, snapshot_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (docKey, m.role, m.label, m.text, m.timestamp,
+             m.provider, m.latency, m.sessionId, m.snapshotId))
+        m.id = cursor.lastrowid
+        if m.role in SEARCHABLE_ROLES:
+            _indexMessage(conn, m.id, m.text)
+
+
+def _indexMessage(conn, messageId, text):
+    conn.executemany("INSERT OR IGNORE INTO message_terms (term, message_id) VALUES (?, ?)",
+                     [(term, messageId) for term in tokenize(text)])
+
+
+def clearMessages(conn, docKey):
+    """
+    Hide all earlier messages by appending a clear marker. Archived
+    messages are dropped from the index; their files are left to
+    archive.removeUnindexedSegments(), their size is taken off the
+    document's size in the manifest now.
+    """
+    appendMessages(conn, docKey, [Message(ROLE_CLEAR, "")])
+    conn.execute("""
+        UPDATE documents SET bytes = MAX(0, bytes - (
+            SELECT COALESCE(SUM(bytes), 0) FROM archive_segments WHERE doc_key = ?))
+        WHERE doc_key = ?""", (docKey, docKey))
+    conn.execute("DELETE FROM archive_segments WHERE doc_key = ?", (docKey,))
+
+
+def _legacyText(text):
+    """History text without the header and trailing blank lines."""
+    if text.startswith("Chat History\n"):
+        text = text[len("Chat History\n"):]
+    return text.rstrip("\n")
+
+
+def _appendLegacyHistory(conn, docKey, text):
+    """Import a complete history text as a single message."""
+    text = _legacyText(text)
+    if text:
+        appendMessages(conn, docKey, [Message(ROLE_LEGACY, text)])
+
+
+def compactMessages(conn):
+    """
+    Delete messages hidden by a clear marker, including the markers themselves.
+    Returns the number of deleted rows.
+    """
+    cursor = conn.execute("""
+        DELETE FROM messages WHERE id <= (
+            SELECT MAX(m.id) FROM messages m
+            WHERE m.doc_key = messages.doc_key AND m.role = ?)""", (ROLE_CLEAR,))
+    return cursor.rowcount
+
+
+def deleteDocument(conn, docKey):
+    conn.execute("DELETE FROM documents WHERE doc_key = ?", (docKey,))
+
+
+def renameDocument(conn, oldKey, newKey, newPath):
+    """Move all rows of a document to a new key (Save As)."""
+    deleteDocument(conn, newKey)
+    touchDocument(conn, newKey, newPath)
+    for table in ("doc_settings", "session_ids", "messages", "archive_segments", "snapshots"):
+        conn.execute(f"UPDATE {table} SET doc_key = ? WHERE doc_key = ?", (newKey, oldKey))
+    conn.execute("UPDATE documents SET path = ? WHERE doc_key = ?", (newPath, newKey))
+    deleteDocument(conn, oldKey)
+
+
+# ---------------------------------------------------------------------------
+# Reads
+# ---------------------------------------------------------------------------
+
+def loadDocument(docKey):
+    """
+    Return (path, settings, sessionIds) of a document, or None if unknown.
+    """
+    with _lock:
+        rows = query("SELECT path FROM documents WHERE doc_key = ?", (docKey,))
+        if not rows:
+            return None
+        values = {key: json.loads(value) for key, value in
+                  query("SELECT key, value FROM doc_settings WHERE doc_key = ?", (docKey,))}
+        sessionIds = dict(query("SELECT provider, session_id FROM session_ids WHERE doc_key = ?",
+                                (docKey,)))
+        return rows[0][0], values, sessionIds
+
+
+_MESSAGE_COLUMNS = "m.id, m.role, m.label, m.text, m.provider, m.created, m.latency, m.session_id, m.snapshot_id"
+
+
+def _messageFromRow(row):
+    return Message(row[1], row[3], label=row[2], provider=row[4], timestamp=row[5],
+                   latency=row[6], sessionId=row[7], snapshotId=row[8], id=row[0])
+
+
+def loadMessages(docKey, limit=None, offset=0):
+    """
+    Return the visible messages of a document as Message objects, oldest
+    first. With limit, only the last `limit` messages are read, skipping the
+    newest `offset` ones; the query walks the (doc_key, id) index backwards,
+    so the cost does not depend on the length of the history.
+    """
+    rows = query(f"""
+        SELECT {_MESSAGE_COLUMNS} FROM messages m
+        WHERE m.doc_key = ? AND m.id > COALESCE(
+            (SELECT MAX(id) FROM messages WHERE doc_key = ? AND role = ?), 0)
+        ORDER BY m.id DESC LIMIT ? OFFSET ?""",
+        (docKey, docKey, ROLE_CLEAR, -1 if limit is None else limit, offset))
+    return [_messageFromRow(r) for r in reversed(rows)]
+
+
+def countMessages(docKey):
+    """Number of visible messages of a document in the database (not archived)."""
+    return query("""
+        SELECT COUNT(*) FROM messages
+        WHERE doc_key = ? AND id > COALESCE(
+            (SELECT MAX(id) FROM messages WHERE doc_key = ? AND role = ?), 0)""",
+        (docKey, docKey, ROLE_CLEAR))[0][0]
+
+
+def _termMatch(text, table):
+    """
+    SQL selecting the message_id of every row in table whose message has all
+    words of text (the last one as prefix), and its parameters; None if
+    text has no words.
+    """
+    terms = sorted(tokenize(text), key=text.lower().rfind)
+    if not terms:
+        return None, []
+    prefix  = terms.pop()
+    clauses = [f"SELECT message_id FROM {table} WHERE term = ?"] * len(terms)
+    clauses.append(f"SELECT message_id FROM {table} WHERE term >= ? AND term < ?")
+    return " INTERSECT ".join(clauses), terms + [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+
+
+def searchMessages(text, limit=50):
+    """
+    Find visible messages of all documents that contain every word of text;
+    the last word also matches as a prefix. Returns (path, Message) pairs,
+    newest first.
+    """
+    match, params = _termMatch(text, "message_terms")
+    if not match:
+        return []
+    rows = query(f"""
+        SELECT {_MESSAGE_COLUMNS}, d.path FROM messages m
+        JOIN documents d ON d.doc_key = m.doc_key
+        WHERE m.id IN ({match})
+          AND m.id > COALESCE((SELECT MAX(c.id) FROM messages c
+                               WHERE c.doc_key = m.doc_key AND c.role = ?), 0)
+        ORDER BY m.id DESC LIMIT ?""", params + [ROLE_CLEAR, limit])
+    return [(r[9], _messageFromRow(r)) for r in rows]
+
+
+# ---------------------------------------------------------------------------
+# Archive index (segment files are handled by archive.py)
+# ---------------------------------------------------------------------------
+
+def hotCutoff(docKey, hotTurns):
+    """
+    ID of the first message of the hotTurns newest turns (a turn starts with
+    a user message), or None if the document has no more turns than that.
+    """
+    rows = query("""
+        SELECT id FROM messages WHERE doc_key = ? AND role = ?
+        ORDER BY id DESC LIMIT 1 OFFSET ?""", (docKey, ROLE_USER, hotTurns - 1))
+    return rows[0][0] if rows else None
+
+
+def loadMessagesBefore(docKey, beforeId):
+    """Visible messages of a document with an id below beforeId, oldest first."""
+    rows = query(f"""
+        SELECT {_MESSAGE_COLUMNS} FROM messages m
+        WHERE m.doc_key = ? AND m.id < ? AND m.id > COALESCE(
+            (SELECT MAX(id) FROM messages WHERE doc_key = ? AND role = ?), 0)
+        ORDER BY m.id""", (docKey, beforeId, docKey, ROLE_CLEAR))
+    return [_messageFromRow(r) for r in rows]
+
+
+def addArchiveSegment(conn, docKey, messages, filename, size):
+    """
+    Register a written segment file and move its messages out of the live
+    tables; their search terms move to archive_terms.
+    """
+    firstId, lastId = messages[0].id, messages[-1].id
+    cursor = conn.execute("""
+        INSERT INTO archive_segments (doc_key, first_id, last_id, count, filename, bytes, created)
+        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        (docKey, firstId, lastId, len(messages), filename, size, time.time()))
+    segmentId = cursor.lastrowid
+    conn.execute("""
+        INSERT OR IGNORE INTO archive_terms (term, message_id, segment_id)
+        SELECT t.term, t.message_id, ? FROM message_terms t
+        JOIN messages m ON m.id = t.message_id
+        WHERE m.doc_key = ? AND m.id BETWEEN ? AND ?""", (segmentId, docKey, firstId, lastId))
+    conn.execute("DELETE FROM messages WHERE doc_key = ? AND id BETWEEN ? AND ?",
+                 (docKey, firstId, lastId))
+    return segmentId
+
+
+def deleteArchiveSegment(conn, segmentId):
+    """Drop a segment from the index and its size from the manifest."""
+    conn.execute("""
+        UPDATE documents SET bytes = MAX(0, bytes - (SELECT bytes FROM archive_segments WHERE id = ?))
+        WHERE doc_key = (SELECT doc_key FROM archive_segments WHERE id = ?)""", (segmentId, segmentId))
+    conn.execute("DELETE FROM archive_segments WHERE id = ?", (segmentId,))
+
+
+def listArchiveSegments(docKey=None):
+    """
+    Return archive segments as (id, doc_key, filename, count, bytes), newest
+    first for one document, or oldest first across all documents.
+    """
+    if docKey is not None:
+        return query("""
+            SELECT id, doc_key, filename, count, bytes FROM archive_segments
+            WHERE doc_key = ? ORDER BY last_id DESC""", (docKey,))
+    return query("SELECT id, doc_key, filename, count, bytes FROM archive_segments ORDER BY created, id")
+
+
+def searchArchivedIds(text, limit=50):
+    """
+    Find archived messages like searchMessages(). Returns
+    (message_id, doc_key, path, filename) rows, newest first.
+    """
+    match, params = _termMatch(text, "archive_terms")
+    if not match:
+        return []
+    return query(f"""
+        SELECT t.message_id, s.doc_key, d.path, s.filename FROM archive_terms t
+        JOIN archive_segments s ON s.id = t.segment_id
+        JOIN documents d ON d.doc_key = s.doc_key
+        WHERE t.message_id IN ({match})
+        GROUP BY t.message_id
+        ORDER BY t.message_id DESC LIMIT ?""", params + [limit])
+
+
+# ---------------------------------------------------------------------------
+# Snapshots (blob files are handled by backup.py)
+# ---------------------------------------------------------------------------
+
+SNAPSHOT_CURSOR = "snapshot_cursor"   # doc_settings key: snapshot the document is at
+
+
+SNAPSHOT_FILE  = "file"    # Blob file with the complete document
+SNAPSHOT_ZIP   = "zip"     # Manifest of a ZIP package, no file of its own
+SNAPSHOT_ENTRY = "entry"   # Blob file with one ZIP entry
+
+
+def addSnapshotBlob(conn, blobHash, ext, size, kind=SNAPSHOT_FILE):
+    """
+    Register a blob; no-op if the content is already stored.
+    Returns True if the blob is new.
+    """
+    cursor = conn.execute("""
+        INSERT OR IGNORE INTO snapshot_blobs (hash, ext, bytes, kind, created)
+        VALUES (?, ?, ?, ?, ?)""", (blobHash, ext, size, kind, time.time()))
+    return cursor.rowcount == 1
+
+
+def addManifestEntries(conn, manifest, entries):
+    """
+    List the entries of a ZIP manifest blob, in package order. entries are
+    (name, hash, crc, size, compress_type, date_time) tuples; date_time is
+    stored as JSON.
+    """
+    conn.executemany("""
+        INSERT INTO snapshot_entries (manifest, position, name, hash, crc, size,
+                                      compress_type, date_time)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+        [(manifest, position, name, entryHash, crc, size, compressType, json.dumps(dateTime))
+         for position, (name, entryHash, crc, size, compressType, dateTime) in enumerate(entries)])
+
+
+def loadManifestEntries(manifest):
+    """
+    Return the entries of a ZIP manifest blob in package order as
+    (name, hash, crc, size, compress_type, date_time, blob ext) tuples.
+    """
+    return [row[:5] + (tuple(json.loads(row[5])), row[6]) for row in query("""
+        SELECT e.name, e.hash, e.crc, e.size, e.compress_type, e.date_time, b.ext
+        FROM snapshot_entries e JOIN snapshot_blobs b ON b.hash = e.hash
+        WHERE e.manifest = ? ORDER BY e.position""", (manifest,))]
+
+
+def getBlobExt(blobHash):
+    """Return the file extension of a stored blob, or None if it is unknown."""
+    rows = query("SELECT ext FROM snapshot_blobs WHERE hash = ?", (blobHash,))
+    return rows[0][0] if rows else None
+
+
+def getSnapshotCursor(conn, docKey):
+    row = conn.execute("SELECT value FROM doc_settings WHERE doc_key = ? AND key = ?",
+                       (docKey, SNAPSHOT_CURSOR)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def pushSnapshot(conn, docKey, blobHash, depth):
+    """
+    Make blobHash the current state of a document's timeline. The same
+    content as the current state is not added twice and leaves the redo
+    branch alone (a turn that did not edit the document must not lose
+    Redo); a different state drops the states after the cursor. Keeps at
+    most depth + 1 states. Returns the snapshot id of the current state.
+    """
+    cursor = getSnapshotCursor(conn, docKey)
+    if cursor is not None:
+        row = conn.execute("SELECT hash FROM snapshots WHERE id = ?", (cursor,)).fetchone()
+        if row and row[0] == blobHash:
+            return cursor
+        conn.execute("DELETE FROM snapshots WHERE doc_key = ? AND id > ?", (docKey, cursor))
+    snapshotId = conn.execute(
+        "INSERT INTO snapshots (doc_key, hash, created) VALUES (?, ?, ?)",
+        (docKey, blobHash, time.time())).lastrowid
+    conn.execute("""
+        DELETE FROM snapshots WHERE doc_key = ? AND id NOT IN (
+            SELECT id FROM snapshots WHERE doc_key = ? ORDER BY id DESC LIMIT ?)""",
+        (docKey, docKey, depth + 1))
+    setDocSettings(conn, docKey, {SNAPSHOT_CURSOR: snapshotId})
+    return snapshotId
+
+
+def findSnapshotStep(docKey, direction):
+    """
+    Return (snapshot id, blob hash, ext, kind) of the state one step back
+    (direction -1) or forward (+1) from the cursor, or None. Does not move
+    the cursor – see setSnapshotCursor().
+    """
+    if direction < 0:
+        step = "s.id < CAST(d.value AS INTEGER) ORDER BY s.id DESC"
+    else:
+        step = "s.id > CAST(d.value AS INTEGER) ORDER BY s.id"
+    rows = query(f"""
+        SELECT s.id, s.hash, b.ext, b.kind FROM doc_settings d
+        JOIN snapshots s ON s.doc_key = d.doc_key
+        JOIN snapshot_blobs b ON b.hash = s.hash
+        WHERE d.doc_key = ? AND d.key = ? AND {step} LIMIT 1""", (docKey, SNAPSHOT_CURSOR))
+    return rows[0] if rows else None
+
+
+def setSnapshotCursor(conn, docKey, snapshotId):
+    """Move the cursor to a snapshot of the document. Returns False if it no longer exists."""
+    row = conn.execute("SELECT 1 FROM snapshots WHERE id = ? AND doc_key = ?",
+                       (snapshotId, docKey)).fetchone()
+    if row:
+        setDocSettings(conn, docKey, {SNAPSHOT_CURSOR: snapshotId})
+    return bool(row)
+
+
+def snapshotNeighbours(conn, docKey):
+    """Return (has older state, has newer state) around the cursor."""
+    cursor = getSnapshotCursor(conn, docKey)
+    if cursor is None:
+        return False, False
+    older, newer = conn.execute("""
+        SELECT EXISTS(SELECT 1 FROM snapshots WHERE doc_key = ? AND id < ?),
+               EXISTS(SELECT 1 FROM snapshots WHERE doc_key = ? AND id > ?)""",
+        (docKey, cursor, docKey, cursor)).fetchone()
+    return bool(older), bool(newer)
+
+
+def getSnapshotBlob(snapshotId):
+    """Return (hash, ext, kind) of a snapshot, or None."""
+    rows = query("""
+        SELECT b.hash, b.ext, b.kind FROM snapshots s
+        JOIN snapshot_blobs b ON b.hash = s.hash WHERE s.id = ?""", (snapshotId,))
+    return rows[0] if rows else None
+
+
+def getCurrentSnapshotBlob(docKey):
+    """Return (hash, ext, kind) of the snapshot at a document's cursor, or None."""
+    rows = query("""
+        SELECT b.hash, b.ext, b.kind FROM doc_settings d
+        JOIN snapshots s ON s.id = CAST(d.value AS INTEGER)
+        JOIN snapshot_blobs b ON b.hash = s.hash
+        WHERE d.doc_key = ? AND d.key = ?""", (docKey, SNAPSHOT_CURSOR))
+    return rows[0] if rows else None
+
+
+def trimSnapshots(conn, docKey, keepCurrent):
+    """
+    Drop a document's timeline, except the snapshot at the cursor if
+    keepCurrent. Returns the number of dropped snapshots.
+    """
+    cursor = getSnapshotCursor(conn, docKey) if keepCurrent else None
+    dropped = conn.execute("DELETE FROM snapshots WHERE doc_key = ? AND id IS NOT ?",
+                           (docKey, cursor)).rowcount
+    if cursor is None:
+        conn.execute("DELETE FROM doc_settings WHERE doc_key = ? AND key = ?",
+                     (docKey, SNAPSHOT_CURSOR))
+    return dropped
+
+
+def snapshotTotals():
+    """Return (number of blobs, total bytes of all snapshot blob files)."""
+    count, size = query("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM snapshot_blobs")[0]
+    return count, size
+
+
+def releaseUnreferencedBlobs(conn):
+    """
+    Delete blob rows nothing refers to, including entries of released ZIP
+    manifests. Returns their (hash, ext, kind).
+    """
+    released = []
+    while True:
+        rows = conn.execute("SELECT hash, ext, kind FROM snapshot_blobs WHERE refcount <= 0").fetchall()
+        if not rows:
+            return released
+        # Deleting a manifest cascades to its entries, which releases entry blobs
+        conn.executemany("DELETE FROM snapshot_blobs WHERE hash = ?", [(r[0],) for r in rows])
+        released.extend(rows)
+
+
+def listDocuments():
+    """Return (doc_key, path) of all known documents."""
+    return query("SELECT doc_key, path FROM documents")
+
+
+def listDocumentsByUse():
+    """Return (doc_key, path) of all documents, least recently used first."""
+    return query("SELECT doc_key, path FROM documents ORDER BY last_used")
+
+
+def listDocumentsByCheck():
+    """Return (doc_key, path, bytes) of all documents, least recently checked first."""
+    return query("SELECT doc_key, path, bytes FROM documents ORDER BY last_checked")
+
+
+def manifestTotals():
+    """Return (number of documents, total bytes of their directories)."""
+    count, size = query("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM documents")[0]
+    return count, size
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# libreassist/streamjson.py - Shared helpers for parsing JSON-lines provider output
+#
+# Provider CLIs emit one JSON event per line, and most of those lines are
+# events the parsers ignore. EventFilter rejects them with one regex search on
+# the raw bytes, before any decoding or JSON parsing happens.
+
+import json
+import re
+
+try:
+    import orjson as _fastjson
+except ImportError:
+    _fastjson = None
+
+BACKEND = "orjson" if _fastjson else "json"
+
+# json.JSONDecodeError, orjson.JSONDecodeError and UnicodeDecodeError are all ValueErrors
+DECODE_ERRORS = ValueError
+
+
+def loads(data):
+    """Parse a JSON document from str or bytes with the fastest available backend."""
+    if _fastjson:
+        return _fastjson.loads(data)
+    return json.loads(data)
+
+
+class EventFilter:
+    """
+    Cheap prefilter for JSON lines by their "type" values.
+    A line passes if it contains "type":"<one of types>" anywhere. Nested
+    objects may match too, so callers still check the parsed event; the
+    filter only has to be a superset.
+    """
+
+    def __init__(self, *types):
+        pattern = r'"type"\s*:\s*"(?:%s)"' % "|".join(re.escape(t) for t in types)
+        self._str   = re.compile(pattern)
+        self._bytes = re.compile(pattern.encode('ascii'))
+
+    def match(self, line):
+        regex = self._bytes if isinstance(line, bytes) else self._str
+        return regex.search(line) is not None
+
+
+def parseEvent(line, eventFilter=None):
+    """
+    Parse one JSON line (str or bytes) into a dict.
+    Returns None for blank, filtered-out, malformed or non-object lines.
+    """
+    if eventFilter is not None and not eventFilter.match(line):
+        return None
+    try:
+        event = loads(line)
+    except DECODE_ERRORS:
+        if not isinstance(line, bytes):
+            return None
+        try:
+            event = loads(line.decode('utf-8', errors='replace'))
+        except DECODE_ERRORS:
+            return None
+    return event if isinstance(event, dict) else None
+
+
+def isBlank(line):
+    """True for empty or whitespace-only lines (str or bytes)."""
+    return not line.strip()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# libreassist/ui/chatview.py - Windowed chat history view
+#
+# The ChatHistory edit control only holds the last WINDOW_SIZE messages.
+# New messages are inserted at the end and the oldest ones are cut from the
+# top with XTextComponent.insertText, so an update never re-lays-out the whole
+# transcript. The "processing" indicator and partial responses live in a tail
+# range after the last message that is replaced on every update. Older
+# messages are read from the store page by page on request.
+
+import uno
+
+from libreassist import settings as lib_settings
+
+WINDOW_SIZE = 100   # Messages kept in the control
+PAGE_SIZE   = 50    # Messages added per "show older" click
+
+_views = []         # (panelWin, ChatView) of all open panels
+
+
+def getChatView(panelWin):
+    """Return the chat view of a panel window, creating it on first use."""
+    for win, view in _views:
+        if win == panelWin:
+            return view
+    view = ChatView(panelWin)
+    _views.append((panelWin, view))
+    return view
+
+
+def releaseChatView(panelWin):
+    """Forget the chat view of a disposed panel window."""
+    _views[:] = [(win, view) for win, view in _views if win != panelWin]
+
+
+def _len16(text):
+    """Length in UTF-16 code units, the unit of awt.Selection positions."""
+    return len(text.encode('utf-16-le')) // 2
+
+
+class ChatView:
+    """
+    Tracks what the ChatHistory control shows: the header, a window of
+    messages and an optional tail. Only used on the Main-UNO-Thread.
+    """
+
+    def __init__(self, panelWin):
+        self.panelWin  = panelWin
+        self.docDir    = None
+        self.header    = lib_settings.DEFAULT_HISTORY
+        self.entries   = []     # UTF-16 lengths of the messages in the control
+        self.pending   = 0      # Trailing entries not yet stored (running turn)
+        self.tailLen   = 0
+        self.limit     = WINDOW_SIZE
+        self.hasOlder  = False
+
+    # --- Loading ---
+
+    def load(self, docDir):
+        """
+        Read the newest messages of docDir and return the initial text.
+        Used before the control has a peer; the caller sets the model Text.
+        """
+        self.docDir  = docDir
+        self.limit   = WINDOW_SIZE
+        self.pending = 0
+        self.tailLen = 0
+        messages = lib_settings.loadMessagesForDir(docDir, self.limit + 1)
+        self.hasOlder = len(messages) > self.limit
+        chunks = [m.render() for m in messages[-self.limit:]]
+        self.entries = [_len16(c) for c in chunks]
+        return self.header + "".join(chunks)
+
+    def loadOlder(self):
+        """Insert the next page of older messages below the header."""
+        offset   = len(self.entries) - self.pending
+        messages = lib_settings.loadMessagesForDir(self.docDir, PAGE_SIZE + 1, offset)
+        self.hasOlder = len(messages) > PAGE_SIZE
+        chunks = [m.render() for m in messages[-PAGE_SIZE:]]
+        if chunks:
+            text = "".join(chunks)
+            self._replace(_len16(self.header), 0, text)
+            self.entries[:0] = [_len16(c) for c in chunks]
+            self.limit = max(self.limit, len(self.entries))
+            self._scrollTo(_len16(self.header))
+        self.updateOlderButton()
+
+    def reset(self):
+        """Show an empty history (after Clear History or Delete All Data)."""
+        self.entries  = []
+        self.pending  = 0
+        self.tailLen  = 0
+        self.limit    = WINDOW_SIZE
+        self.hasOlder = False
+        self._control().setText(self.header)
+        self.updateOlderButton()
+
+    # --- Incremental updates ---
+
+    def appendMessage(self, message, stored=True):
+        """
+        Append one messages.Message before the tail.
+        stored=False marks a message whose turn is still running.
+        """
+        chunk = message.render()
+        self._replace(self._committedLen(), 0, chunk)
+        self.entries.append(_len16(chunk))
+        if not stored:
+            self.pending += 1
+        self._trim()
+        self.scrollToEnd()
+
+    def markStored(self):
+        """The running turn has been stored together with its response."""
+        self.pending = 0
+
+    def setTail(self, text):
+        """Replace the tail (processing indicator, partial response)."""
+        self._replace(self._committedLen(), self.tailLen, text)
+        self.tailLen = _len16(text)
+        self.scrollToEnd()
+
+    def clearTail(self):
+        if self.tailLen:
+            self.setTail("")
+
+    def scrollToEnd(self):
+        self._scrollTo(self._committedLen() + self.tailLen)
+
+    # --- Helpers ---
+
+    def _control(self):
+        return self.panelWin.getControl("ChatHistory")
+
+    def _committedLen(self):
+        return _len16(self.header) + sum(self.entries)
+
+    def _trim(self):
+        """Cut the oldest messages from the top once the window is full."""
+        excess = len(self.entries) - self.limit
+        if excess <= 0:
+            return
+        cut = sum(self.entries[:excess])
+        self._replace(_len16(self.header), cut, "")
+        del self.entries[:excess]
+        self.hasOlder = True
+        self.updateOlderButton()
+
+    def _replace(self, start, length, text):
+        control = self._control()
+        model   = control.getModel()
+        wasReadOnly = model.ReadOnly
+        model.ReadOnly = False
+        control.insertText(uno.createUnoStruct(
+            "com.sun.star.awt.Selection", start, start + length), text)
+        model.ReadOnly = wasReadOnly
+
+    def _scrollTo(self, position):
+        control = self._control()
+        model   = control.getModel()
+        wasReadOnly = model.ReadOnly
+        model.ReadOnly = False
+        control.setSelection(uno.createUnoStruct("com.sun.star.awt.Selection", position, position))
+        model.ReadOnly = wasReadOnly
+
+    def updateOlderButton(self):
+        try:
+            self.panelWin.getControl("LoadOlderButton").getModel().Enabled = self.hasOlder
+        except Exception:
+            pass
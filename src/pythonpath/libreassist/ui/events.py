@@ -1,14 +1,16 @@
 # -*- coding: utf-8 -*-
 # libreassist/ui/events.py - Event handlers
 
-import importlib
 import uno
 import os
 import unohelper
 from com.sun.star.document import XDocumentEventListener
+from com.sun.star.frame import XTerminateListener
 from libreassist.i18n import t
-from libreassist import core, settings as lib_settings, document as lib_document
+from libreassist import core, backup, storage, scheduler, settings as lib_settings, document as lib_document, process_pool
 from com.sun.star.awt import XActionListener, XItemListener, XTextListener, XCallback
+from libreassist import messages
+from . import chatview
 
 
 # ---------------------------------------------------------------------------
@@ -60,16 +62,6 @@ def showMessageBox(title, message, messageType="infobox", buttons=1):
     return msgBox.execute()
 
 
-def _scrollToEnd(historyControl, text):
-    """Scroll the chat history control to the end."""
-    model = historyControl.getModel()
-    wasReadOnly = model.ReadOnly
-    model.ReadOnly = False
-    historyControl.setSelection(
-        uno.createUnoStruct("com.sun.star.awt.Selection", len(text), len(text)))
-    model.ReadOnly = wasReadOnly
-
-
 # ---------------------------------------------------------------------------
 # Async completion callback
 # ---------------------------------------------------------------------------
@@ -81,54 +73,55 @@ class LLMCompletionCallback(unohelper.Base, XCallback):
     sidebar panel, regardless of which window the user may have switched to.
     """
 
-    def __init__(self, factory, panelWin, historyBeforeResponse):
+    def __init__(self, factory, panelWin, chatView):
         self.factory              = factory
         self.panelWin             = panelWin             # Captured at Send click time
-        self.historyBeforeResponse = historyBeforeResponse
+        self.chatView             = chatView             # chatview.ChatView of that panel
         self.payload              = None  # Set by _run() before asyncCb.addCallback()
         self.process              = None  # Subprocess handle, set via onProcess callback
+        self.partialCallback      = None  # LLMPartialCallback of the same request, if any
+        self.job                  = None  # scheduler.Job, set by callLLMAsync()
 
     def notify(self, data):
         """Runs on the Main-UNO-Thread – safe to call UNO APIs."""
+        if self.partialCallback:
+            self.partialCallback.finished = True
         try:
             payload         = self.payload or {}
             responseText    = payload.get("response") or payload.get("error") or t('error_general', error="No response")
             fileWasModified = payload.get("fileWasModified", False)
             docDir          = payload.get("docDir")
 
-            historyControl = self.panelWin.getControl("ChatHistory")
-
             # Restore Undo/Redo button states from the correct document's settings
             docSettings = lib_settings.loadSettingsForDir(docDir) if docDir else lib_settings.loadSettings()
             self.panelWin.getControl("UndoButton").getModel().Enabled = docSettings.get("undo_available", False)
             self.panelWin.getControl("RedoButton").getModel().Enabled = docSettings.get("redo_available", False)
 
-            newHistory = self.historyBeforeResponse + responseText + "\n\n"
             if fileWasModified:
                 try:
                     frame = payload.get("frame")
-                    ctx = uno.getComponentContext()
-                    dispatcher = ctx.ServiceManager.createInstance(
-                        "com.sun.star.frame.DispatchHelper")
-                    dispatcher.executeDispatch(frame, ".uno:Reload", "", 0, ())
+                    lib_document.reloadDocument(frame)
                     globalSettings = lib_settings.loadGlobalSettings()
                     if (payload.get("isWriter") and
                             globalSettings.get("track_changes_writer", False)):
-                        backupPath = payload.get("backupPath")
+                        backupPath = backup.getSnapshotPath(payload.get("snapshotId"))
                         if backupPath and os.path.exists(backupPath):
                             prop = uno.createUnoStruct("com.sun.star.beans.PropertyValue")
                             prop.Name = "URL"
                             prop.Value = uno.systemPathToFileUrl(backupPath)
+                            dispatcher = uno.getComponentContext().ServiceManager.createInstance(
+                                "com.sun.star.frame.DispatchHelper")
                             dispatcher.executeDispatch(
                                 frame, ".uno:CompareDocuments", "", 0, (prop,))
                 except Exception as e:
                     print(f"Error reloading document: {e}")
-            historyControl.setText(newHistory)
-            _scrollToEnd(historyControl, newHistory)
-            if docDir:
-                lib_settings.saveHistoryForDir(docDir, newHistory)
-            else:
-                lib_settings.saveHistory(newHistory)
+            # History was already stored by core as part of the turn
+            self.chatView.clearTail()
+            self.chatView.appendMessage(payload.get("message") or messages.Message(messages.ROLE_ERROR, responseText))
+            self.chatView.markStored()
+            if payload.get("notice"):
+                # Not part of the history; replaced by the next turn's tail
+                self.chatView.setTail(payload["notice"] + "\n\n")
 
         except Exception as e:
             print(f"Error in LLMCompletionCallback.notify: {e}")
@@ -145,6 +138,48 @@ class LLMCompletionCallback(unohelper.Base, XCallback):
                 pass
 
 
+class LLMPartialCallback(unohelper.Base, XCallback):
+    """
+    Invoked on the Main-UNO-Thread with the response text received so far,
+    while the provider is still running. Updates are throttled by provider_base.
+    """
+
+    def __init__(self, chatView):
+        self.chatView = chatView
+        self.text     = None   # Set by _run() before asyncCb.addCallback()
+        self.finished = False  # Set once the completion callback has run
+
+    def notify(self, data):
+        """Runs on the Main-UNO-Thread – safe to call UNO APIs."""
+        if self.finished or not self.text:
+            return
+        try:
+            # Only the tail after the last stored message is replaced
+            self.chatView.setTail(self.text + "\n\n" + t('processing_info') + "\n\n")
+        except Exception as e:
+            print(f"Error in LLMPartialCallback.notify: {e}")
+
+
+class ProviderListCallback(unohelper.Base, XCallback):
+    """
+    Invoked on the Main-UNO-Thread when background provider discovery
+    has finished; refreshes the provider dropdown of one panel.
+    """
+
+    def __init__(self, factory, panelWin):
+        self.factory    = factory
+        self.panelWin   = panelWin
+        self.discovered = None  # Set by the discovery thread before addCallback()
+
+    def notify(self, data):
+        """Runs on the Main-UNO-Thread – safe to call UNO APIs."""
+        try:
+            if self.discovered is not None:
+                self.factory.updateProviderList(self.discovered, self.panelWin)
+        except Exception as e:
+            print(f"Error updating provider list: {e}")
+
+
 # ---------------------------------------------------------------------------
 # Button event handler
 # ---------------------------------------------------------------------------
@@ -164,58 +199,44 @@ class ActionEventHandler(unohelper.Base, XActionListener):
                 # Derive the panel window from the button that was clicked.
                 # This is always the correct panel, even if the user switches
                 # windows during processing.
-                panelWin      = event.Source.getContext()
-                inputControl  = panelWin.getControl("InputField")
-                historyControl = panelWin.getControl("ChatHistory")
-                sendButton    = event.Source
+                panelWin     = event.Source.getContext()
+                inputControl = panelWin.getControl("InputField")
+                chatView     = chatview.getChatView(panelWin)
+                sendButton   = event.Source
 
                 userText = inputControl.getText()
                 if not userText.strip():
                     return
 
-                # Append user message to chat
-                currentHistory = historyControl.getText()
-                newHistory     = currentHistory + "User:\n" + userText + "\n\n"
-                historyControl.setText(newHistory)
-                _scrollToEnd(historyControl, newHistory)
+                # Append user message to chat; it is stored with the turn
+                userMessage = messages.userMessage(userText)
+                chatView.appendMessage(userMessage, stored=False)
                 inputControl.setText("")
 
                 # Handle special commands synchronously
                 if userText.strip().startswith("__"):
-                    responseText = core.handleUserInput(userText, newHistory)
+                    responseText = core.handleUserInput(userText)
                     if responseText:
-                        newHistory = newHistory + responseText + "\n\n"
-                        historyControl.setText(newHistory)
-                        _scrollToEnd(historyControl, newHistory)
-                        lib_settings.saveHistory(newHistory)
+                        commandMessage = messages.Message(messages.ROLE_COMMAND, responseText)
+                        chatView.appendMessage(commandMessage)
+                        lib_settings.appendMessages([userMessage, commandMessage])
+                    chatView.markStored()
                     return
 
                 # Resolve provider module
-                providerKey = None
-                prompt      = userText
-                for prefix in list(core.getProviders().keys()) + list(core.getAliases().keys()):
-                    if userText.lower().startswith(prefix + " "):
-                        providerKey = core.getAliases().get(prefix, prefix)
-                        prompt      = userText[len(prefix) + 1:]
-                        break
+                registry = core.getRegistry()
+                providerKey, prompt = registry.match(userText)
 
                 if providerKey is None:
                     globalSettings = lib_settings.loadGlobalSettings()
                     providerKey    = globalSettings.get("default_provider", core.DEFAULT_PROVIDER)
 
-                moduleName = core.getProviders().get(providerKey)
-                if not moduleName:
-                    return
-
-                try:
-                    providerModule = importlib.import_module(moduleName)
-                except ImportError:
+                providerModule = registry.getModule(providerKey)
+                if providerModule is None:
                     return
 
                 # Show processing indicator
-                workingHistory = newHistory + t('processing_info') + "\n\n"
-                historyControl.setText(workingHistory)
-                _scrollToEnd(historyControl, workingHistory)
+                chatView.setTail(t('processing_info') + "\n\n")
 
                 # Disable buttons during processing
                 sendButton.getModel().Label = t("cancel_button")
@@ -227,9 +248,11 @@ class ActionEventHandler(unohelper.Base, XActionListener):
                 doc = lib_document.getCurrentDocument()
 
                 # Start async call
-                callback = LLMCompletionCallback(self.factory, panelWin, newHistory)
+                callback = LLMCompletionCallback(self.factory, panelWin, chatView)
+                callback.partialCallback = LLMPartialCallback(chatView)
                 self.factory._activeCallback = callback
-                core.callLLMAsync(providerModule, prompt, newHistory, callback, doc)
+                core.callLLMAsync(providerModule, prompt, userText, callback, doc,
+                                  partialCallback=callback.partialCallback)
 
             except Exception as e:
                 print("Error in Send_OnClick:", e)
@@ -244,8 +267,8 @@ class ActionEventHandler(unohelper.Base, XActionListener):
         elif event.ActionCommand == "Cancel_OnClick":
             try:
                 callback = getattr(self.factory, '_activeCallback', None)
-                if callback and callback.process:
-                    callback.process.kill()
+                if callback:
+                    core.cancelJob(callback)
             except Exception as e:
                 print(f"Error in Cancel: {e}")
 
@@ -253,6 +276,7 @@ class ActionEventHandler(unohelper.Base, XActionListener):
         elif event.ActionCommand == "Undo_OnClick":
             try:
                 core.handleUserInput("__undo__")
+                self._updateUndoButtons(event.Source.getContext())
             except Exception as e:
                 print("Error in Undo:", e)
                 import traceback
@@ -262,6 +286,7 @@ class ActionEventHandler(unohelper.Base, XActionListener):
         elif event.ActionCommand == "Redo_OnClick":
             try:
                 core.handleUserInput("__redo__")
+                self._updateUndoButtons(event.Source.getContext())
             except Exception as e:
                 print("Error in Redo:", e)
                 import traceback
@@ -322,8 +347,7 @@ class ActionEventHandler(unohelper.Base, XActionListener):
                 )
                 if result == 2:  # Yes
                     lib_settings.clearHistory()
-                    historyControl = self.factory.panelWin.getControl("ChatHistory")
-                    historyControl.setText("Chat History\n")
+                    chatview.getChatView(self.factory.panelWin).reset()
                     showMessageBox(
                         t("clear_history_success_title"),
                         t("clear_history_success"),
@@ -350,8 +374,8 @@ class ActionEventHandler(unohelper.Base, XActionListener):
                 )
                 if result == 2:  # Yes
                     if lib_settings.deleteAllData():
-                        historyControl = self.factory.panelWin.getControl("ChatHistory")
-                        historyControl.setText("Chat History\n")
+                        chatview.getChatView(self.factory.panelWin).reset()
+                        self.factory.updateStorageUsage()
                         showMessageBox(
                             t("delete_all_data_success_title"),
                             t("delete_all_data_success"),
@@ -368,6 +392,33 @@ class ActionEventHandler(unohelper.Base, XActionListener):
             except Exception as e:
                 print("Error in DeleteAllData:", e)
 
+        # ---- Rescan Providers ----
+        elif event.ActionCommand == "RescanProviders_OnClick":
+            try:
+                # Version probes take seconds: probe on a worker, update the
+                # list on the Main-Thread (AsyncCallback is created here)
+                asyncCb  = uno.getComponentContext().ServiceManager.createInstance(
+                    "com.sun.star.awt.AsyncCallback")
+                callback = ProviderListCallback(self.factory, self.factory.panelWin)
+
+                def _rescan():
+                    try:
+                        callback.discovered = core.discoverProviders(rescan=True)
+                        asyncCb.addCallback(callback, None)
+                    except Exception as e:
+                        print(f"Error rescanning providers: {e}")
+                scheduler.getScheduler().submit(_rescan, scheduler.MAINTENANCE, None,
+                                                priority=scheduler.PRIORITY_BATCH)
+            except Exception as e:
+                print(f"Error rescanning providers: {e}")
+
+        # ---- Show Older Messages ----
+        elif event.ActionCommand == "LoadOlder_OnClick":
+            try:
+                chatview.getChatView(event.Source.getContext()).loadOlder()
+            except Exception as e:
+                print(f"Error loading older messages: {e}")
+
         # ---- Open Provider Config ----
         elif event.ActionCommand == "OpenProviderConfig_OnClick":
             try:
@@ -391,6 +442,12 @@ class ActionEventHandler(unohelper.Base, XActionListener):
             except Exception as e:
                 print(f"Error opening provider config: {e}")
 
+    def _updateUndoButtons(self, panelWin):
+        """Undo/Redo keep the panel open now, so refresh the buttons from the timeline."""
+        docSettings = lib_settings.loadSettings()
+        panelWin.getControl("UndoButton").getModel().Enabled = docSettings.get("undo_available", False)
+        panelWin.getControl("RedoButton").getModel().Enabled = docSettings.get("redo_available", False)
+
 
 # ---------------------------------------------------------------------------
 # Settings-view listeners
@@ -404,12 +461,10 @@ class ProviderChangeListener(unohelper.Base, XItemListener):
 
     def itemStateChanged(self, event):
         try:
-            globalSettings = lib_settings.loadGlobalSettings()
-            providerList   = self.factory.panelWin.getControl("ProviderList")
-            idx            = providerList.getSelectedItemPos()
+            providerList = self.factory.panelWin.getControl("ProviderList")
+            idx          = providerList.getSelectedItemPos()
             if idx >= 0:
-                globalSettings["default_provider"] = providerList.getItem(idx)
-                lib_settings.saveGlobalSettings(globalSettings)
+                lib_settings.updateGlobalSettings(default_provider=providerList.getItem(idx))
         except Exception as e:
             print(f"Error saving provider: {e}")
 
@@ -425,10 +480,8 @@ class TimeoutChangeListener(unohelper.Base, XTextListener):
 
     def textChanged(self, event):
         try:
-            globalSettings = lib_settings.loadGlobalSettings()
-            timeoutField   = self.factory.panelWin.getControl("TimeoutField")
-            globalSettings["timeout"] = int(timeoutField.getValue())
-            lib_settings.saveGlobalSettings(globalSettings)
+            timeoutField = self.factory.panelWin.getControl("TimeoutField")
+            lib_settings.updateGlobalSettings(timeout=int(timeoutField.getValue()))
         except Exception as e:
             print(f"Error saving timeout: {e}")
 
@@ -444,10 +497,8 @@ class InstructionsChangeListener(unohelper.Base, XTextListener):
 
     def textChanged(self, event):
         try:
-            globalSettings     = lib_settings.loadGlobalSettings()
-            instructionsField  = self.factory.panelWin.getControl("InstructionsField")
-            globalSettings["custom_instructions"] = instructionsField.getText()
-            lib_settings.saveGlobalSettings(globalSettings)
+            instructionsField = self.factory.panelWin.getControl("InstructionsField")
+            lib_settings.updateGlobalSettings(custom_instructions=instructionsField.getText())
         except Exception as e:
             print(f"Error saving instructions: {e}")
 
@@ -463,10 +514,8 @@ class TrackChangesChangeListener(unohelper.Base, XItemListener):
 
     def itemStateChanged(self, event):
         try:
-            globalSettings = lib_settings.loadGlobalSettings()
             checkbox = self.factory.panelWin.getControl("TrackChangesCheckBox")
-            globalSettings["track_changes_writer"] = (checkbox.getState() == 1)
-            lib_settings.saveGlobalSettings(globalSettings)
+            lib_settings.updateGlobalSettings(track_changes_writer=(checkbox.getState() == 1))
         except Exception as e:
             print(f"Error saving track changes setting: {e}")
 
@@ -474,15 +523,59 @@ class TrackChangesChangeListener(unohelper.Base, XItemListener):
         pass
 
 
+class ResponseCacheChangeListener(unohelper.Base, XItemListener):
+    """Handles response cache checkbox."""
+
+    def __init__(self, factory):
+        self.factory = factory
+
+    def itemStateChanged(self, event):
+        try:
+            checkbox = self.factory.panelWin.getControl("ResponseCacheCheckBox")
+            lib_settings.updateGlobalSettings(response_cache=(checkbox.getState() == 1))
+        except Exception as e:
+            print(f"Error saving response cache setting: {e}")
+
+    def disposing(self, event):
+        pass
+
+
 # ---------------------------------------------------------------------------
 # Document event listeners
 # ---------------------------------------------------------------------------
 
 class SaveAsListener(unohelper.Base, XDocumentEventListener):
-    """Handles Save As events for settings migration."""
+    """
+    Handles Save As events for settings migration and document close.
+    One listener per document path; it follows the document to the new
+    model when .uno:Reload replaces it.
+    """
+
+    _byPath = {}   # Document path → listener
 
     def __init__(self):
         self.oldPath = None
+        self.doc     = None   # Model the listener is registered with
+
+    @classmethod
+    def register(cls, doc, fullPath):
+        """Listen to doc, reusing the listener of its path if there is one."""
+        listener = cls._byPath.get(fullPath) if fullPath else None
+        if listener is None:
+            listener = cls()
+            listener.oldPath = fullPath
+            if fullPath:
+                cls._byPath[fullPath] = listener
+        listener.listenTo(doc)
+
+    def listenTo(self, doc):
+        try:
+            if self.doc is not None and self.doc == doc:
+                return
+        except Exception:
+            pass
+        doc.addDocumentEventListener(self)
+        self.doc = doc
 
     def documentEventOccured(self, event):
         if event.EventName == "OnSaveAsDone":
@@ -490,11 +583,43 @@ class SaveAsListener(unohelper.Base, XDocumentEventListener):
                 doc     = event.Source
                 newPath = uno.fileUrlToSystemPath(doc.getURL())
                 lib_settings.migrateSettingsIfNeeded(self.oldPath, newPath)
+                if self.oldPath != newPath:
+                    core.releaseDocument(self.oldPath)
+                    storage.setDocumentOpen(newPath, True)
+                    SaveAsListener._byPath.pop(self.oldPath, None)
+                    SaveAsListener._byPath[newPath] = self
                 self.oldPath = newPath
             except Exception as e:
                 print(f"Error in SaveAs listener: {e}")
                 import traceback
                 traceback.print_exc()
+        elif event.EventName == "OnUnload":
+            try:
+                # .uno:Reload (after each editing turn, Undo, Redo) unloads
+                # the old model too – keep warm processes and the open state
+                if lib_document.followReload(event.Source, self.listenTo):
+                    return
+                SaveAsListener._byPath.pop(self.oldPath, None)
+                core.releaseDocument(self.oldPath)
+            except Exception as e:
+                print(f"Error in close listener: {e}")
+
+    def disposing(self, event):
+        pass
+
+
+class ShutdownListener(unohelper.Base, XTerminateListener):
+    """Flushes pending settings and stops warm processes when the office quits."""
+
+    def queryTermination(self, event):
+        pass
+
+    def notifyTermination(self, event):
+        try:
+            lib_settings.flushGlobalSettings()
+            process_pool.getPool().shutdown()
+        except Exception as e:
+            print(f"Error in shutdown listener: {e}")
 
     def disposing(self, event):
         pass
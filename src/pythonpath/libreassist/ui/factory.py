@@ -1,13 +1,15 @@
 # -*- coding: utf-8 -*-
 # libreassist/ui/factory.py - UI Factory for creating panels
 
+import threading
 import uno
 import unohelper
 
 from com.sun.star.ui import XUIElementFactory
-from libreassist import core, settings as lib_settings, i18n, document
+from libreassist import core, settings as lib_settings, i18n, document, storage, scheduler
 from .ui import LibreAssistPanel, getLocalizedString
-from .events import ActionEventHandler, ProviderChangeListener, TimeoutChangeListener, SaveAsListener, InstructionsChangeListener, TrackChangesChangeListener
+from . import chatview
+from .events import ActionEventHandler, ProviderChangeListener, TimeoutChangeListener, SaveAsListener, InstructionsChangeListener, TrackChangesChangeListener, ResponseCacheChangeListener, ProviderListCallback, ShutdownListener
 
 
 class ElementFactory(unohelper.Base, XUIElementFactory):
@@ -16,13 +18,20 @@ class ElementFactory(unohelper.Base, XUIElementFactory):
     """
 
     # View control groups
-    _CHAT_CONTROLS = ["ChatHistory", "InputField", "SendButton", "InfoLabel"]
+    _CHAT_CONTROLS = ["LoadOlderButton", "ChatHistory", "InputField", "SendButton", "InfoLabel"]
     _SETTINGS_CONTROLS = ["ProviderLabel", "ProviderList", "TimeoutLabel", "TimeoutField",
                           "InstructionsLabel", "InstructionsField",
                           "ResetSessionButton", "ClearHistoryButton", "DeleteAllDataButton",
-                          "OpenProviderConfigButton", "TrackChangesCheckBox"]
+                          "StorageUsageLabel",
+                          "OpenProviderConfigButton", "TrackChangesCheckBox",
+                          "RescanProvidersButton", "ResponseCacheCheckBox"]
     _ABOUT_CONTROLS = ["AboutLogo", "AboutText"]
 
+    # Orphan cleanup and the shutdown listener are once per LibreOffice process, not once per panel
+    _cleanupStarted   = False
+    _cleanupLock      = threading.Lock()
+    _shutdownListener = None
+
     def __init__(self, ctx):
         self.ctx = uno.getComponentContext()
         self.panelWin = None
@@ -74,13 +83,11 @@ class ElementFactory(unohelper.Base, XUIElementFactory):
             dialogModel.Width = 150
             dialogModel.Height = 690
 
-            # Initialize
-            lib_settings.cleanupOrphanedDirs()
-            discovered = core.discoverProviders()
-            
+            # Initialize from cached state; cleanup and discovery run in the background
             globalSettings = lib_settings.loadGlobalSettings()
+            discovered     = globalSettings.get("discovered_providers", {})
             docSettings = {"undo_available": False, "redo_available": False}
-            loadedHistory = "Chat History\n"
+            docDir      = None
             if frame:
                 try:
                     docUrl = frame.getController().getModel().getURL()
@@ -88,18 +95,20 @@ class ElementFactory(unohelper.Base, XUIElementFactory):
                         docPath     = uno.fileUrlToSystemPath(docUrl)
                         docDir      = lib_settings.getDocSettingsDirForPath(docPath)
                         docSettings = lib_settings.loadSettingsForDir(docDir, docPath)
-                        loadedHistory = lib_settings.loadHistoryForDir(docDir)
                     else:
                         # New unsaved document - no undo/redo possible
-                        docSettings   = {"undo_available": False, "redo_available": False}
-                        loadedHistory = "Chat History\n"
+                        docSettings = {"undo_available": False, "redo_available": False}
                 except Exception as e:
                     import traceback
                     traceback.print_exc()
                     docSettings = lib_settings.loadSettings()
             else:
-                docSettings   = lib_settings.loadSettings()
-                loadedHistory = lib_settings.loadHistory()
+                docSettings = lib_settings.loadSettings()
+                docDir      = lib_settings.getDocSettingsDir()
+
+            # Only the newest messages go into the control
+            chatView      = chatview.getChatView(panelWin)
+            loadedHistory = chatView.load(docDir)
 
             # Create UI components
             self._createToolbar(dialogModel, docSettings)
@@ -116,14 +125,12 @@ class ElementFactory(unohelper.Base, XUIElementFactory):
             # Register document listener
             self._registerDocumentListener()
 
+            # Refresh provider list once background discovery has finished
+            self._startBackgroundInit(panelWin)
+
             # Scroll chat history to end after reload
-            historyControl = panelWin.getControl("ChatHistory")
-            model = historyControl.getModel()
-            model.ReadOnly = False
-            textLength = len(loadedHistory)
-            historyControl.setSelection(uno.createUnoStruct(
-                "com.sun.star.awt.Selection", textLength, textLength))
-            model.ReadOnly = True
+            chatView.scrollToEnd()
+            chatView.updateOlderButton()
 
             # Compute actual pixel height from bottommost control.
             # dialog model Height is in dialog units, not pixels; returning dialog
@@ -211,13 +218,24 @@ class ElementFactory(unohelper.Base, XUIElementFactory):
     def _createChatView(self, dialogModel, loadedHistory):
         """Create chat view components."""
         
+        # Show older messages button
+        loadOlderModel = dialogModel.createInstance("com.sun.star.awt.UnoControlButtonModel")
+        loadOlderModel.Name = "LoadOlderButton"
+        loadOlderModel.PositionX = 10
+        loadOlderModel.PositionY = 40
+        loadOlderModel.Width = 130
+        loadOlderModel.Height = 12
+        loadOlderModel.Label = getLocalizedString("load_older_button", "Show older messages")
+        loadOlderModel.Enabled = False
+        dialogModel.insertByName("LoadOlderButton", loadOlderModel)
+
         # Chat history display
         chatHistoryModel = dialogModel.createInstance("com.sun.star.awt.UnoControlEditModel")
         chatHistoryModel.Name = "ChatHistory"
         chatHistoryModel.PositionX = 10
-        chatHistoryModel.PositionY = 40
+        chatHistoryModel.PositionY = 54
         chatHistoryModel.Width = 130
-        chatHistoryModel.Height = 200
+        chatHistoryModel.Height = 186
         chatHistoryModel.MultiLine = True
         chatHistoryModel.ReadOnly = True
         chatHistoryModel.VerticalAlign = "TOP"
@@ -368,12 +386,22 @@ class ElementFactory(unohelper.Base, XUIElementFactory):
         deleteAllDataModel.Label = getLocalizedString("settings_delete_all_data", "Delete All Data")
         dialogModel.insertByName("DeleteAllDataButton", deleteAllDataModel)
 
+        # Storage usage label (filled in when the settings view is shown)
+        storageUsageModel = dialogModel.createInstance("com.sun.star.awt.UnoControlFixedTextModel")
+        storageUsageModel.Name = "StorageUsageLabel"
+        storageUsageModel.PositionX = 10
+        storageUsageModel.PositionY = 305
+        storageUsageModel.Width = 130
+        storageUsageModel.Height = 10
+        storageUsageModel.Label = ""
+        dialogModel.insertByName("StorageUsageLabel", storageUsageModel)
+
         # Open provider config button
         openConfigModel = dialogModel.createInstance("com.sun.star.awt.UnoControlButtonModel")
         openConfigModel.Name = "OpenProviderConfigButton"
         openConfigModel.TabIndex = 10
         openConfigModel.PositionX = 10
-        openConfigModel.PositionY = 310
+        openConfigModel.PositionY = 320
         openConfigModel.Width = 130
         openConfigModel.Height = 23
         openConfigModel.Label = getLocalizedString("settings_open_provider_config", "Open Provider Config")
@@ -384,13 +412,37 @@ class ElementFactory(unohelper.Base, XUIElementFactory):
             "com.sun.star.awt.UnoControlCheckBoxModel")
         trackChangesModel.Name = "TrackChangesCheckBox"
         trackChangesModel.PositionX = 10
-        trackChangesModel.PositionY = 340
+        trackChangesModel.PositionY = 350
         trackChangesModel.Width = 130
         trackChangesModel.Height = 15
         trackChangesModel.Label = getLocalizedString("settings_track_changes", "Track Changes (Writer)")
         trackChangesModel.State = 1 if globalSettings.get("track_changes_writer", False) else 0
         dialogModel.insertByName("TrackChangesCheckBox", trackChangesModel)
 
+        # Rescan providers button
+        rescanModel = dialogModel.createInstance("com.sun.star.awt.UnoControlButtonModel")
+        rescanModel.Name = "RescanProvidersButton"
+        rescanModel.TabIndex = 11
+        rescanModel.PositionX = 10
+        rescanModel.PositionY = 372
+        rescanModel.Width = 130
+        rescanModel.Height = 23
+        rescanModel.Label = getLocalizedString("settings_rescan_providers", "Rescan Providers")
+        dialogModel.insertByName("RescanProvidersButton", rescanModel)
+
+        # Response cache checkbox
+        responseCacheModel = dialogModel.createInstance(
+            "com.sun.star.awt.UnoControlCheckBoxModel")
+        responseCacheModel.Name = "ResponseCacheCheckBox"
+        responseCacheModel.PositionX = 10
+        responseCacheModel.PositionY = 402
+        responseCacheModel.Width = 130
+        responseCacheModel.Height = 15
+        responseCacheModel.Label = getLocalizedString("settings_response_cache", "Cache answers to questions")
+        responseCacheModel.HelpText = getLocalizedString("settings_response_cache_hint", "")
+        responseCacheModel.State = 1 if globalSettings.get("response_cache", False) else 0
+        dialogModel.insertByName("ResponseCacheCheckBox", responseCacheModel)
+
     def _createAboutView(self, dialogModel):
         """Create about view components."""
     
@@ -429,7 +481,8 @@ class ElementFactory(unohelper.Base, XUIElementFactory):
         for buttonName in ["SendButton", "UndoButton", "RedoButton", "SettingsButton",
                           "AboutButton", "BackButton", "ResetSessionButton",
                           "ClearHistoryButton", "DeleteAllDataButton",
-                          "OpenProviderConfigButton"]:
+                          "OpenProviderConfigButton", "RescanProvidersButton",
+                          "LoadOlderButton"]:
             panelWin.getControl(buttonName).addActionListener(eventHandler)
             panelWin.getControl(buttonName).setActionCommand(f"{buttonName.replace('Button', '')}_OnClick")
 
@@ -442,6 +495,7 @@ class ElementFactory(unohelper.Base, XUIElementFactory):
         # Custom Instructions change listener
         panelWin.getControl("InstructionsField").addTextListener(InstructionsChangeListener(self))
         panelWin.getControl("TrackChangesCheckBox").addItemListener(TrackChangesChangeListener(self))
+        panelWin.getControl("ResponseCacheCheckBox").addItemListener(ResponseCacheChangeListener(self))
 
     def _initializeViewState(self, globalSettings, docSettings):
         """Initialize UI view state and control visibility."""
@@ -451,10 +505,7 @@ class ElementFactory(unohelper.Base, XUIElementFactory):
             self.panelWin.getControl(name).setVisible(False)
 
         # Set initial provider selection
-        currentProvider = globalSettings.get("default_provider", "claude_code")
-        if currentProvider in self.providerNames:
-            providerList = self.panelWin.getControl("ProviderList")
-            providerList.selectItemPos(self.providerNames.index(currentProvider), True)
+        self._selectProvider(globalSettings.get("default_provider", "claude_code"))
 
         # Load custom instructions
         instructionsField = self.panelWin.getControl("InstructionsField")
@@ -463,15 +514,75 @@ class ElementFactory(unohelper.Base, XUIElementFactory):
         # Hide back button initially
         self.panelWin.getControl("BackButton").getModel().Enabled = False
 
+    def _selectProvider(self, providerName, panelWin=None):
+        """Select providerName in the provider dropdown if it is listed."""
+        if providerName in self.providerNames:
+            providerList = (panelWin or self.panelWin).getControl("ProviderList")
+            providerList.selectItemPos(self.providerNames.index(providerName), True)
+
+    def updateProviderList(self, discovered, panelWin=None):
+        """
+        Replace the provider dropdown entries after a (re)discovery.
+
+        Args:
+            discovered: dict mapping providerName → executable path
+            panelWin:   Panel to update (default: the most recent panel)
+        """
+        panelWin      = panelWin or self.panelWin
+        providerList  = panelWin.getControl("ProviderList")
+        providerNames = list(discovered.keys()) or ["claude_code"]
+        if providerNames == list(providerList.getModel().StringItemList):
+            return
+        self.providerNames = providerNames
+        providerList.getModel().StringItemList = tuple(providerNames)
+        self._selectProvider(
+            lib_settings.loadGlobalSettings().get("default_provider", "claude_code"), panelWin)
+
+    def _startBackgroundInit(self, panelWin):
+        """
+        Run orphan cleanup and provider discovery off the UI thread.
+        The provider list is updated on the Main-Thread when discovery is done.
+        """
+        # AsyncCallback must be created on the Main-Thread
+        asyncCb  = self.ctx.ServiceManager.createInstance("com.sun.star.awt.AsyncCallback")
+        callback = ProviderListCallback(self, panelWin)
+
+        with ElementFactory._cleanupLock:
+            runCleanup = not ElementFactory._cleanupStarted
+            ElementFactory._cleanupStarted = True
+
+        def _run():
+            try:
+                callback.discovered = core.discoverProviders()
+                asyncCb.addCallback(callback, None)
+            except Exception as e:
+                print(f"Error during background discovery: {e}")
+            # Cleanup is time-sliced and may take a few seconds; provider
+            # runs the user is waiting for go first
+            if runCleanup:
+                scheduler.getScheduler().submit(
+                    lib_settings.cleanupOrphanedDirs, scheduler.MAINTENANCE, None,
+                    priority=scheduler.PRIORITY_BATCH)
+
+        threading.Thread(target=_run, daemon=True).start()
+
     def _registerDocumentListener(self):
-        """Register listener for document Save As events."""
+        """Register listeners for document Save As events and office shutdown."""
         
         doc = document.getCurrentDocument()
         if doc:
-            listener = SaveAsListener()
             directory, filename, fullPath = document.getDocumentPath()
-            listener.oldPath = fullPath
-            doc.addDocumentEventListener(listener)
+            SaveAsListener.register(doc, fullPath)
+            storage.setDocumentOpen(fullPath, True)
+
+        if ElementFactory._shutdownListener is None:
+            try:
+                desktop = self.ctx.ServiceManager.createInstanceWithContext(
+                    "com.sun.star.frame.Desktop", self.ctx)
+                ElementFactory._shutdownListener = ShutdownListener()
+                desktop.addTerminateListener(ElementFactory._shutdownListener)
+            except Exception as e:
+                print(f"Error registering shutdown listener: {e}")
 
     def showView(self, view):
         """
@@ -489,5 +600,18 @@ class ElementFactory(unohelper.Base, XUIElementFactory):
         
         # Back button visible in Settings/About, hidden in Chat
         self.panelWin.getControl("BackButton").getModel().Enabled = (view != "chat")
+
+        if view == "settings":
+            self.updateStorageUsage()
         
         self.currentView = view
+
+    def updateStorageUsage(self):
+        """Show the space used by LibreAssist data against the storage quota."""
+        try:
+            usage = storage.getUsage()
+            mb = 1024 * 1024
+            self.panelWin.getControl("StorageUsageLabel").getModel().Label = i18n.t(
+                "storage_usage", used=f"{usage.total / mb:.1f}", quota=f"{usage.quota / mb:.0f}")
+        except Exception as e:
+            print(f"Error reading storage usage: {e}")
@@ -8,6 +8,9 @@ from com.sun.star.lang import XComponent
 from com.sun.star.ui import XUIElement, XToolPanel, XSidebarPanel, LayoutSize
 from com.sun.star.ui.UIElementType import TOOLPANEL as UET_TOOLPANEL
 
+from libreassist import settings as lib_settings
+from .chatview import releaseChatView
+
 
 def getLocalizedString(key, fallback=""):
     """
@@ -95,7 +98,9 @@ class LibreAssistPanel(unohelper.Base, XSidebarPanel, XUIElement, XToolPanel, XC
         return UET_TOOLPANEL
 
     def dispose(self):
-        pass
+        lib_settings.flushGlobalSettings()
+        if self.window:
+            releaseChatView(self.window)
 
     def addEventListener(self, ev):
         pass
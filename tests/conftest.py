@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# tests/conftest.py - Shared fixtures for the UNO-free modules
+#
+# Run with: python -m pytest tests
+# Modules that need the UNO bindings (settings, backup, document, ui) are not
+# imported here; the store is opened on a temp directory directly.
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "pythonpath"))
+
+from libreassist import store  # noqa: E402
+
+
+def openDatabase(baseDir):
+    """Connection to the database in baseDir, configured like store.getConnection()."""
+    conn = sqlite3.connect(os.path.join(baseDir, store.DB_FILENAME),
+                           isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Migrated store in tmp_path, installed as the shared connection."""
+    conn = openDatabase(str(tmp_path))
+    store._migrate(conn, str(tmp_path))
+    store._conn = conn
+    yield conn
+    store.close()
+
+
+@pytest.fixture
+def docKey(db):
+    """A document row in the store."""
+    key = "0123456789ab"
+    with store.transaction() as conn:
+        store.touchDocument(conn, key, "/docs/report.odt")
+    return key
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# tests/test_archive.py - History segments: paging, search and clearing
+
+import os
+
+import pytest
+
+from libreassist import archive, store
+from libreassist.messages import ROLE_ASSISTANT, ROLE_USER, Message
+
+
+@pytest.fixture
+def docDir(tmp_path, docKey):
+    path = tmp_path / docKey
+    path.mkdir()
+    return str(path)
+
+
+def _appendTurns(docKey, count):
+    with store.transaction() as conn:
+        for i in range(count):
+            store.appendMessages(conn, docKey, [Message(ROLE_USER, f"question {i}"),
+                                                Message(ROLE_ASSISTANT, f"answer {i}")])
+
+
+def _archive(docDir, docKey, messages):
+    filename, size = archive.writeSegment(docDir, messages)
+    with store.transaction() as conn:
+        store.addArchiveSegment(conn, docKey, messages, filename, size)
+    return filename, size
+
+
+def _texts(messages):
+    return [m.text for m in messages]
+
+
+def testSegmentRoundTrip(docDir, docKey):
+    _appendTurns(docKey, 2)
+    messages = store.loadMessages(docKey)
+    filename, size = archive.writeSegment(docDir, messages)
+    assert filename == f"history-{messages[0].id}-{messages[-1].id}.jsonl.xz"
+    assert size == os.path.getsize(os.path.join(docDir, filename))
+    restored = archive.readSegment(docDir, filename)
+    assert [(m.id, m.role, m.text) for m in restored] == [(m.id, m.role, m.text) for m in messages]
+
+
+def testHotCutoffKeepsNewestTurns(docKey):
+    _appendTurns(docKey, 5)
+    cutoff = store.hotCutoff(docKey, 2)
+    assert _texts(store.loadMessagesBefore(docKey, cutoff)) == [
+        "question 0", "answer 0", "question 1", "answer 1", "question 2", "answer 2"]
+    assert store.hotCutoff(docKey, 5) == store.loadMessages(docKey)[0].id
+    assert store.hotCutoff(docKey, 6) is None
+
+
+def testArchivedMessagesLeaveTheDatabase(docDir, docKey):
+    _appendTurns(docKey, 5)
+    _archive(docDir, docKey, store.loadMessagesBefore(docKey, store.hotCutoff(docKey, 2)))
+    assert store.countMessages(docKey) == 4
+    assert _texts(store.loadMessages(docKey)) == ["question 3", "answer 3", "question 4", "answer 4"]
+
+
+def testPagingAcrossSegments(docDir, docKey):
+    _appendTurns(docKey, 6)
+    older = store.loadMessagesBefore(docKey, store.hotCutoff(docKey, 2))   # 8 messages
+    _archive(docDir, docKey, older[:4])
+    _archive(docDir, docKey, older[4:])
+
+    # Offsets count back from the newest archived message
+    assert _texts(archive.loadArchived(docDir, 3)) == ["answer 2", "question 3", "answer 3"]
+    assert _texts(archive.loadArchived(docDir, 3, offset=3)) == ["question 1", "answer 1", "question 2"]
+    assert _texts(archive.loadArchived(docDir, 3, offset=6)) == ["question 0", "answer 0"]
+    assert archive.loadArchived(docDir, 3, offset=8) == []
+    assert _texts(archive.loadArchived(docDir, 100)) == _texts(older)
+
+
+def testSearchFindsArchivedMessages(tmp_path, docDir, docKey):
+    _appendTurns(docKey, 3)
+    _archive(docDir, docKey, store.loadMessagesBefore(docKey, store.hotCutoff(docKey, 1)))
+    assert _texts(m for _, m in store.searchMessages("question")) == ["question 2"]
+    hits = archive.searchArchived(str(tmp_path), "question")
+    assert [(path, m.text) for path, m in hits] == [("/docs/report.odt", "question 1"),
+                                                    ("/docs/report.odt", "question 0")]
+
+
+def testClearDropsSegmentsAndTheirSize(docDir, docKey):
+    _appendTurns(docKey, 3)
+    filename, size = _archive(docDir, docKey, store.loadMessagesBefore(docKey, store.hotCutoff(docKey, 1)))
+    with store.transaction() as conn:
+        store.setDocumentSize(conn, docKey, size + 100)
+        store.clearMessages(conn, docKey)
+    assert store.listArchiveSegments(docKey) == []
+    assert store.query("SELECT bytes FROM documents WHERE doc_key = ?", (docKey,)) == [(100,)]
+    assert archive.loadArchived(docDir, 10) == []
+
+    archive.removeUnindexedSegments(docDir)
+    assert not os.path.exists(os.path.join(docDir, filename))
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# tests/test_capture.py - Bounded-memory capture of provider output
+
+import os
+
+from libreassist import capture
+
+
+def testSmallOutputStaysInMemory(tmp_path):
+    output = capture.OutputCapture(str(tmp_path), threshold=100)
+    output.write(b"hello ")
+    output.write(b"world")
+    output.close()
+    assert output.getText() == "hello world"
+    assert output.hasOutput
+    assert os.listdir(tmp_path) == []
+
+
+def testLargeOutputSpillsToFile(tmp_path):
+    output = capture.OutputCapture(str(tmp_path), threshold=10)
+    for i in range(5):
+        output.write(f"line {i}\n".encode())
+    output.close()
+    assert [name.startswith("stdout-") for name in os.listdir(tmp_path)] == [True]
+    assert output._parts == []
+    assert output.getText() == "".join(f"line {i}\n" for i in range(5))
+    # Output after reading is appended, not written over the start
+    output.write(b"more")
+    assert output.getText().endswith("line 4\nmore")
+    output.discard()
+    assert os.listdir(tmp_path) == []
+
+
+def testSplitUtf8SequenceIsDecoded(tmp_path):
+    output = capture.OutputCapture(str(tmp_path))
+    data = "Grüße".encode('utf-8')
+    output.write(data[:3])   # Ends inside "ü"
+    output.write(data[3:])
+    output.close()
+    assert output.getText() == "Grüße"
+
+
+def testWhitespaceIsNoOutput(tmp_path):
+    output = capture.OutputCapture(str(tmp_path))
+    output.write(b"  \n\n")
+    output.close()
+    assert not output.hasOutput
+
+
+def testStderrTailKeepsHeadAndTail():
+    tail = capture.StderrTail(head=2, tail=2)
+    for i in range(10):
+        tail.feed(f"error {i}\n".encode())
+    assert tail.dropped == 6
+    assert tail.text() == "error 0\nerror 1\n... (truncated) ...\nerror 8\nerror 9"
+
+
+def testShortStderrIsComplete():
+    tail = capture.StderrTail(head=2, tail=2)
+    for i in range(3):
+        tail.addLine(f"warning {i}")
+    assert tail.text() == "warning 0\nwarning 1\nwarning 2"
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# tests/test_changes.py - Content-based change detection against snapshots
+#
+# changes.py reads snapshot blobs through backup.py, which imports the UNO
+# bindings; run these with LibreOffice's Python.
+
+import io
+import zipfile
+import zlib
+
+import pytest
+
+pytest.importorskip("uno")
+
+from libreassist import backup, changes, store  # noqa: E402
+
+_CONTENT = ('<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+            'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"><office:body><office:text>'
+            '{}</office:text></office:body></office:document-content>')
+
+
+def _content(paragraphs, headings=0):
+    body = "<text:h>Title</text:h>" * headings + "".join(f"<text:p>{p}</text:p>" for p in paragraphs)
+    return _CONTENT.format(body).encode('utf-8')
+
+
+def _writeOdt(path, content, styles=b"<styles/>"):
+    with zipfile.ZipFile(path, 'w') as zf:
+        zf.writestr(zipfile.ZipInfo("mimetype"), b"application/vnd.oasis.opendocument.text")
+        zf.writestr("content.xml", content, zipfile.ZIP_DEFLATED)
+        zf.writestr("styles.xml", styles, zipfile.ZIP_DEFLATED)
+
+
+@pytest.fixture
+def snapshotOf(tmp_path, docKey, monkeypatch):
+    """Record a file as the document's snapshot the way backup.recordSnapshot() does."""
+    monkeypatch.setattr(backup, "getLibreAssistDir", lambda: str(tmp_path))
+
+    def _record(path):
+        if zipfile.is_zipfile(path):
+            blobs, blobHash, entries = backup._storeZip(path, {})
+        else:
+            blobs, blobHash, entries = backup._storeFile(path)
+        with store.transaction() as conn:
+            for rowHash, ext, size, kind in blobs:
+                if store.addSnapshotBlob(conn, rowHash, ext, size, kind) and kind == store.SNAPSHOT_ZIP:
+                    store.addManifestEntries(conn, rowHash, entries)
+            return store.pushSnapshot(conn, docKey, blobHash, 10)
+    return _record
+
+
+def testCountParagraphs():
+    assert changes.countParagraphs(io.BytesIO(_content(["a", "b", "c"], headings=1))) == 4
+
+
+def testUnchangedPackage(tmp_path, snapshotOf):
+    path = str(tmp_path / "doc.odt")
+    _writeOdt(path, _content(["a"]))
+    snapshotId = snapshotOf(path)
+    summary = changes.summarizeChanges(path, snapshotId)
+    assert not summary.modified
+    assert str(summary) == "unchanged"
+
+
+def testChangedContentCountsParagraphs(tmp_path, snapshotOf):
+    path = str(tmp_path / "doc.odt")
+    _writeOdt(path, _content(["a"]))
+    snapshotId = snapshotOf(path)
+    _writeOdt(path, _content(["a", "b", "c"]))
+    summary = changes.summarizeChanges(path, snapshotId)
+    assert summary.changed == ["content.xml"]
+    assert (summary.paragraphsBefore, summary.paragraphsAfter) == (1, 3)
+    assert str(summary) == "changed content.xml; paragraphs +2"
+
+
+def testAddedAndRemovedEntries(tmp_path, snapshotOf):
+    path = str(tmp_path / "doc.odt")
+    _writeOdt(path, _content(["a"]))
+    snapshotId = snapshotOf(path)
+    with zipfile.ZipFile(path, 'w') as zf:
+        zf.writestr(zipfile.ZipInfo("mimetype"), b"application/vnd.oasis.opendocument.text")
+        zf.writestr("content.xml", _content(["a"]), zipfile.ZIP_DEFLATED)
+        zf.writestr("Pictures/1.png", b"png", zipfile.ZIP_STORED)
+    summary = changes.summarizeChanges(path, snapshotId)
+    assert (summary.changed, summary.added, summary.removed) == ([], ["Pictures/1.png"], ["styles.xml"])
+
+
+def testDeflatedEntriesAreStoredCompressed(tmp_path, docKey, snapshotOf):
+    path = str(tmp_path / "doc.odt")
+    _writeOdt(path, _content(["a"]))
+    snapshotOf(path)
+    manifest = store.getCurrentSnapshotBlob(docKey)[0]
+    entries  = {e[0]: e for e in store.loadManifestEntries(manifest)}
+    assert entries["mimetype"][6] == ""
+    assert entries["content.xml"][6] == backup.COMPRESSED_EXT
+    with open(backup.getBlobPath(entries["content.xml"][1], backup.COMPRESSED_EXT), 'rb') as f:
+        assert zlib.decompress(f.read()) == _content(["a"])
+
+
+def testPlainFileComparedWhole(tmp_path, snapshotOf):
+    path = tmp_path / "notes.txt"
+    path.write_text("one")
+    snapshotId = snapshotOf(str(path))
+    assert not changes.summarizeChanges(str(path), snapshotId).modified
+    path.write_text("two")
+    summary = changes.summarizeChanges(str(path), snapshotId)
+    assert summary.modified and summary.wholeFile
+    assert str(summary) == "file changed"
+
+
+def testUnknownSnapshotCountsAsChanged(tmp_path, docKey):
+    path = tmp_path / "notes.txt"
+    path.write_text("one")
+    assert changes.summarizeChanges(str(path), None).modified
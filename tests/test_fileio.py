@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# tests/test_fileio.py - Copy method fallback of fileio.copyFile
+
+import errno
+import os
+
+import pytest
+
+from libreassist import fileio
+
+
+@pytest.fixture(autouse=True)
+def _freshCapabilities(monkeypatch):
+    monkeypatch.setattr(fileio, "_capabilities", {})
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "deck.odp"
+    path.write_bytes(os.urandom(3 * 1024 * 1024 + 17))
+    os.chmod(path, 0o640)
+    os.utime(path, (1000000000, 1000000000))
+    return str(path)
+
+
+def testCopiesContent(tmp_path, source):
+    target = str(tmp_path / "copy.odp")
+    assert fileio.copyFile(source, target) in fileio._methods()
+    with open(source, 'rb') as a, open(target, 'rb') as b:
+        assert a.read() == b.read()
+
+
+def testKeepStatCopiesTimesAndPermissions(tmp_path, source):
+    target = str(tmp_path / "copy.odp")
+    fileio.copyFile(source, target, keepStat=True)
+    assert os.stat(target).st_mtime == 1000000000
+    assert os.stat(target).st_mode & 0o777 == 0o640
+
+
+def testTruncatesLongerTarget(tmp_path, source):
+    target = tmp_path / "copy.odp"
+    target.write_bytes(b"x" * (4 * 1024 * 1024))
+    fileio.copyFile(source, str(target))
+    assert target.stat().st_size == os.path.getsize(source)
+
+
+def testUnsupportedMethodIsRememberedPerDevicePair(tmp_path, source, monkeypatch):
+    calls = []
+
+    def _unsupported(src, dst, size):
+        calls.append(True)
+        raise OSError(errno.EOPNOTSUPP, "not supported")
+    first = fileio._methods()[0]
+    monkeypatch.setitem(fileio._COPIERS, first, _unsupported)
+
+    if first == fileio.METHOD_COPY:
+        with pytest.raises(OSError):
+            fileio.copyFile(source, str(tmp_path / "a"))
+        return
+    assert fileio.copyFile(source, str(tmp_path / "a")) != first
+    assert fileio.copyFile(source, str(tmp_path / "b")) != first
+    assert len(calls) == 1
+    devices = (os.stat(source).st_dev, os.stat(str(tmp_path)).st_dev)
+    assert first in fileio._capabilities[devices]
+
+
+def testRealErrorsAreRaised(tmp_path, source, monkeypatch):
+    def _full(src, dst, size):
+        raise OSError(errno.ENOSPC, "no space left")
+    for method in fileio._methods():
+        monkeypatch.setitem(fileio._COPIERS, method, _full)
+    with pytest.raises(OSError) as info:
+        fileio.copyFile(source, str(tmp_path / "a"))
+    assert info.value.errno == errno.ENOSPC
+
+
+def testShortKernelCopyFallsBack(tmp_path, source, monkeypatch):
+    first = fileio._methods()[0]
+    if first == fileio.METHOD_COPY:
+        pytest.skip("no kernel copy method on this platform")
+
+    def _short(src, dst, size):
+        dst.write(src.read(size // 2))
+        fileio._checkLength(first, size // 2, size)
+    monkeypatch.setitem(fileio._COPIERS, first, _short)
+    target = str(tmp_path / "copy.odp")
+    assert fileio.copyFile(source, target) != first
+    assert os.path.getsize(target) == os.path.getsize(source)
+    # A short copy is not remembered as "not supported"
+    assert not fileio._capabilities
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# tests/test_response_cache.py - Keys, hits and LRU eviction of the response cache
+
+import os
+
+import pytest
+
+from libreassist import response_cache
+
+
+@pytest.fixture
+def cacheDir(tmp_path, monkeypatch):
+    # getCacheDir() lives in the LibreOffice profile
+    monkeypatch.setattr(response_cache, "getCacheDir", lambda: str(tmp_path))
+    return str(tmp_path)
+
+
+def testKeyIgnoresCaseAndWhitespace():
+    key = response_cache.makeKey("claude_code", "What is  the\nTOTAL?", "", "h1")
+    assert key == response_cache.makeKey("claude_code", "what is the total?", "", "h1")
+
+
+@pytest.mark.parametrize("change", [("codex_cli", "what is the total?", "", "h1"),
+                                    ("claude_code", "what is the sum?", "", "h1"),
+                                    ("claude_code", "what is the total?", "Answer in German", "h1"),
+                                    ("claude_code", "what is the total?", "", "h2")])
+def testKeyDependsOnProviderPromptInstructionsAndDocument(change):
+    assert response_cache.makeKey(*change) != response_cache.makeKey(
+        "claude_code", "what is the total?", "", "h1")
+
+
+def testHashFile(tmp_path):
+    path = tmp_path / "doc.odt"
+    path.write_bytes(b"content")
+    assert response_cache.hashFile(str(path)) == (
+        "ed7002b439e9ac845f22357d822bac1444730fbdb6016d3ec9432297b9ec9f73")
+
+
+def testStoreAndLookup(cacheDir):
+    assert response_cache.lookup("k1") is None
+    assert response_cache.store("k1", "claude_code", "42")
+    assert response_cache.lookup("k1") == "42"
+
+
+def testEvictsLeastRecentlyUsed(cacheDir):
+    for i, key in enumerate(("old", "used", "new")):
+        response_cache.store(key, "claude_code", "x" * 400)
+        os.utime(os.path.join(cacheDir, key + ".json"), (1000 + i, 1000 + i))
+    # A hit makes "used" the most recently used entry
+    assert response_cache.lookup("used") == "x" * 400
+
+    response_cache.store("newest", "claude_code", "x" * 400, maxMb=1800 / (1024 * 1024))
+    assert sorted(os.listdir(cacheDir)) == ["new.json", "newest.json", "used.json"]
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# tests/test_scheduler.py - Worker pool, limits and priorities of the job scheduler
+
+import threading
+
+from libreassist import scheduler
+
+TIMEOUT = 5
+
+
+class _Blocker:
+    """Job body that records its start and waits until released."""
+
+    def __init__(self, name, log):
+        self.name     = name
+        self.log      = log
+        self.started  = threading.Event()
+        self.released = threading.Event()
+
+    def __call__(self):
+        self.log.append(self.name)
+        self.started.set()
+        assert self.released.wait(TIMEOUT)
+
+
+def _waitIdle(sched):
+    with sched._cond:
+        assert sched._cond.wait_for(lambda: not sched._queue and not any(sched._running.values()),
+                                    TIMEOUT)
+
+
+def testSameDocumentRunsOneJobAtATime():
+    sched, log = scheduler.JobScheduler(maxWorkers=4), []
+    first, second = _Blocker("first", log), _Blocker("second", log)
+    sched.submit(first, "claude_code", "/docs/a.odt")
+    sched.submit(second, "codex_cli", "/docs/a.odt")
+    assert first.started.wait(TIMEOUT)
+    assert not second.started.wait(0.2)
+    first.released.set()
+    assert second.started.wait(TIMEOUT)
+    second.released.set()
+    _waitIdle(sched)
+
+
+def testProviderLimit():
+    sched, log = scheduler.JobScheduler(maxWorkers=4), []
+    sched.providerLimits["claude_code"] = 1
+    jobs = [_Blocker(f"job{i}", log) for i in range(2)]
+    for i, job in enumerate(jobs):
+        sched.submit(job, "claude_code", f"/docs/{i}.odt")
+    assert jobs[0].started.wait(TIMEOUT)
+    assert not jobs[1].started.wait(0.2)
+    assert sched.getStats()["queued"] == 1
+    jobs[0].released.set()
+    assert jobs[1].started.wait(TIMEOUT)
+    jobs[1].released.set()
+    _waitIdle(sched)
+    assert sched.getStats()["completed"] == 2
+
+
+def testInteractiveJobsGoBeforeBatch():
+    sched, log = scheduler.JobScheduler(maxWorkers=1), []
+    gate  = _Blocker("gate", log)
+    batch = _Blocker("batch", log)
+    user  = _Blocker("interactive", log)
+    sched.submit(gate, "claude_code", "/docs/a.odt")
+    assert gate.started.wait(TIMEOUT)
+    sched.submit(batch, scheduler.MAINTENANCE, None, priority=scheduler.PRIORITY_BATCH)
+    sched.submit(user, "claude_code", "/docs/b.odt")
+    for job in (gate, batch, user):
+        job.released.set()
+    _waitIdle(sched)
+    assert log == ["gate", "interactive", "batch"]
+
+
+def testCancelQueuedJob():
+    sched, log = scheduler.JobScheduler(maxWorkers=1), []
+    gate = _Blocker("gate", log)
+    cancelled = []
+    sched.submit(gate, "claude_code", "/docs/a.odt")
+    assert gate.started.wait(TIMEOUT)
+    job = sched.submit(lambda: log.append("never"), "claude_code", "/docs/b.odt",
+                       onCancel=lambda: cancelled.append(True))
+    assert sched.cancel(job)
+    assert not sched.cancel(job)
+    gate.released.set()
+    _waitIdle(sched)
+    assert log == ["gate"]
+    assert cancelled == [True]
+
+
+def testIdleWorkerDoesNotSerializeJobs():
+    sched, log = scheduler.JobScheduler(maxWorkers=4), []
+    warmup = _Blocker("warmup", log)
+    warmup.released.set()
+    sched.submit(warmup, "claude_code", "/docs/a.odt")
+    _waitIdle(sched)
+    with sched._cond:
+        assert sched._cond.wait_for(lambda: sched._idleWorkers == 1, TIMEOUT)
+
+    # Both are submitted before the idle worker wakes up
+    jobs = [_Blocker("first", log), _Blocker("second", log)]
+    with sched._cond:
+        sched.submit(jobs[0], "claude_code", "/docs/a.odt")
+        sched.submit(jobs[1], "codex_cli", "/docs/b.odt")
+    assert jobs[0].started.wait(TIMEOUT)
+    assert jobs[1].started.wait(TIMEOUT)
+    # The second job did not wait for the first one to finish
+    assert sum(sched.getStats()["running"].values()) == 2
+    for job in jobs:
+        job.released.set()
+    _waitIdle(sched)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# tests/test_snapshots.py - Undo timeline and blob reference counts in the store
+
+from libreassist import store
+
+
+def _push(docKey, blobHash, depth=10):
+    with store.transaction() as conn:
+        store.addSnapshotBlob(conn, blobHash, ".odt", 100)
+        return store.pushSnapshot(conn, docKey, blobHash, depth)
+
+
+def _undo(docKey):
+    step = store.findSnapshotStep(docKey, -1)
+    with store.transaction() as conn:
+        assert store.setSnapshotCursor(conn, docKey, step[0])
+    return step
+
+
+def _neighbours(docKey):
+    with store.transaction() as conn:
+        return store.snapshotNeighbours(conn, docKey)
+
+
+def _timeline(docKey):
+    return [row[0] for row in store.query(
+        "SELECT hash FROM snapshots WHERE doc_key = ? ORDER BY id", (docKey,))]
+
+
+def _refcounts():
+    return dict(store.query("SELECT hash, refcount FROM snapshot_blobs"))
+
+
+def testPushBuildsTimeline(docKey):
+    for blobHash in "abc":
+        _push(docKey, blobHash)
+    assert _timeline(docKey) == ["a", "b", "c"]
+    assert _neighbours(docKey) == (True, False)
+
+
+def testSameContentIsNotAddedTwice(docKey):
+    first = _push(docKey, "a")
+    assert _push(docKey, "a") == first
+    assert _timeline(docKey) == ["a"]
+
+
+def testFindStepDoesNotMoveCursor(docKey):
+    ids = [_push(docKey, blobHash) for blobHash in "abc"]
+    assert store.findSnapshotStep(docKey, -1)[:2] == (ids[1], "b")
+    assert store.findSnapshotStep(docKey, 1) is None
+    assert store.findSnapshotStep(docKey, -1)[:2] == (ids[1], "b")
+
+
+def testUndoAndRedo(docKey):
+    ids = [_push(docKey, blobHash) for blobHash in "abc"]
+    assert _undo(docKey)[1] == "b"
+    assert _undo(docKey)[1] == "a"
+    assert store.findSnapshotStep(docKey, -1) is None
+    assert _neighbours(docKey) == (False, True)
+    assert store.findSnapshotStep(docKey, 1)[:2] == (ids[1], "b")
+
+
+def testUnchangedTurnAfterUndoKeepsRedo(docKey):
+    for blobHash in "abc":
+        _push(docKey, blobHash)
+    undone = _undo(docKey)
+    # A question-only turn snapshots the document as it is
+    assert _push(docKey, "b") == undone[0]
+    assert _timeline(docKey) == ["a", "b", "c"]
+    assert _neighbours(docKey) == (True, True)
+
+
+def testNewStateAfterUndoDropsRedo(docKey):
+    for blobHash in "abc":
+        _push(docKey, blobHash)
+    _undo(docKey)
+    _push(docKey, "d")
+    assert _timeline(docKey) == ["a", "b", "d"]
+    assert _neighbours(docKey) == (True, False)
+
+
+def testDepthLimitsTimeline(docKey):
+    for blobHash in "abcde":
+        _push(docKey, blobHash, depth=2)
+    assert _timeline(docKey) == ["c", "d", "e"]
+
+
+def testSetCursorToDroppedSnapshotFails(docKey):
+    first = _push(docKey, "a")
+    for blobHash in "bcd":
+        _push(docKey, blobHash, depth=1)
+    with store.transaction() as conn:
+        assert not store.setSnapshotCursor(conn, docKey, first)
+
+
+def testBlobsAreSharedAndReleased(db, docKey):
+    with store.transaction() as conn:
+        store.touchDocument(conn, "ba9876543210", "/docs/other.odt")
+    _push(docKey, "a")
+    _push("ba9876543210", "a")
+    assert _refcounts() == {"a": 2}
+
+    for blobHash in "bc":
+        _push(docKey, blobHash, depth=1)
+    assert _refcounts() == {"a": 1, "b": 1, "c": 1}
+    with store.transaction() as conn:
+        assert store.releaseUnreferencedBlobs(conn) == []
+
+    with store.transaction() as conn:
+        store.deleteDocument(conn, "ba9876543210")
+        released = store.releaseUnreferencedBlobs(conn)
+    assert [row[0] for row in released] == ["a"]
+    assert set(_refcounts()) == {"b", "c"}
+
+
+def testManifestReleasesItsEntries(docKey):
+    with store.transaction() as conn:
+        for entryHash in ("e1", "e2"):
+            store.addSnapshotBlob(conn, entryHash, ".z", 10, store.SNAPSHOT_ENTRY)
+        store.addSnapshotBlob(conn, "m", ".odt", 0, store.SNAPSHOT_ZIP)
+        store.addManifestEntries(conn, "m", [
+            ("mimetype", "e1", 1, 10, 0, (2024, 1, 1, 0, 0, 0)),
+            ("content.xml", "e2", 2, 20, 8, (2024, 1, 1, 0, 0, 0))])
+        store.pushSnapshot(conn, docKey, "m", 10)
+    assert [e[:2] for e in store.loadManifestEntries("m")] == [("mimetype", "e1"), ("content.xml", "e2")]
+    assert store.loadManifestEntries("m")[1][5] == (2024, 1, 1, 0, 0, 0)
+    assert store.getCurrentSnapshotBlob(docKey) == ("m", ".odt", store.SNAPSHOT_ZIP)
+
+    with store.transaction() as conn:
+        store.trimSnapshots(conn, docKey, keepCurrent=False)
+        released = store.releaseUnreferencedBlobs(conn)
+    assert sorted(row[0] for row in released) == ["e1", "e2", "m"]
+    assert store.getCurrentSnapshotBlob(docKey) is None
+
+
+def testTrimKeepsCurrentState(docKey):
+    for blobHash in "abc":
+        _push(docKey, blobHash)
+    _undo(docKey)
+    with store.transaction() as conn:
+        assert store.trimSnapshots(conn, docKey, keepCurrent=True) == 2
+    assert _timeline(docKey) == ["b"]
+    assert _neighbours(docKey) == (False, False)
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# tests/test_store.py - Schema migrations and the legacy import of the store
+
+import json
+import os
+
+import pytest
+
+from libreassist import store
+from libreassist.messages import ROLE_LEGACY, ROLE_USER, Message
+
+from conftest import openDatabase
+
+LATEST = len(store._MIGRATIONS)
+
+
+def _databaseAt(baseDir, version):
+    """New database with the first `version` migrations applied."""
+    conn = openDatabase(baseDir)
+    conn.execute("BEGIN")
+    for step in store._MIGRATIONS[:version]:
+        step(conn)
+    conn.execute(f"PRAGMA user_version = {version}")
+    conn.execute("COMMIT")
+    return conn
+
+
+def _tables(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def testFreshDatabaseHasLatestSchema(db):
+    assert db.execute("PRAGMA user_version").fetchone()[0] == LATEST
+    assert {"documents", "doc_settings", "session_ids", "messages", "message_terms",
+            "archive_segments", "archive_terms", "snapshot_blobs", "snapshots",
+            "snapshot_entries"} <= _tables(db)
+    assert "history" not in _tables(db)
+
+
+def testMigrateIsNoOpAtLatestVersion(db):
+    assert store._migrate(db, "/nonexistent") == []
+
+
+@pytest.mark.parametrize("version", range(1, LATEST))
+def testUpgradeKeepsDocuments(tmp_path, version):
+    conn = _databaseAt(str(tmp_path), version)
+    conn.execute("INSERT INTO documents (doc_key, path, created, last_used) VALUES (?, ?, 1, 2)",
+                 ("0123456789ab", "/docs/a.odt"))
+    store._migrate(conn, str(tmp_path))
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == LATEST
+    assert conn.execute("SELECT path, last_used FROM documents").fetchall() == [("/docs/a.odt", 2)]
+    conn.close()
+
+
+def testV2MovesHistoryTextIntoMessages(tmp_path):
+    conn = _databaseAt(str(tmp_path), 1)
+    conn.execute("INSERT INTO documents (doc_key, path, created, last_used) VALUES ('k', NULL, 1, 1)")
+    conn.execute("INSERT INTO history (doc_key, text) VALUES ('k', ?)",
+                 ("Chat History\nUser:\nsummarize the budget\n\n",))
+    store._migrate(conn, str(tmp_path))
+    store._conn = conn
+    try:
+        messages = store.loadMessages("k")
+        assert [(m.role, m.text) for m in messages] == [(ROLE_LEGACY, "User:\nsummarize the budget")]
+        # v3 indexes the migrated text
+        assert [m.id for _, m in store.searchMessages("budget")] == [messages[0].id]
+    finally:
+        store.close()
+
+
+def testV5AddsManifestColumns(tmp_path):
+    conn = _databaseAt(str(tmp_path), 4)
+    conn.execute("INSERT INTO documents (doc_key, path, created, last_used) VALUES ('k', NULL, 1, 1)")
+    store._migrate(conn, str(tmp_path))
+    assert conn.execute("SELECT bytes, last_checked FROM documents").fetchall() == [(0, 0)]
+    conn.close()
+
+
+def testV6DropsLegacyUndoFlags(tmp_path):
+    conn = _databaseAt(str(tmp_path), 5)
+    conn.execute("INSERT INTO documents (doc_key, path, created, last_used) VALUES ('k', NULL, 1, 1)")
+    conn.executemany("INSERT INTO doc_settings (doc_key, key, value) VALUES ('k', ?, ?)",
+                     [("undo_available", "true"), ("redo_available", "true"), ("provider", '"codex_cli"')])
+    store._migrate(conn, str(tmp_path))
+    assert conn.execute("SELECT key FROM doc_settings").fetchall() == [("provider",)]
+    conn.close()
+
+
+def testV7KeepsSnapshotBlobsAsFiles(tmp_path):
+    conn = _databaseAt(str(tmp_path), 6)
+    conn.execute("INSERT INTO snapshot_blobs (hash, ext, bytes, created) VALUES ('h', '.odt', 10, 1)")
+    store._migrate(conn, str(tmp_path))
+    assert conn.execute("SELECT kind FROM snapshot_blobs").fetchall() == [(store.SNAPSHOT_FILE,)]
+    conn.close()
+
+
+def testFailedMigrationRollsBack(tmp_path, monkeypatch):
+    conn = _databaseAt(str(tmp_path), 5)
+
+    def _broken(conn):
+        conn.execute("CREATE TABLE half_done (x)")
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(store, "_MIGRATIONS", store._MIGRATIONS[:5] + [_broken])
+    with pytest.raises(RuntimeError):
+        store._migrate(conn, str(tmp_path))
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 5
+    assert "half_done" not in _tables(conn)
+    conn.close()
+
+
+def testLegacyDirectoriesAreImported(tmp_path):
+    docDir = tmp_path / "abcdefabcdef"
+    docDir.mkdir()
+    (docDir / "settings.json").write_text(json.dumps({
+        "document_path": "/docs/b.odt", "provider": "codex_cli", "timeout": 300,
+        "session_ids": {"codex_cli": "s1"}, "undo_available": True, "redo_available": False}))
+    (docDir / "history.txt").write_text("Chat History\nUser:\nhello\n\n")
+    (tmp_path / "not-a-doc-dir").mkdir()
+
+    conn = openDatabase(str(tmp_path))
+    imported = store._migrate(conn, str(tmp_path))
+    store._conn = conn
+    try:
+        assert sorted(os.path.basename(p) for p in imported) == ["history.txt", "settings.json"]
+        path, values, sessionIds = store.loadDocument("abcdefabcdef")
+        assert path == "/docs/b.odt"
+        assert values == {"provider": "codex_cli", "timeout": 300}
+        assert sessionIds == {"codex_cli": "s1"}
+        assert [m.text for m in store.loadMessages("abcdefabcdef")] == ["User:\nhello"]
+    finally:
+        store.close()
+
+
+def testMessagesWindowAndClearMarker(db, docKey):
+    with store.transaction() as conn:
+        store.appendMessages(conn, docKey, [Message(ROLE_USER, f"m{i}") for i in range(5)])
+    assert [m.text for m in store.loadMessages(docKey, limit=2)] == ["m3", "m4"]
+    assert [m.text for m in store.loadMessages(docKey, limit=2, offset=2)] == ["m1", "m2"]
+
+    with store.transaction() as conn:
+        store.clearMessages(conn, docKey)
+        store.appendMessages(conn, docKey, [Message(ROLE_USER, "after")])
+    assert [m.text for m in store.loadMessages(docKey)] == ["after"]
+    assert store.searchMessages("m1") == []
+
+    with store.transaction() as conn:
+        assert store.compactMessages(conn) == 6   # Five messages and the marker
+    assert [m.text for m in store.loadMessages(docKey)] == ["after"]
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# tests/test_streamjson.py - JSON-lines prefilter and the Claude stream parser
+
+import json
+
+import pytest
+
+from libreassist import streamjson
+from libreassist.providers import claude_code
+
+
+def _line(event):
+    return (json.dumps(event) + "\n").encode('utf-8')
+
+
+def _delta(text):
+    return _line({"type": "stream_event", "event": {
+        "type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text}}})
+
+
+TRACE = [
+    _line({"type": "system", "subtype": "init", "session_id": "s1"}),
+    _line({"type": "stream_event", "event": {"type": "message_start", "message": {}}}),
+    _delta("Hel"),
+    _delta("lo"),
+    _line({"type": "stream_event", "event": {"type": "content_block_delta", "index": 1,
+                                             "delta": {"type": "input_json_delta", "partial_json": "{"}}}),
+    _line({"type": "assistant", "message": {"content": [{"type": "text", "text": "Hello"}]}}),
+    _line({"type": "result", "session_id": "s1", "result": "Hello"}),
+]
+
+
+@pytest.mark.parametrize("line", [b'{"type": "result"}', '{"type":"assistant"}',
+                                  b'{"event": {"type": "text_delta"}}'])
+def testFilterAcceptsListedTypes(line):
+    assert streamjson.EventFilter("assistant", "result", "text_delta").match(line)
+
+
+@pytest.mark.parametrize("line", [b'{"type": "system"}', '{"type": "assistant_extra"}', b'{}'])
+def testFilterRejectsOtherTypes(line):
+    assert not streamjson.EventFilter("assistant", "result").match(line)
+
+
+def testParseEvent():
+    assert streamjson.parseEvent(b'{"type": "result", "n": 1}') == {"type": "result", "n": 1}
+    assert streamjson.parseEvent(b'{"type": "system"}', streamjson.EventFilter("result")) is None
+    assert streamjson.parseEvent(b'{"type": "result"') is None
+    assert streamjson.parseEvent(b'[1, 2]') is None
+    assert streamjson.parseEvent(b"\n") is None
+
+
+def testInvalidUtf8IsReplaced():
+    event = streamjson.parseEvent(b'{"type": "result", "text": "caf\xe9"}')
+    assert event == {"type": "result", "text": "caf�"}
+
+
+def testStreamParserShowsDeltasThenFinalText():
+    parser  = claude_code.createStreamParser(partials=True)
+    changed = [parser.feed(line) for line in TRACE]
+    assert changed == [False, False, True, True, False, True, False]
+    assert parser.turnComplete
+    assert parser.result() == {"response": "Hello", "sessionId": "s1"}
+
+
+def testPartialTextWhileGenerating():
+    parser = claude_code.createStreamParser(partials=True)
+    for line in TRACE[:4]:
+        parser.feed(line)
+    assert parser.partialText() == "Hello"
+    assert not parser.turnComplete
+
+
+def testBufferedPathMatchesStreaming():
+    raw = b"".join(TRACE).decode('utf-8')
+    assert claude_code.extractResponse(raw) == {"response": "Hello", "sessionId": "s1"}